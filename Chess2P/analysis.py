@@ -0,0 +1,122 @@
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import WHITE, move_name
+from search import Searcher, SearchLimits, SearchTimeout, MATE, MAX_PLY
+
+ANALYSIS_MOVETIME = 60.0
+PV_MOVES = 3
+
+_generation = None
+_reports = None
+_searcher = None
+
+
+# Every restart bumps the shared generation. A search whose generation is no
+# longer current unwinds at its next limit check, and the UI drops reports
+# that were queued before the bump, so a stale best move is never shown.
+class AnalysisSearcher(Searcher):
+    def __init__(self, generation):
+        super().__init__()
+        self.generation = generation
+        self.current = 0
+
+    def _check_limits(self):
+        if self.generation.value != self.current:
+            raise SearchTimeout
+        super()._check_limits()
+
+
+def _init_worker(generation, reports):
+    global _generation, _reports, _searcher
+    _generation = generation
+    _reports = reports
+    _searcher = AnalysisSearcher(generation)
+
+
+def _analyse(generation, position, movetime):
+    if _generation.value != generation:
+        return
+    _searcher.current = generation
+    result = _searcher.search(position, SearchLimits(movetime=movetime),
+                              lambda result: _reports.put((generation, result, False)))
+    if _generation.value == generation:
+        _reports.put((generation, result, True))
+
+
+def format_score(score, side):
+    if side != WHITE:
+        score = -score
+    if abs(score) >= MATE - MAX_PLY:
+        moves = (MATE - abs(score) + 1) // 2
+        return f"#{'+' if score > 0 else '-'}{moves}"
+    return f'{score / 100:+.2f}'
+
+
+# Runs the search in a one-worker process pool so the pygame loop keeps its
+# frame rate; results arrive one per completed depth through a queue that
+# the loop drains without blocking, and `done` is set by the final result.
+# The same worker serves the hint panel and the computer's moves.
+class Analysis:
+    def __init__(self, movetime=ANALYSIS_MOVETIME):
+        self.movetime = movetime
+        self.generation = multiprocessing.RawValue('i', 0)
+        self.reports = multiprocessing.Queue()
+        self.executor = ProcessPoolExecutor(1, initializer=_init_worker, initargs=(self.generation, self.reports))
+        self.key = None
+        self.side = WHITE
+        self.result = None
+        self.source = ''
+        self.done = False
+
+    def restart(self, position, key, movetime=None):
+        self.stop()
+        self.key = key
+        self.side = position.side
+        self.executor.submit(_analyse, self.generation.value, position, movetime or self.movetime)
+
+    # A move known without searching (opening book, tablebase) is shown as
+    # a finished result and any running search is cancelled.
+    def show(self, key, side, result, source):
+        self.stop()
+        self.key = key
+        self.side = side
+        self.result = result
+        self.source = source
+        self.done = True
+
+    def stop(self):
+        self.generation.value += 1
+        self.key = None
+        self.result = None
+        self.source = ''
+        self.done = False
+
+    def poll(self):
+        changed = False
+        while True:
+            try:
+                generation, result, done = self.reports.get_nowait()
+            except queue.Empty:
+                return changed
+            if generation == self.generation.value and (result.pv or done):
+                if result.pv or self.result is None:
+                    self.result = result
+                self.done = done
+                changed = True
+
+    def lines(self):
+        if self.key is None:
+            return ()
+        if self.result is None:
+            return ('dang phan tich...',)
+        result = self.result
+        pv = ' '.join(move_name(move) for move in result.pv[:PV_MOVES])
+        if self.source:
+            return (self.source, pv)
+        return (f'do sau {result.depth}  {format_score(result.score, self.side)}', pv)
+
+    def close(self):
+        self.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,146 @@
+import numpy as np
+
+from bitboard import (WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                      KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, square)
+from evaluation import MIDDLE_GAME
+
+# Batches are N x 64 int8 boards holding bitboard piece codes (color << 3 | kind),
+# plus N-long side, castling and en passant (-1 for none) arrays. Work is done
+# per chunk so the N x 64 uint64 temporaries stay cache sized.
+CHUNK = 1024
+U64 = np.uint64
+SQUARES = np.arange(64)
+
+# (dx, dy) rays; the first four run towards higher square indices.
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1))
+ROOK_RAYS = (0, 1, 4, 5)
+BISHOP_RAYS = (2, 3, 6, 7)
+
+
+def _ray(sq, dx, dy):
+    x, y = sq & 7, sq >> 3
+    mask = 0
+    while 0 <= x + dx < 8 and 0 <= y + dy < 8:
+        x, y = x + dx, y + dy
+        mask |= 1 << square(x, y)
+    return mask
+
+
+RAYS = [np.array([_ray(sq, dx, dy) for sq in range(64)], dtype=U64) for dx, dy in DIRECTIONS]
+KNIGHT_TABLE = np.array(KNIGHT_ATTACKS, dtype=U64)
+KING_TABLE = np.array(KING_ATTACKS, dtype=U64)
+PAWN_TABLE = np.array(PAWN_ATTACKS, dtype=U64)
+PUSH_TABLE = np.array([[1 << (sq + 8) if sq < 56 else 0 for sq in range(64)],
+                       [1 << (sq - 8) if sq >= 8 else 0 for sq in range(64)]], dtype=U64)
+DOUBLE_TABLE = np.array([[1 << (sq + 16) if 8 <= sq < 16 else 0 for sq in range(64)],
+                         [1 << (sq - 16) if 48 <= sq < 56 else 0 for sq in range(64)]], dtype=U64)
+# (right, king target, squares that must be empty, squares that must not be attacked)
+CASTLES = ((WHITE, 1, 6, 0x60, 0x70), (WHITE, 2, 2, 0x0e, 0x1c),
+           (BLACK, 4, 62, 0x60 << 56, 0x70 << 56), (BLACK, 8, 58, 0x0e << 56, 0x1c << 56))
+
+# Material plus middle game piece-square values, shared with search.
+PIECE_SQUARE = np.array(MIDDLE_GAME, dtype=np.int32)
+
+
+def piece_square_score(position):
+    return sum(int(PIECE_SQUARE[code, sq]) for sq, code in enumerate(position.board) if code)
+
+
+def encode(positions):
+    count = len(positions)
+    boards = np.empty((count, 64), dtype=np.int8)
+    side = np.empty(count, dtype=np.int8)
+    castling = np.empty(count, dtype=np.int8)
+    ep = np.empty(count, dtype=np.int8)
+    for i, position in enumerate(positions):
+        boards[i] = position.board
+        side[i] = position.side
+        castling[i] = position.castling
+        ep[i] = position.ep
+    return boards, side, castling, ep
+
+
+def occupancy(boards):
+    planes = boards[:, None, :] == np.arange(16, dtype=np.int8)[None, :, None]
+    packed = np.packbits(planes, axis=2, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8')[:, :, 0].astype(U64)
+
+
+def slider_attacks(occupied, rays):
+    occupied = occupied[:, None]
+    attacks = np.zeros((len(occupied), 64), dtype=U64)
+    for direction in rays:
+        ray = RAYS[direction][None, :]
+        blockers = occupied & ray
+        if direction < 4:
+            first = blockers & (~blockers + U64(1))
+            attacks |= ray & ((first << U64(1)) - U64(1))
+        else:
+            # A ray holds at most 7 bits, so the float exponent is the exact msb.
+            exponent = np.frexp(blockers.astype(np.float64))[1]
+            lower = (U64(1) << np.maximum(exponent - 1, 0).astype(U64)) - U64(1)
+            attacks |= np.where(blockers != 0, ray & ~lower, ray)
+    return attacks
+
+
+def attacks_from(boards, occupied):
+    kinds = boards & 7
+    colors = (boards >> 3) & 1
+    rook = slider_attacks(occupied, ROOK_RAYS)
+    bishop = slider_attacks(occupied, BISHOP_RAYS)
+    attacks = np.where((kinds == ROOK) | (kinds == QUEEN), rook, U64(0))
+    attacks |= np.where((kinds == BISHOP) | (kinds == QUEEN), bishop, U64(0))
+    attacks |= np.where(kinds == KNIGHT, KNIGHT_TABLE, U64(0))
+    attacks |= np.where(kinds == KING, KING_TABLE, U64(0))
+    attacks |= np.where(kinds == PAWN, PAWN_TABLE[colors, SQUARES], U64(0))
+    return attacks
+
+
+def attacked(boards, attacks, color):
+    mine = (boards != 0) & (((boards >> 3) & 1) == color)
+    return np.bitwise_or.reduce(np.where(mine, attacks, U64(0)), axis=1)
+
+
+def _analyse_chunk(boards, side, castling, ep):
+    planes = occupancy(boards)
+    colors = [np.bitwise_or.reduce(planes[:, color << 3 | PAWN:color << 3 | KING + 1], axis=1)
+              for color in (WHITE, BLACK)]
+    occupied = colors[WHITE] | colors[BLACK]
+    attacks = attacks_from(boards, occupied)
+    threats = [attacked(boards, attacks, color) for color in (WHITE, BLACK)]
+    white = side == WHITE
+    own = np.where(white, colors[WHITE], colors[BLACK])
+    enemy = np.where(white, colors[BLACK], colors[WHITE])
+    enemy_attacks = np.where(white, threats[BLACK], threats[WHITE])
+    kings = np.where(white, planes[:, WHITE << 3 | KING], planes[:, BLACK << 3 | KING])
+    check = (kings & enemy_attacks) != 0
+
+    kinds = boards & 7
+    mine = (boards != 0) & (((boards >> 3) & 1) == side[:, None])
+    empty = ~occupied[:, None]
+    stm = side.astype(np.intp)[:, None]
+    ep_bits = np.where(ep >= 0, np.left_shift(U64(1), np.maximum(ep, 0).astype(U64)), U64(0))
+    push = PUSH_TABLE[stm, SQUARES] & empty
+    double = np.where(push != 0, DOUBLE_TABLE[stm, SQUARES] & empty, U64(0))
+    captures = PAWN_TABLE[stm, SQUARES] & (enemy | ep_bits)[:, None]
+    masks = np.where(kinds == PAWN, push | double | captures, attacks & ~own[:, None])
+    masks = np.where(mine, masks, U64(0))
+    for color, right, target, path, safe in CASTLES:
+        allowed = ((side == color) & ((castling & right) != 0) & ((occupied & U64(path)) == 0)
+                   & ((enemy_attacks & U64(safe)) == 0))
+        king_sq = 4 if color == WHITE else 60
+        masks[:, king_sq] |= np.where(allowed, U64(1 << target), U64(0))
+    counts = np.bitwise_count(masks).sum(axis=1, dtype=np.int32)
+    scores = PIECE_SQUARE[boards.astype(np.intp), SQUARES].sum(axis=1, dtype=np.int32)
+    return masks, counts, threats[WHITE], threats[BLACK], check, scores
+
+
+# Returns (move masks N x 64, move counts, white attacks, black attacks,
+# in-check flags, material + piece-square score from white's view). Masks are
+# pseudo-legal targets per origin square for the side to move, with castling
+# as a king target, matching Piece.get_raw_valid_moves; counts count targets,
+# so a promotion counts once as it does in the rules engine.
+def analyse(boards, side, castling, ep, chunk=CHUNK):
+    parts = [_analyse_chunk(boards[i:i + chunk], side[i:i + chunk], castling[i:i + chunk], ep[i:i + chunk])
+             for i in range(0, len(boards), chunk)]
+    return tuple(np.concatenate(column) for column in zip(*parts))
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import chess
+
+
+def click(square):
+    x, y = square
+    pos = (x * chess.SQUARE_SIZE + chess.SQUARE_SIZE // 2, y * chess.SQUARE_SIZE + chess.SQUARE_SIZE // 2)
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+
+
+def quantiles(values):
+    values = sorted(values)
+    return [values[min(int(q * len(values)), len(values) - 1)] * 1000 for q in (0.5, 0.99, 1.0)]
+
+
+# Plays a random move through posted clicks every `every` frames, so each move
+# goes through handle_click and, with analysis on, cancels and restarts it.
+async def run(game, frames, every, seed):
+    rng = random.Random(seed)
+    work, intervals = [], []
+    restarts = depth = stale = 0
+    last = time.perf_counter()
+    for frame in range(frames):
+        if frame % every == every - 1 and not game.game_over:
+            moves = [(piece.position, target) for piece, target, promotion in game.generate_moves() if not promotion]
+            if moves:
+                origin, target = rng.choice(moves)
+                click(origin)
+                click(target)
+        key = game.analysis.key if game.analysis else None
+        start = time.perf_counter()
+        delay = await game.update_loop()
+        end = time.perf_counter()
+        work.append(end - start)
+        intervals.append(start - last)
+        last = start
+        if game.analysis and game.analysis.key != key and game.analysis.key is not None:
+            restarts += 1
+        if game.analysis and game.analysis.result:
+            depth = max(depth, game.analysis.result.depth)
+        if game.hint:
+            piece = game.get_piece_at(game.hint[0])
+            stale += piece is None or piece.color != game.turn
+        await asyncio.sleep(min(delay, 1.0 / chess.FPS))
+    return work, intervals[1:], restarts, depth, stale
+
+
+def report(name, work, intervals, extra=''):
+    w50, w99, wmax = quantiles(work)
+    i50, i99, imax = quantiles(intervals)
+    print(f'{name:<14}{w50:>8.2f}{w99:>8.2f}{wmax:>8.1f}{i50:>10.2f}{i99:>8.2f}{imax:>8.1f}  {extra}')
+
+
+def main(argv):
+    frames = int(argv[1]) if len(argv) > 1 else 600
+    every = int(argv[2]) if len(argv) > 2 else 60
+    game = chess.ChessGame()
+    game.reset()
+    game.board.draw(game)
+    print(f"{'ms':<14}{'khung p50':>8}{'p99':>8}{'max':>8}{'nhip p50':>10}{'p99':>8}{'max':>8}")
+    work, intervals, _, _, _ = asyncio.run(run(game, frames, every, 0))
+    report('tat phan tich', work, intervals)
+    game.reset()
+    game.toggle_analysis()
+    work, intervals, restarts, depth, stale = asyncio.run(run(game, frames, every, 0))
+    report('bat phan tich', work, intervals,
+           f'{restarts} lan khoi dong lai, do sau toi da {depth}, {stale} goi y cu')
+    game.toggle_analysis()
+    # The computer plays black from the same worker; its search must not
+    # stall the frames in between.
+    game.reset()
+    game.computer = 'black'
+    work, intervals, _, _, _ = asyncio.run(run(game, frames, every, 0))
+    report('may choi', work, intervals, f'{len(game.move_stack)} nua nuoc')
+    game.analysis.close()
+    game.reset()
+    start = time.perf_counter()
+    game.show_hint()
+    print(f'goi y chan (cu): {(time.perf_counter() - start) * 1000:.0f} ms trong mot khung')
+    game.reset()
+    game.turn = game.computer
+    start = time.perf_counter()
+    game.play_computer_move()
+    print(f'may choi chan (cu): {(time.perf_counter() - start) * 1000:.0f} ms trong mot khung')
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
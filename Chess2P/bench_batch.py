@@ -0,0 +1,74 @@
+import random
+import sys
+import time
+
+import numpy as np
+
+import batch
+import rules
+from bitboard import Position, square, bits
+
+
+def corpus(count, seed=0, max_plies=120):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.initial()
+        for _ in range(rng.randrange(max_plies)):
+            legal = position.legal_moves()
+            if not legal:
+                break
+            position.make_move(rng.choice(legal))
+        positions.append(position)
+    return positions
+
+
+def scalar(game):
+    masks = {}
+    for piece in game.pieces:
+        if piece.color == game.turn:
+            moves, castle_moves = piece.get_raw_valid_moves(game)
+            masks[square(*piece.position)] = {square(*target) for target in moves} | \
+                                             {square(*king) for king, _ in castle_moves}
+    threats = [{square(x, y) for x in range(8) for y in range(8) if game.attack_map[color][x][y]}
+               for color in ('white', 'black')]
+    return masks, threats, game.is_in_check(game.turn)
+
+
+def verify(positions, results):
+    masks, counts, white, black, check, scores = results
+    errors = 0
+    for i, position in enumerate(positions):
+        game = rules.GameState(fen=position.fen())
+        expected, threats, in_check = scalar(game)
+        found = {sq: set(bits(int(masks[i, sq]))) for sq in range(64) if masks[i, sq]}
+        expected = {sq: targets for sq, targets in expected.items() if targets}
+        if found != expected or int(counts[i]) != sum(len(t) for t in expected.values()) or \
+                set(bits(int(white[i]))) != threats[0] or set(bits(int(black[i]))) != threats[1] or \
+                bool(check[i]) != in_check or int(scores[i]) != batch.piece_square_score(position):
+            errors += 1
+            print(f'khong khop: {position.fen()}')
+    return errors
+
+
+def run(count=20000, checked=2000):
+    positions = corpus(count)
+    arrays = batch.encode(positions)
+    batch.analyse(*(array[:256] for array in arrays))
+    start = time.perf_counter()
+    results = batch.analyse(*arrays)
+    vector_rate = count / (time.perf_counter() - start)
+    errors = verify(positions[:checked], [column[:checked] for column in results])
+    games = [rules.GameState(fen=position.fen()) for position in positions[:checked]]
+    start = time.perf_counter()
+    for game in games:
+        scalar(game)
+    scalar_rate = checked / (time.perf_counter() - start)
+    return vector_rate, scalar_rate, errors, float(np.mean(results[1]))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    vector_rate, scalar_rate, errors, moves = run(count)
+    print(f'numpy: {vector_rate:.0f} the co/s, rules: {scalar_rate:.0f} the co/s, '
+          f'{vector_rate / scalar_rate:.1f}x, trung binh {moves:.1f} nuoc gia hop le, {errors} khong khop')
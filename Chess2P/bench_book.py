@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+import book
+from bench_pgn import write_archive
+from bitboard import Position
+
+
+def sample_positions(count, plies=12, seed=1):
+    rng = random.Random(seed)
+    positions = []
+    for _ in range(count):
+        position = Position.initial()
+        for _ in range(rng.randrange(plies)):
+            legal = position.legal_moves()
+            if not legal:
+                break
+            position.make_move(rng.choice(legal))
+        positions.append(position)
+    return positions
+
+
+def run(games=2000, probes=20000):
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'games.pgn')
+        path = os.path.join(folder, 'book.bin')
+        write_archive(source, games)
+        start = time.perf_counter()
+        with open(source) as lines:
+            _, records = book.build(lines, path)
+        build_rate = games / (time.perf_counter() - start)
+        start = time.perf_counter()
+        reader = book.OpeningBook(path)
+        opened = time.perf_counter() - start
+        keys = [position.hash for position in sample_positions(probes)]
+        start = time.perf_counter()
+        hits = sum(1 for key in keys if reader.entries(key))
+        probe_rate = len(keys) / (time.perf_counter() - start)
+        reader.close()
+        return [
+            ('muc trong sach', records),
+            ('KB', os.path.getsize(path) / 1024),
+            ('dung van/s', build_rate),
+            ('mo sach us', opened * 1e6),
+            ('tra cuu/s', probe_rate),
+            ('ti le trung %', 100 * hits / len(keys)),
+        ]
+
+
+if __name__ == '__main__':
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    for name, value in run(games):
+        print(f'{name:<18}{value:>14.0f}')
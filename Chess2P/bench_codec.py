@@ -0,0 +1,81 @@
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+import codec
+import rules
+from bitboard import Position
+
+
+def random_games(count, plies=80, seed=0):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        position = Position.initial()
+        moves = []
+        for _ in range(plies):
+            legal = position.legal_moves()
+            if not legal:
+                break
+            move = rng.choice(legal)
+            moves.append(move)
+            position.make_move(move)
+        games.append((codec.pack(Position.initial()), moves, position))
+    return games
+
+
+def rate(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def run(count=500):
+    games = random_games(count)
+    positions = [position for _, _, position in games]
+    packed = [codec.pack(position) for position in positions]
+    states = [rules.GameState(fen=position.fen()) for position in positions[:100]]
+    rows = [
+        ('byte/the co dong goi', codec.POSITION_SIZE),
+        ('byte/FEN', sum(len(position.fen()) for position in positions) / count),
+        ('byte/pickle Position', sum(len(pickle.dumps(position)) for position in positions) / count),
+        ('byte/pickle GameState', sum(len(pickle.dumps(state)) for state in states) / len(states)),
+        ('pack the co/s', rate(codec.pack, positions)),
+        ('unpack the co/s', rate(codec.unpack, packed)),
+        ('pack_game/s', rate(codec.pack_game, states)),
+        ('unpack_game/s', rate(codec.unpack_game, packed[:100])),
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'games.log')
+        total = sum(len(moves) for _, moves, _ in games)
+        start = time.perf_counter()
+        with codec.LogWriter(path) as writer:
+            for start_position, moves, _ in games:
+                writer.append(start_position, moves)
+        rows.append(('ghi nhat ky nuoc/s', total / (time.perf_counter() - start)))
+        rows.append(('byte/nuoc trong nhat ky', os.path.getsize(path) / total))
+        with codec.LogReader(path) as reader:
+            start = time.perf_counter()
+            counted = sum(len(moves) for _, moves in reader)
+            rows.append(('quet nhat ky nuoc/s', counted / (time.perf_counter() - start)))
+            start = time.perf_counter()
+            checksum = 0
+            for _, moves in reader:
+                for move in moves:
+                    checksum ^= move
+            rows.append(('doc tung nuoc/s', counted / (time.perf_counter() - start)))
+            start = time.perf_counter()
+            for start_position, moves in reader:
+                codec.replay(start_position, moves)
+            rows.append(('phat lai nuoc/s', counted / (time.perf_counter() - start)))
+    return rows
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for name, value in run(count):
+        print(f'{name:<26}{value:>14.0f}')
@@ -0,0 +1,172 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import rules
+from bitboard import SQUARES, encode_move
+from journal import Journal
+
+# Rooks and kings only, moving without captures, so a game can run for
+# thousands of plies without ending while repetitions keep occurring. A
+# mate or stalemate reached by chance is taken back and another move played.
+FEN = 'r3k2r/8/8/8/8/8/8/R3K2R w - - 0 1'
+
+
+def snapshot(game):
+    return game.turn, frozenset((piece.code, piece.position) for piece in game.pieces)
+
+
+# What repetition costs without the hash index: compare the whole piece list
+# with every earlier position.
+def naive_repetitions(history, current):
+    return sum(1 for earlier in history if earlier == current)
+
+
+def play(game, names):
+    for name in names:
+        game.apply_move(encode_move(SQUARES[name[:2]], SQUARES[name[2:4]],
+                                    rules.PIECE_NAMES.index('queen') if name[4:] == 'q' else 0))
+        game.update_game_over()
+    return game
+
+
+SHUFFLE = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+# After 1.e4 nothing can take en passant, so the position after it repeats.
+EP_SHUFFLE = ['e2e4', 'g8f6', 'g1f3', 'f6g8', 'f3g1', 'g8f6', 'g1f3', 'f6g8', 'f3g1']
+ROUND_TRIP = ['g1f3', 'g8f6', 'b1c3', 'b8c6', 'f3g1', 'f6g8', 'c3b1', 'c6b8']
+# A line with a fivefold repetition (the ply before its end is drawn, so
+# only restore is checked), then a quiet line whose halfmove clock reaches
+# back past the checkpoint at ply 16 without a third repetition.
+REPEATED = ['e2e4', 'e7e5'] + ROUND_TRIP * 4 + ['g1f3', 'g8f6', 'f3g1']
+QUIET = ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6', 'b1c3', 'f8c5', 'd1e2', 'd8e7',
+         'c3b1', 'c6b8', 'b1c3', 'b8c6', 'a1b1', 'a8b8', 'b1a1', 'b8a8', 'h1g1']
+# (name, FEN, moves, expected draw_reason() afterwards)
+CASES = (
+    ('lap lai ba lan', rules.START_FEN, SHUFFLE * 2, 'lap lai ba lan'),
+    ('lap lai hai lan', rules.START_FEN, SHUFFLE, ''),
+    ('lap lai sau tot di hai o', rules.START_FEN, EP_SHUFFLE, 'lap lai ba lan'),
+    ('an tot qua duong khac vi tri', '4k1n1/3p4/8/4P3/8/8/8/4K1N1 b - - 0 1', ['d7d5'] + SHUFFLE * 2, ''),
+    ('luat 50 nuoc', '4k3/8/8/8/8/8/8/R3K3 w - - 99 80', ['a1a2'], 'luat 50 nuoc'),
+    ('99 nua nuoc', '4k3/8/8/8/8/8/8/R3K3 w - - 98 80', ['a1a2'], ''),
+    ('an quan dat lai dong ho', '4k3/8/8/8/8/8/r7/R3K3 w - - 99 80', ['a1a2'], ''),
+    ('vua ma / vua', '4k3/8/8/8/8/8/8/1N2K3 w - - 0 1', [], 'khong du quan chieu het'),
+    ('vua hai ma / vua', '4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1', [], ''),
+    ('tuong cung mau', '4kb2/8/8/8/8/8/8/2B1K3 w - - 0 1', [], 'khong du quan chieu het'),
+    ('tuong khac mau', '4k1b1/8/8/8/8/8/8/2B1K3 w - - 0 1', [], ''),
+    ('an het con vua / vua', '4k3/8/8/8/8/8/3r4/4K3 w - - 0 1', ['e1d2'], 'khong du quan chieu het'),
+    ('phong cap', '4k3/P7/8/8/8/8/8/4K3 w - - 0 1', ['a7a8q'], ''),
+)
+
+
+def check_cases():
+    failures = 0
+    for name, fen, moves, expected in CASES:
+        reason = play(rules.GameState(fen=fen), moves).draw_reason()
+        if reason != expected:
+            failures += 1
+            print(f'SAI {name}: {reason!r}, mong doi {expected!r}')
+    return failures
+
+
+# make_move / unmake_move (and promotions inside them) must leave the
+# repetition index, clock and material signature exactly as they found them.
+def check_balance(depth=3):
+    failures = 0
+    for fen in (rules.START_FEN, 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                'n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1'):
+        game = rules.GameState(fen=fen)
+        before = dict(game.position_counts), game.halfmove_clock, game.material
+        game.perft(depth)
+        if (dict(game.position_counts), game.halfmove_clock, game.material) != before:
+            failures += 1
+            print(f'SAI can bang sau perft: {fen}')
+    return failures
+
+
+def draw_state(game):
+    return game.halfmove_clock, dict(game.position_counts), game.draw_reason()
+
+
+# Undo, redo and review rebuild the game from journal checkpoints; the clock
+# and repetition counts must match a game played straight from the start.
+def check_restore(names, undo_redo):
+    import chess
+    failures = 0
+    game = chess.ChessGame()
+    game.journal = Journal(os.path.join(tempfile.mkdtemp(), 'journal.bin'))
+    game.reset()
+    game.journal.start(game)
+    play(game, names)
+    for ply in range(len(names), -1, -1):
+        game.restore(ply)
+        expected = play(rules.GameState(), names[:ply])
+        if draw_state(game) != draw_state(expected):
+            failures += 1
+            print(f'SAI khoi phuc nua nuoc {ply}: {draw_state(game)[::2]}, mong doi {draw_state(expected)[::2]}')
+    game.restore(len(names))
+    end = draw_state(game)
+    if undo_redo:
+        game.undo()
+        game.redo()
+        if draw_state(game) != end:
+            failures += 1
+            print(f'SAI lui roi tien: {draw_state(game)[::2]}, mong doi {end[::2]}')
+    game.journal.close()
+    return failures
+
+
+def run(plies, bucket, seed=0):
+    rng = random.Random(seed)
+    game = rules.GameState(fen=FEN)
+    history = [snapshot(game)]
+    clock = time.perf_counter
+    rows = []
+    indexed = naive = 0.0
+    draws = dead_ends = 0
+    for ply in range(1, plies + 1):
+        moves = [move for move in game.generate_moves() if not game.is_occupied(move[1])]
+        if not moves:
+            game.unmake_move()
+            history.pop()
+            dead_ends += 1
+            moves = [move for move in game.generate_moves() if not game.is_occupied(move[1])]
+        piece, target, promotion = rng.choice(moves)
+        game.make_move(piece, target, promotion)
+        start = clock()
+        reason = game.draw_reason()
+        middle = clock()
+        current = snapshot(game)
+        naive_repetitions(history, current)
+        history.append(current)
+        end = clock()
+        indexed += middle - start
+        naive += end - middle
+        draws += bool(reason)
+        if not ply % bucket:
+            rows.append((ply, indexed / bucket * 1e6, naive / bucket * 1e6, len(game.position_counts), draws))
+            indexed = naive = 0.0
+            draws = 0
+    return rows, dead_ends
+
+
+def main(argv):
+    plies = int(argv[1]) if len(argv) > 1 else 4000
+    bucket = int(argv[2]) if len(argv) > 2 else 500
+    failures = check_cases() + check_balance() + check_restore(REPEATED, False) + check_restore(QUIET, True)
+    print(f'{len(CASES)} tinh huong, can bang perft, khoi phuc nhat ky: {failures} sai')
+    rows, dead_ends = run(plies, bucket)
+    print(f"{'nua nuoc':>9}{'bang bam us':>13}{'so sanh us':>12}{'vi tri':>8}{'hoa':>6}")
+    for ply, indexed, naive, positions, draws in rows:
+        print(f'{ply:>9}{indexed:>13.2f}{naive:>12.1f}{positions:>8}{draws:>6}')
+    if dead_ends:
+        print(f'{dead_ends} lan het nuoc, da lui lai mot nuoc')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,100 @@
+import random
+import sys
+import time
+
+import evaluation
+from bitboard import Position, PAWN, KING
+from zobrist import PIECE_KEYS
+
+# Start of game, a castling / en passant heavy middle game and a position full
+# of promotions, so every branch of make_move is walked.
+STARTS = ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+          'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+          'n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1')
+
+
+def recomputed(position):
+    middle, end, phase = evaluation.material(position)
+    pawn_key = 0
+    for sq, code in enumerate(position.board):
+        if code & 7 in (PAWN, KING):
+            pawn_key ^= PIECE_KEYS[code][sq]
+    return middle, end, phase, pawn_key
+
+
+def state(position):
+    return position.middle, position.end, position.phase, position.pawn_key
+
+
+# Random walk of make_move / unmake_move: after every step the incremental
+# terms must equal a full recomputation, and so must the final score.
+def check(walks, seed=0, max_plies=160):
+    rng = random.Random(seed)
+    steps = errors = 0
+    for _ in range(walks):
+        position = Position.from_fen(rng.choice(STARTS))
+        initial = state(position)
+        for _ in range(rng.randrange(max_plies)):
+            legal = position.legal_moves()
+            if position.history and (not legal or rng.random() < 0.2):
+                position.unmake_move()
+            elif legal:
+                position.make_move(rng.choice(legal))
+            else:
+                break
+            steps += 1
+            if state(position) != recomputed(position) or \
+                    evaluation.evaluate(position) != evaluation.evaluate_full(position):
+                errors += 1
+                print(f'sai lech: {position.fen()}')
+        while position.history:
+            position.unmake_move()
+        if state(position) != initial:
+            errors += 1
+            print('sai lech sau khi lui het nuoc')
+    return steps, errors
+
+
+def corpus(count, seed=1, max_plies=120):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.initial()
+        for _ in range(rng.randrange(max_plies)):
+            legal = position.legal_moves()
+            if not legal:
+                break
+            position.make_move(rng.choice(legal))
+        positions.append(position)
+    return positions
+
+
+def rate(function, positions, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for position in positions:
+            function(position)
+    return rounds * len(positions) / (time.perf_counter() - start)
+
+
+def main(argv):
+    walks = int(argv[1]) if len(argv) > 1 else 300
+    count = int(argv[2]) if len(argv) > 2 else 2000
+    rounds = int(argv[3]) if len(argv) > 3 else 5
+    start = time.perf_counter()
+    steps, errors = check(walks)
+    print(f'{walks} van ngau nhien, {steps} buoc, {errors} sai lech ({time.perf_counter() - start:.1f} s)')
+    positions = corpus(count)
+    incremental = rate(evaluation.evaluate, positions, rounds)
+    full = rate(evaluation.evaluate_full, positions, rounds)
+    table = evaluation.PAWN_TABLE
+    print(f'tang dan:  {incremental:>10.0f} lan/s')
+    print(f'tinh lai:  {full:>10.0f} lan/s ({incremental / full:.1f}x)')
+    print(f'bang tot: {table.hits} trung, {table.misses} truot '
+          f'({table.hits / max(table.hits + table.misses, 1):.1%})')
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,69 @@
+import sys
+import time
+
+import bitboard
+import rules
+from bench_movegen import POSITIONS, play
+from transposition import TranspositionTable, EXACT
+
+
+def perft(position, depth, table=None):
+    if depth == 0:
+        return 1
+    if table is not None:
+        entry = table.probe(position.hash)
+        if entry and entry[0] == depth:
+            return entry[2]
+    nodes = 0
+    for move in position.legal_moves():
+        position.make_move(move)
+        nodes += perft(position, depth - 1, table)
+        position.unmake_move()
+    if table is not None:
+        table.store(position.hash, depth, EXACT, nodes)
+    return nodes
+
+
+def make_unmake_rate(game, seconds):
+    legal = game.get_legal_moves()
+    moves = [(game.get_piece_at(pos), move) for pos, (targets, _) in legal.items() for move in targets]
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for piece, move in moves:
+            game.make_move(piece, move)
+            game.unmake_move()
+        calls += len(moves)
+    return calls / (time.perf_counter() - start)
+
+
+def run(depth=4, sizes=(0, 0.25, 4, 64), seconds=1.0):
+    game = rules.GameState()
+    rows = []
+    for name, moves in POSITIONS.items():
+        game.reset()
+        play(game, moves)
+        position = bitboard.Position.from_game(game, game.turn)
+        for megabytes in sizes:
+            table = TranspositionTable(megabytes) if megabytes else None
+            start = time.perf_counter()
+            nodes = perft(position, depth, table)
+            elapsed = time.perf_counter() - start
+            stats = table.stats() if table else None
+            rows.append((name, megabytes, nodes, nodes / elapsed, stats))
+        rows.append((name, 'make/unmake', make_unmake_rate(game, seconds)))
+    return rows
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    print(f"{'vi tri':<16}{'TT MB':>12}{'nut':>10}{'nut/s':>12}{'hit %':>8}{'va cham':>10}{'ghi de':>10}")
+    for row in run(depth):
+        if row[1] == 'make/unmake':
+            print(f'{row[0]:<16}{row[1]:>12}{row[2]:>32.0f}/s')
+            continue
+        name, megabytes, nodes, rate, stats = row
+        hit = f"{stats['hit_rate'] * 100:.1f}" if stats else '-'
+        collisions = stats['collisions'] if stats else '-'
+        overwrites = stats['overwrites'] if stats else '-'
+        print(f'{name:<16}{megabytes:>12}{nodes:>10}{rate:>12.0f}{hit:>8}{collisions:>10}{overwrites:>10}')
@@ -0,0 +1,77 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import chess
+from bitboard import Position
+from journal import Journal
+
+
+def random_moves(plies, seed=0):
+    rng = random.Random(seed)
+    position = Position.initial()
+    moves = []
+    for _ in range(plies):
+        legal = position.legal_moves()
+        if not legal:
+            break
+        moves.append(rng.choice(legal))
+        position.make_move(moves[-1])
+    return moves
+
+
+def play(game, moves):
+    start = time.perf_counter()
+    for move in moves:
+        game.apply_move(move)
+    return (time.perf_counter() - start) / len(moves) * 1e6
+
+
+def seek(game, samples):
+    start = time.perf_counter()
+    for ply in samples:
+        game.restore(ply)
+    return (time.perf_counter() - start) / len(samples) * 1000
+
+
+def run(plies=400, seeks=50):
+    moves = random_moves(plies)
+    game = chess.ChessGame()
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'journal.bin')
+        game.reset()
+        game.journal = None
+        rows.append(('nuoc khong nhat ky (us)', play(game, moves)))
+        game.journal = Journal(path)
+        game.new_game()
+        rows.append(('nuoc co nhat ky (us)', play(game, moves)))
+        rows.append(('byte/nua nuoc', os.path.getsize(path) / len(moves)))
+        samples = random.Random(1).choices(range(len(moves) + 1), k=seeks)
+        rows.append(('tua voi diem luu (ms)', seek(game, samples)))
+        checkpoints = game.journal.checkpoints
+        game.journal.checkpoints = {0: checkpoints[0]}
+        rows.append(('tua tu dau van (ms)', seek(game, samples)))
+        game.journal.checkpoints = checkpoints
+        game.journal.close()
+        start = time.perf_counter()
+        journal = Journal.recover(path)
+        game.journal = journal
+        game.restore(len(journal.moves))
+        rows.append(('khoi phuc (ms)', (time.perf_counter() - start) * 1000))
+        journal.close()
+    return len(moves), rows
+
+
+if __name__ == '__main__':
+    plies = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    count, rows = run(plies)
+    print(f'{count} nua nuoc')
+    for name, value in rows:
+        print(f'{name:<26}{value:>10.2f}')
@@ -0,0 +1,63 @@
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+import rules
+
+
+def play(game, rng, plies):
+    for _ in range(plies):
+        moves = game.generate_moves()
+        if not moves:
+            break
+        piece, target, promotion = rng.choice(moves)
+        game.make_move(piece, target, promotion)
+    return game
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    games = [build(i) for i in range(count)]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    size = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    return games, size / count, blocks / count
+
+
+def piece_size(piece):
+    size = sys.getsizeof(piece)
+    if hasattr(piece, '__dict__'):
+        size += sys.getsizeof(piece.__dict__)
+    return size
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 200
+    plies = int(argv[2]) if len(argv) > 2 else 40
+    rules.GameState()
+    games, start_bytes, start_blocks = measure(lambda i: rules.GameState(), count)
+    pieces = games[0].pieces
+    print(f'{len(pieces)} quan, {sum(map(piece_size, pieces)) / len(pieces):.0f} byte/quan')
+    print(f'van moi:       {start_bytes / 1024:8.1f} KB/van, {start_blocks:8.0f} khoi/van')
+    del games
+    # Searching keeps a made move stack: allocation counts here include the
+    # move records and any promoted pieces as well as the piece records.
+    games, played_bytes, played_blocks = measure(lambda i: play(rules.GameState(), random.Random(i), plies), count)
+    print(f'sau {plies} nua nuoc: {played_bytes / 1024:8.1f} KB/van, {played_blocks:8.0f} khoi/van')
+    del games
+    game = rules.GameState()
+    start = time.perf_counter()
+    nodes = game.perft(3)
+    elapsed = time.perf_counter() - start
+    print(f'perft 3: {nodes} nut, {nodes / elapsed:.0f} nut/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
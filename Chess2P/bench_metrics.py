@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import chess
+import rules
+from bench_movegen import POSITIONS, play
+from metrics import METRICS
+
+
+def rules_workload(games, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for game in games:
+            game.legal_moves = None
+            for piece in list(game.pieces):
+                game.get_valid_moves(piece)
+            game.is_checkmate_or_stalemate(game.turn)
+            game.is_in_check('white')
+            game.is_in_check('black')
+    return (time.perf_counter() - start) / (repeat * len(games)) * 1e6
+
+
+def render_workload(game, frames):
+    game.board.draw(game)
+    start = time.perf_counter()
+    for _ in range(frames):
+        game.counter += 1
+        game.board.draw(game)
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def run(repeat=200, frames=600):
+    games = []
+    for moves in POSITIONS.values():
+        game = rules.GameState()
+        play(game, moves)
+        games.append(game)
+    ui = chess.ChessGame()
+    ui.reset()
+    rows = []
+    for enabled in (False, True):
+        METRICS.reset()
+        if enabled:
+            METRICS.enable()
+        rows.append(('bat' if enabled else 'tat', rules_workload(games, repeat), render_workload(ui, frames)))
+        METRICS.disable()
+    return rows
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'so do':<8}{'us/the co':>12}{'ms/khung':>12}")
+    rows = run(repeat)
+    for name, position_us, frame_ms in rows:
+        print(f'{name:<8}{position_us:>12.1f}{frame_ms:>12.3f}')
+    print(f'chi phi khi bat: {rows[1][1] / rows[0][1] - 1:.1%} luat, {rows[1][2] / rows[0][2] - 1:.1%} ve')
+    METRICS.enable()
+    rules_workload([rules.GameState()], 10)
+    with tempfile.TemporaryDirectory() as folder:
+        for name in ('metrics.json', 'metrics.prom'):
+            METRICS.dump(os.path.join(folder, name))
+            print(f'{name}: {os.path.getsize(os.path.join(folder, name))} byte')
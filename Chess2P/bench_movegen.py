@@ -0,0 +1,72 @@
+import sys
+import time
+
+import bitboard
+import rules
+
+POSITIONS = {
+    'khai cuoc': [],
+    'italian': ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'f8c5', 'c2c3', 'g8f6',
+                'd2d3', 'd7d6', 'e1g1', 'e8g8'],
+    'sicilian': ['e2e4', 'c7c5', 'g1f3', 'd7d6', 'd2d4', 'c5d4', 'f3d4', 'g8f6',
+                 'b1c3', 'a7a6', 'c1e3', 'e7e5', 'd4b3', 'f8e7', 'f2f3', 'c8e6'],
+    'queens gambit': ['d2d4', 'd7d5', 'c2c4', 'e7e6', 'b1c3', 'g8f6', 'c1g5', 'f8e7',
+                      'e2e3', 'e8g8', 'g1f3', 'b8d7', 'a1c1', 'c7c6', 'f1d3', 'd5c4'],
+}
+
+
+def square(name):
+    return (ord(name[0]) - ord('a'), int(name[1]) - 1)
+
+
+def play(game, moves):
+    for move in moves:
+        piece = game.get_piece_at(square(move[:2]))
+        target = square(move[2:4])
+        if isinstance(piece, rules.King) and abs(target[0] - piece.position[0]) == 2:
+            game.handle_castling(piece, target)
+        else:
+            game.handle_move(piece, target)
+
+
+def legal_moves(game):
+    count = 0
+    for piece in [p for p in game.pieces if p.color == game.turn]:
+        moves, castle_moves = piece.get_valid_moves(game)
+        count += len(moves) + len(castle_moves)
+    return count
+
+
+def bitboard_moves(position):
+    return len(position.legal_moves())
+
+
+def measure(generate, target, seconds):
+    calls = 0
+    generated = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        generated += generate(target)
+        calls += 1
+    elapsed = time.perf_counter() - start
+    return generated // calls, generated / elapsed
+
+
+def run(seconds=1.0):
+    game = rules.GameState()
+    results = []
+    for name, moves in POSITIONS.items():
+        game.reset()
+        play(game, moves)
+        count, object_rate = measure(legal_moves, game, seconds)
+        bitboard_count, bitboard_rate = measure(bitboard_moves, bitboard.Position.from_game(game, game.turn), seconds)
+        results.append((name, count, bitboard_count, object_rate, bitboard_rate))
+    return results
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    print(f"{'vi tri':<16}{'nuoc':>6}{'bitboard':>10}{'doi tuong/s':>14}{'bitboard/s':>14}{'x':>8}")
+    for name, count, bitboard_count, object_rate, bitboard_rate in run(seconds):
+        print(f'{name:<16}{count:>6}{bitboard_count:>10}{object_rate:>14.0f}{bitboard_rate:>14.0f}'
+              f'{bitboard_rate / object_rate:>8.1f}')
@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+import rules
+from bench_perft import PERFT_SUITE
+from parallel import ParallelSearcher
+from search import SearchLimits
+
+# Small root subsets stop early on mate scores; the answer must still carry
+# the full depth of the other workers.
+MATE_SUBSET = 'r5k1/5ppp/8/N7/8/8/5PPP/6K1 w - - 0 1'
+
+
+def run(depth=4, workers=None):
+    counts = workers or sorted({1, 2, 4, os.cpu_count() or 1, 2 * (os.cpu_count() or 1)})
+    positions = [rules.GameState(fen=fen) for _, fen, _ in PERFT_SUITE] + [rules.GameState(fen=MATE_SUBSET)]
+    rows = []
+    baseline = None
+    for count in counts:
+        with ParallelSearcher(count) as searcher:
+            searcher.search(positions[0], SearchLimits(depth=1))
+            nodes = 0
+            reached = depth
+            start = time.perf_counter()
+            for game in positions:
+                result = searcher.search(game, SearchLimits(depth=depth))
+                nodes += result.nodes
+                reached = min(reached, result.depth)
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        rows.append((count, nodes, elapsed, nodes / elapsed, baseline / elapsed, reached))
+    return rows
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    workers = [int(arg) for arg in sys.argv[2:]] or None
+    print(f'loi CPU: {os.cpu_count()}, do sau {depth}')
+    print(f"{'tien trinh':>10}{'nut':>10}{'giay':>8}{'nut/s':>10}{'tang toc':>10}{'sau it nhat':>13}")
+    for count, nodes, elapsed, nps, speedup, reached in run(depth, workers):
+        print(f'{count:>10}{nodes:>10}{elapsed:>8.2f}{nps:>10.0f}{speedup:>10.2f}{reached:>13}')
@@ -0,0 +1,71 @@
+import sys
+import time
+
+import bitboard
+import rules
+
+# Standard perft positions with published node counts for depth 1, 2, 3, ...
+PERFT_SUITE = [
+    ('khai cuoc', rules.START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('tan cuoc xe', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('phong cap', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('nhap thanh lech', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('trung cuoc', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+# 'adapter' is the object model with move generation delegated to the
+# bitboard engine through BitboardAdapter (GameState(engine='bitboard')).
+ENGINES = ('rules', 'adapter', 'bitboard')
+
+
+def load(engine, fen):
+    game = rules.GameState('bitboard' if engine == 'adapter' else None, fen=fen)
+    if engine == 'bitboard':
+        return bitboard.Position.from_game(game, game.turn)
+    return game
+
+
+def run(max_depth=3, engines=ENGINES):
+    rows = []
+    for name, fen, counts in PERFT_SUITE:
+        for engine in engines:
+            target = load(engine, fen)
+            for depth, expected in enumerate(counts[:max_depth], 1):
+                start = time.perf_counter()
+                nodes = target.perft(depth)
+                elapsed = time.perf_counter() - start
+                rows.append((name, engine, depth, nodes, expected, nodes / elapsed if elapsed else 0.0))
+    return rows
+
+
+def divide(depth, fen, engine='rules'):
+    total = 0
+    for move, nodes in sorted(load(engine, fen).divide(depth).items()):
+        print(f'{move:<8}{nodes:>10}')
+        total += nodes
+    print(f"{'tong':<8}{total:>10}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'divide':
+        divide(int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else rules.START_FEN,
+               sys.argv[4] if len(sys.argv) > 4 else 'rules')
+        sys.exit(0)
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    engines = (sys.argv[2],) if len(sys.argv) > 2 else ENGINES
+    print(f"{'vi tri':<18}{'engine':<10}{'sau':>4}{'nut':>10}{'mong doi':>10}{'nut/s':>12}")
+    failures = 0
+    for name, engine, depth, nodes, expected, rate in run(max_depth, engines):
+        mark = '' if nodes == expected else '  SAI'
+        failures += nodes != expected
+        print(f'{name:<18}{engine:<10}{depth:>4}{nodes:>10}{expected:>10}{rate:>12.0f}{mark}')
+    if failures:
+        print(f'{failures} ket qua khong khop')
+        sys.exit(1)
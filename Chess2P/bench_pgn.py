@@ -0,0 +1,85 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pgn
+from bitboard import Position
+
+
+def random_game(rng, max_plies=160):
+    position = Position.initial()
+    words = []
+    result = '*'
+    for ply in range(max_plies):
+        legal = position.legal_moves()
+        if not legal:
+            result = ('0-1' if position.side == 0 else '1-0') if position.is_check() else '1/2-1/2'
+            break
+        move = rng.choice(legal)
+        if ply % 2 == 0:
+            words.append(f'{ply // 2 + 1}.')
+        words.append(pgn.san(position, move, legal))
+        position.make_move(move)
+    return f'[Event "bench"]\n[Result "{result}"]\n\n{" ".join(words)} {result}\n\n'
+
+
+def write_archive(path, games, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as out:
+        for _ in range(games):
+            out.write(random_game(rng))
+
+
+def measure(path, workers):
+    results = errors = 0
+    start = time.perf_counter()
+    with open(path) as lines:
+        for _, _, error in pgn.validate(lines, workers):
+            results += 1
+            errors += bool(error)
+    elapsed = time.perf_counter() - start
+    return results, errors, elapsed
+
+
+def peak_memory(path, workers):
+    tracemalloc.start()
+    with open(path) as lines:
+        for _ in pgn.validate(lines, workers):
+            pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run(games=1000, copies=(1, 5), workers=(1, os.cpu_count() or 1)):
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        base = os.path.join(folder, 'base.pgn')
+        write_archive(base, games)
+        with open(base) as source:
+            text = source.read()
+        for copy in copies:
+            path = os.path.join(folder, f'x{copy}.pgn')
+            with open(path, 'w') as out:
+                for _ in range(copy):
+                    out.write(text)
+            for count in sorted(set(workers)):
+                total, errors, elapsed = measure(path, count)
+                peak = peak_memory(path, count)
+                rows.append((total, errors, os.path.getsize(path), count, total / elapsed, peak))
+    return rows
+
+
+if __name__ == '__main__':
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"{'van':>8}{'loi':>6}{'MB':>8}{'tien trinh':>12}{'van/s':>10}{'dinh KB':>10}")
+    failures = 0
+    for total, errors, size, count, rate, peak in run(games):
+        failures += errors
+        print(f'{total:>8}{errors:>6}{size / 2 ** 20:>8.1f}{count:>12}{rate:>10.0f}{peak / 1024:>10.0f}')
+    if failures:
+        print(f'{failures} van bao loi')
+        sys.exit(1)
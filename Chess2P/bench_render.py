@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+import chess
+
+SCENARIOS = {
+    'dung yen': [],
+    'chon quan': [(4, 1)],
+    'chieu tuong': [(4, 1), (4, 3), (5, 6), (5, 5), (3, 0), (7, 4)],
+}
+
+
+def click(game, square):
+    game.handle_click((square[0] * chess.SQUARE_SIZE + 5, square[1] * chess.SQUARE_SIZE + 5))
+
+
+def measure(game, frames):
+    start = time.perf_counter()
+    area = 0
+    for _ in range(frames):
+        game.counter += 1
+        dirty = game.board.draw(game)
+        if dirty:
+            pygame.display.update(dirty)
+        area += sum(rect.width * rect.height for rect in dirty)
+    elapsed = time.perf_counter() - start
+    return elapsed / frames * 1000, area / frames / (chess.WIDTH * chess.HEIGHT) * 100
+
+
+def run(frames=600):
+    game = chess.ChessGame()
+    results = []
+    for name, clicks in SCENARIOS.items():
+        game.reset()
+        for square in clicks:
+            click(game, square)
+        game.board.invalidate()
+        game.board.draw(game)
+        results.append((name,) + measure(game, frames))
+    return results
+
+
+if __name__ == '__main__':
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    print(f"{'tinh huong':<16}{'ms/khung':>10}{'% ve lai':>10}")
+    for name, frame_ms, area in run(frames):
+        print(f'{name:<16}{frame_ms:>10.3f}{area:>10.2f}')
@@ -0,0 +1,22 @@
+import sys
+
+import rules
+from bench_perft import PERFT_SUITE
+from bitboard import move_name
+from search import Searcher, SearchLimits, best_move
+
+
+def run(movetime=1.0):
+    rows = []
+    for name, fen, _ in PERFT_SUITE:
+        result = best_move(rules.GameState(fen=fen), SearchLimits(movetime=movetime), Searcher())
+        rows.append((name, move_name(result.move), result.score, result.depth, result.nodes, result.nps,
+                     ' '.join(move_name(move) for move in result.pv)))
+    return rows
+
+
+if __name__ == '__main__':
+    movetime = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    print(f"{'vi tri':<18}{'nuoc':<8}{'diem':>7}{'sau':>5}{'nut':>9}{'nut/s':>10}  pv")
+    for name, move, score, depth, nodes, nps, pv in run(movetime):
+        print(f'{name:<18}{move:<8}{score:>7}{depth:>5}{nodes:>9}{nps:>10.0f}  {pv}')
@@ -0,0 +1,138 @@
+import asyncio
+import collections
+import itertools
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+
+import server
+from bench_movegen import POSITIONS
+
+SCRIPT = POSITIONS['sicilian']
+CONNECTIONS = 50
+LEVELS = (1000, 5000, 10000)
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.ids = itertools.count(1)
+        self.events = collections.Counter()
+        self.task = asyncio.create_task(self.listen())
+
+    @classmethod
+    async def connect(cls, port):
+        reader, writer = await asyncio.open_connection(server.HOST, port, limit=1 << 20)
+        return cls(reader, writer)
+
+    async def listen(self):
+        while line := await self.reader.readline():
+            message = json.loads(line)
+            self.events[message['event']] += 1
+            future = self.pending.pop(message.get('id'), None)
+            if future:
+                future.set_result(message)
+
+    def request(self, message):
+        message['id'] = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message['id']] = future
+        self.writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+        return future
+
+    async def close(self):
+        self.writer.close()
+        self.task.cancel()
+
+
+async def play(white, black, latencies):
+    game = (await white.request({'op': 'new'}))['game']
+    await black.request({'op': 'join', 'game': game})
+    for ply, move in enumerate(SCRIPT):
+        client = black if ply % 2 else white
+        start = time.perf_counter()
+        reply = await client.request({'op': 'move', 'game': game, 'move': move})
+        latencies.append(time.perf_counter() - start)
+        if reply['event'] != 'move':
+            raise RuntimeError(reply)
+
+
+async def load(port, games):
+    whites = [await Client.connect(port) for _ in range(CONNECTIONS)]
+    blacks = [await Client.connect(port) for _ in range(CONNECTIONS)]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(play(whites[i % CONNECTIONS], blacks[i % CONNECTIONS], latencies)
+                           for i in range(games)))
+    elapsed = time.perf_counter() - start
+    for client in whites + blacks:
+        await client.close()
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def game_memory(count=1000):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = [server.Game(i, None) for i in range(count)]
+    size = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+    return size
+
+
+def validation_latency(games=1000):
+    game_server = server.GameServer()
+    game_server.send = lambda session, message: None
+    white, black = server.Session(None), server.Session(None)
+    timings = []
+    for i in range(games):
+        game = server.Game(i, white)
+        game.players[1] = black
+        for ply, move in enumerate(SCRIPT):
+            start = time.perf_counter()
+            game_server.play(black if ply % 2 else white, game, move, {})
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+# One connection holding both sides must see each event once, not once per side.
+async def both_sides(port):
+    client = await Client.connect(port)
+    await play(client, client, [])
+    await client.request({'op': 'new'})
+    await client.close()
+    return client.events['start'], client.events['move']
+
+
+def host(port, ready):
+    asyncio.run(server.serve(port=port, ready=ready))
+
+
+def run(levels=LEVELS, port=server.PORT + 1):
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=host, args=(port, ready), daemon=True)
+    process.start()
+    ready.wait()
+    try:
+        return asyncio.run(both_sides(port)), [(games,) + asyncio.run(load(port, games)) for games in levels]
+    finally:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    levels = [int(arg) for arg in sys.argv[1:]] or LEVELS
+    print(f'bo nho moi van: {game_memory():.0f} byte, {len(SCRIPT)} nuoc moi van, {CONNECTIONS * 2} ket noi')
+    p50, p99 = validation_latency()
+    print(f'kiem tra nuoc di (khong qua mang): p50 {p50:.0f} us, p99 {p99:.0f} us')
+    (starts, moves), rows = run(levels)
+    print(f'mot ket noi hai ben: {starts} start, {moves}/{len(SCRIPT)} move')
+    print(f"{'van':>8}{'nuoc/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for games, rate, p50, p99 in rows:
+        print(f'{games:>8}{rate:>10.0f}{p50:>10.2f}{p99:>10.2f}')
+    if (starts, moves) != (1, len(SCRIPT)):
+        sys.exit(1)
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def run(repeat=200):
+    rows = []
+    rules, elapsed = timed(lambda: __import__('rules'))
+    rows.append(('import rules', elapsed))
+    state, elapsed = timed(rules.GameState)
+    rows.append(('GameState()', elapsed))
+    rows.append(('GameState.reset()', timed(state.reset, repeat)[1]))
+
+    chess, elapsed = timed(lambda: __import__('chess'))
+    rows.append(('import chess', elapsed))
+    game, elapsed = timed(chess.ChessGame)
+    rows.append(('ChessGame()', elapsed))
+    rows.append(('ve khung hinh dau tien', timed(lambda: game.board.draw(game))[1]))
+    rows.append(('ChessGame.reset()', timed(game.reset, repeat)[1]))
+    rows.append(('sprite da tai', len(chess.SPRITES.sources)))
+    return rows
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for name, value in run(repeat):
+        unit = '' if isinstance(value, int) else ' ms'
+        print(f'{name:<26}{value:>10.3f}{unit}' if unit else f'{name:<26}{value:>10}')
@@ -0,0 +1,653 @@
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, ep_key
+from evaluation import MIDDLE_GAME, END_GAME, PHASE_WEIGHTS
+
+WHITE, BLACK = 0, 1
+EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(7)
+COLOR_NAMES = ('white', 'black')
+PIECE_NAMES = ('', 'pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+FEN_KINDS = ' pnbrqk'
+NO_SQUARE = -1
+FULL = (1 << 64) - 1
+
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+
+
+def square(x, y):
+    return y * 8 + x
+
+
+def coords(sq):
+    return sq & 7, sq >> 3
+
+
+def piece_code(color, kind):
+    return color << 3 | kind
+
+
+def encode_move(frm, to, promo=EMPTY):
+    return frm | to << 6 | promo << 12
+
+
+def square_name(sq):
+    return 'abcdefgh'[sq & 7] + str((sq >> 3) + 1)
+
+
+SQUARES = {square_name(sq): sq for sq in range(64)}
+
+
+def move_name(move):
+    promo = move >> 12
+    return square_name(move & 63) + square_name(move >> 6 & 63) + ('', '', 'n', 'b', 'r', 'q')[promo]
+
+
+def parse_move(text):
+    if len(text) not in (4, 5) or text[:2] not in SQUARES or text[2:4] not in SQUARES or \
+            (len(text) == 5 and text[4] not in 'nbrq'):
+        raise ValueError(f"Nuoc di khong hop le: {text}")
+    promo = FEN_KINDS.index(text[4]) if len(text) == 5 else EMPTY
+    return SQUARES[text[:2]] | SQUARES[text[2:4]] << 6 | promo << 12
+
+
+def bits(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _step_table(offsets):
+    table = []
+    for sq in range(64):
+        x, y = coords(sq)
+        mask = 0
+        for dx, dy in offsets:
+            if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                mask |= 1 << square(x + dx, y + dy)
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table([(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)])
+KING_ATTACKS = _step_table([(1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1)])
+PAWN_ATTACKS = (_step_table([(1, 1), (-1, 1)]), _step_table([(1, -1), (-1, -1)]))
+
+ROOK_DIRECTIONS = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+BISHOP_DIRECTIONS = [(1, 1), (-1, -1), (1, -1), (-1, 1)]
+
+
+def _ray(sq, dx, dy):
+    x, y = coords(sq)
+    squares = []
+    while 0 <= x + dx < 8 and 0 <= y + dy < 8:
+        x, y = x + dx, y + dy
+        squares.append(square(x, y))
+    return squares
+
+
+def _line_table(sq, directions):
+    rays = [_ray(sq, dx, dy) for dx, dy in directions]
+    mask = 0
+    for ray in rays:
+        for target in ray[:-1]:
+            mask |= 1 << target
+    table = {}
+    occ = 0
+    while True:
+        attacks = 0
+        for ray in rays:
+            for target in ray:
+                attacks |= 1 << target
+                if occ >> target & 1:
+                    break
+        table[occ] = attacks
+        occ = (occ - mask) & mask
+        if not occ:
+            break
+    return mask, table
+
+
+# Each slider attack is the union of two line lookups keyed by the occupancy of
+# the inner squares of that line, which keeps every table at 64 entries or less.
+ROOK_LINES = [(_line_table(sq, ROOK_DIRECTIONS[:2]), _line_table(sq, ROOK_DIRECTIONS[2:])) for sq in range(64)]
+BISHOP_LINES = [(_line_table(sq, BISHOP_DIRECTIONS[:2]), _line_table(sq, BISHOP_DIRECTIONS[2:])) for sq in range(64)]
+ROOK_EMPTY = [a[1][0] | b[1][0] for a, b in ROOK_LINES]
+BISHOP_EMPTY = [a[1][0] | b[1][0] for a, b in BISHOP_LINES]
+
+
+def rook_attacks(sq, occ):
+    (mask_a, table_a), (mask_b, table_b) = ROOK_LINES[sq]
+    return table_a[occ & mask_a] | table_b[occ & mask_b]
+
+
+def bishop_attacks(sq, occ):
+    (mask_a, table_a), (mask_b, table_b) = BISHOP_LINES[sq]
+    return table_a[occ & mask_a] | table_b[occ & mask_b]
+
+
+def _between_tables():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for dx, dy in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            ray = _ray(sq, dx, dy)
+            full = 1 << sq
+            for target in ray + _ray(sq, -dx, -dy):
+                full |= 1 << target
+            gap = 0
+            for target in ray:
+                between[sq][target] = gap
+                line[sq][target] = full
+                gap |= 1 << target
+    return between, line
+
+
+BETWEEN, LINE = _between_tables()
+
+CASTLING_MASK = [ALL_CASTLING] * 64
+CASTLING_MASK[square(4, 0)] = ALL_CASTLING & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[square(7, 0)] = ALL_CASTLING & ~WHITE_KINGSIDE
+CASTLING_MASK[square(0, 0)] = ALL_CASTLING & ~WHITE_QUEENSIDE
+CASTLING_MASK[square(4, 7)] = ALL_CASTLING & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[square(7, 7)] = ALL_CASTLING & ~BLACK_KINGSIDE
+CASTLING_MASK[square(0, 7)] = ALL_CASTLING & ~BLACK_QUEENSIDE
+
+# right, king from, king to, rook from, rook to, squares that must be empty, squares the king crosses
+CASTLING = {
+    WHITE: [(WHITE_KINGSIDE, 4, 6, 7, 5, 0x60, (5, 6)),
+            (WHITE_QUEENSIDE, 4, 2, 0, 3, 0x0e, (3, 2))],
+    BLACK: [(BLACK_KINGSIDE, 60, 62, 63, 61, 0x60 << 56, (61, 62)),
+            (BLACK_QUEENSIDE, 60, 58, 56, 59, 0x0e << 56, (59, 58))],
+}
+ROOK_CASTLING_MOVES = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+
+PROMOTION_RANK = (0xff << 56, 0xff)
+START_RANK = (0xff << 8, 0xff << 48)
+RANK_3 = 0xff << 16
+RANK_6 = 0xff << 40
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+
+
+class Position:
+    def __init__(self):
+        self.pieces = [[0] * 7, [0] * 7]
+        self.occupied = [0, 0]
+        self.board = [EMPTY] * 64
+        self.side = WHITE
+        self.castling = 0
+        self.ep = NO_SQUARE
+        self.hash = 0
+        self.history = []
+        # Evaluation terms kept up to date by put / make_move / unmake_move:
+        # white-minus-black material plus piece-square totals for both game
+        # phases, the phase weight of the pieces left, and the zobrist key of
+        # the pawns and kings alone for the pawn hash table.
+        self.middle = 0
+        self.end = 0
+        self.phase = 0
+        self.pawn_key = 0
+
+    @classmethod
+    def initial(cls):
+        position = cls()
+        order = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+        for x in range(8):
+            position.put(WHITE, order[x], square(x, 0))
+            position.put(WHITE, PAWN, square(x, 1))
+            position.put(BLACK, PAWN, square(x, 6))
+            position.put(BLACK, order[x], square(x, 7))
+        position.castling = ALL_CASTLING
+        position.hash = position.compute_hash()
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(fields) < 2 or len(rows) != 8:
+            raise ValueError(f"FEN khong hop le: {fen}")
+        position = cls()
+        for rank, row in enumerate(rows):
+            x = 0
+            for char in row:
+                if char.isdigit():
+                    x += int(char)
+                elif char.lower() in FEN_KINDS and x < 8:
+                    position.put(WHITE if char.isupper() else BLACK, FEN_KINDS.index(char.lower()), square(x, 7 - rank))
+                    x += 1
+                else:
+                    raise ValueError(f"FEN khong hop le: {fen}")
+        if not position.pieces[WHITE][KING] or not position.pieces[BLACK][KING]:
+            raise ValueError(f"FEN khong hop le: {fen}")
+        position.side = BLACK if fields[1] == 'b' else WHITE
+        castling = fields[2] if len(fields) > 2 else '-'
+        for right, char in zip((WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE), 'KQkq'):
+            if char in castling:
+                position.castling |= right
+        if len(fields) > 3 and fields[3] != '-':
+            position.ep = SQUARES[fields[3]]
+        position.hash = position.compute_hash()
+        return position
+
+    def fen(self, halfmove_clock=0, fullmove_number=1):
+        rows = []
+        for y in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for x in range(8):
+                code = self.board[square(x, y)]
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                letter = FEN_KINDS[code & 7]
+                row += letter.upper() if code >> 3 == WHITE else letter
+            rows.append(row + (str(empty) if empty else ''))
+        castling = ''.join(char for right, char in zip((WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE,
+                                                        BLACK_QUEENSIDE), 'KQkq') if self.castling & right)
+        ep = square_name(self.ep) if self.ep != NO_SQUARE else '-'
+        return (f"{'/'.join(rows)} {'wb'[self.side]} {castling or '-'} {ep} "
+                f"{halfmove_clock} {fullmove_number}")
+
+    @classmethod
+    def from_game(cls, game, color):
+        position = cls()
+        for piece in game.pieces:
+            kind = PIECE_NAMES.index(piece.name)
+            position.put(COLOR_NAMES.index(piece.color), kind, square(*piece.position))
+        position.castling = game.castling_rights()
+        position.side = COLOR_NAMES.index(color)
+        ep = game.get_en_passant_target(color)
+        if game.is_valid_square(ep):
+            position.ep = square(*ep)
+        position.hash = position.compute_hash()
+        return position
+
+    # The en passant file is hashed only when a pawn of the side to move
+    # attacks the square (rules.GameState does the same), so repetitions and
+    # book keys ignore a double push that nothing can capture.
+    def ep_hash(self):
+        ep = self.ep
+        if ep != NO_SQUARE and PAWN_ATTACKS[self.side ^ 1][ep] & self.pieces[self.side][PAWN]:
+            return ep_key(ep)
+        return 0
+
+    def compute_hash(self):
+        key = CASTLING_KEYS[self.castling] ^ self.ep_hash()
+        if self.side == BLACK:
+            key ^= SIDE_KEY
+        for sq, code in enumerate(self.board):
+            if code:
+                key ^= PIECE_KEYS[code][sq]
+        return key
+
+    def put(self, color, kind, sq):
+        self.pieces[color][kind] |= 1 << sq
+        self.occupied[color] |= 1 << sq
+        code = color << 3 | kind
+        self.board[sq] = code
+        self.middle += MIDDLE_GAME[code][sq]
+        self.end += END_GAME[code][sq]
+        self.phase += PHASE_WEIGHTS[kind]
+        if kind == PAWN or kind == KING:
+            self.pawn_key ^= PIECE_KEYS[code][sq]
+
+    def king_square(self, color):
+        return self.pieces[color][KING].bit_length() - 1
+
+    def attackers(self, sq, by, occ):
+        bb = self.pieces[by]
+        return ((KNIGHT_ATTACKS[sq] & bb[KNIGHT])
+                | (PAWN_ATTACKS[by ^ 1][sq] & bb[PAWN])
+                | (KING_ATTACKS[sq] & bb[KING])
+                | (rook_attacks(sq, occ) & (bb[ROOK] | bb[QUEEN]))
+                | (bishop_attacks(sq, occ) & (bb[BISHOP] | bb[QUEEN])))
+
+    def is_attacked(self, sq, by):
+        return bool(self.attackers(sq, by, self.occupied[0] | self.occupied[1]))
+
+    def is_check(self, color=None):
+        color = self.side if color is None else color
+        return self.is_attacked(self.king_square(color), color ^ 1)
+
+    def legal_moves(self, captures=False):
+        us = self.side
+        them = us ^ 1
+        ours = self.pieces[us]
+        theirs = self.pieces[them]
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occ = own | enemy
+        moves = []
+        append = moves.append
+
+        ksq = ours[KING].bit_length() - 1
+        occ_without_king = occ ^ (1 << ksq)
+        attackers = self.attackers
+        for to in bits(KING_ATTACKS[ksq] & (enemy if captures else ~own)):
+            if not attackers(to, them, occ_without_king):
+                append(ksq | to << 6)
+
+        checkers = attackers(ksq, them, occ)
+        if checkers & (checkers - 1):
+            return moves
+        if checkers:
+            target_mask = checkers | BETWEEN[ksq][checkers.bit_length() - 1]
+        elif captures:
+            target_mask = FULL
+        else:
+            target_mask = FULL
+            for right, _, king_to, _, _, empty, path in CASTLING[us]:
+                if self.castling & right and not occ & empty and \
+                        not any(attackers(s, them, occ) for s in path):
+                    append(ksq | king_to << 6)
+
+        pinned = {}
+        snipers = ((ROOK_EMPTY[ksq] & (theirs[ROOK] | theirs[QUEEN]))
+                   | (BISHOP_EMPTY[ksq] & (theirs[BISHOP] | theirs[QUEEN])))
+        for sniper in bits(snipers):
+            blockers = BETWEEN[ksq][sniper] & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned[blockers.bit_length() - 1] = LINE[ksq][sniper]
+
+        quiet_mask = (enemy if captures else ~own) & target_mask
+        for frm in bits(ours[KNIGHT]):
+            if frm not in pinned:
+                for to in bits(KNIGHT_ATTACKS[frm] & quiet_mask):
+                    append(frm | to << 6)
+        for frm in bits(ours[BISHOP] | ours[QUEEN]):
+            targets = bishop_attacks(frm, occ) & quiet_mask
+            if frm in pinned:
+                targets &= pinned[frm]
+            for to in bits(targets):
+                append(frm | to << 6)
+        for frm in bits(ours[ROOK] | ours[QUEEN]):
+            targets = rook_attacks(frm, occ) & quiet_mask
+            if frm in pinned:
+                targets &= pinned[frm]
+            for to in bits(targets):
+                append(frm | to << 6)
+
+        step = 8 if us == WHITE else -8
+        promotion_rank = PROMOTION_RANK[us]
+        empty = ~occ & FULL
+        pawns = ours[PAWN] & ~promotion_rank
+        free = pawns
+        for frm in pinned:
+            free &= ~(1 << frm)
+        if us == WHITE:
+            single = free << 8 & empty
+            double = (single & RANK_3) << 8 & empty
+            left = (free & ~FILE_A) << 7 & enemy
+            right = (free & ~FILE_H) << 9 & enemy
+        else:
+            single = free >> 8 & empty
+            double = (single & RANK_6) >> 8 & empty
+            left = (free & ~FILE_A) >> 9 & enemy
+            right = (free & ~FILE_H) >> 7 & enemy
+        if captures:
+            single &= promotion_rank
+            double = 0
+        for targets, delta in ((single, step), (double, 2 * step), (left, step - 1), (right, step + 1)):
+            targets &= target_mask
+            promotions = targets & promotion_rank
+            for to in bits(targets ^ promotions):
+                append((to - delta) | to << 6)
+            for to in bits(promotions):
+                for promo in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    append((to - delta) | to << 6 | promo << 12)
+
+        pawn_attacks = PAWN_ATTACKS[us]
+        for frm in bits(pawns & ~free):
+            one = frm + step
+            targets = pawn_attacks[frm] & enemy
+            if empty >> one & 1 and (not captures or (1 << one) & promotion_rank):
+                targets |= 1 << one
+                if (1 << frm) & START_RANK[us] and empty >> (one + step) & 1:
+                    targets |= 1 << (one + step)
+            for to in bits(targets & target_mask & pinned[frm]):
+                if (1 << to) & promotion_rank:
+                    for promo in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        append(frm | to << 6 | promo << 12)
+                else:
+                    append(frm | to << 6)
+        if self.ep != NO_SQUARE:
+            for frm in bits(PAWN_ATTACKS[them][self.ep] & pawns):
+                move = frm | self.ep << 6
+                self.make_move(move)
+                if not self.is_check(us):
+                    append(move)
+                self.unmake_move()
+        return moves
+
+    # Legal non-castling moves of one piece kind onto one square, checked by
+    # make/unmake; far cheaper than legal_moves() when resolving a SAN move.
+    def legal_moves_to(self, kind, to):
+        us = self.side
+        ours = self.pieces[us]
+        if self.occupied[us] >> to & 1:
+            return []
+        promos = (EMPTY,)
+        if kind == PAWN:
+            step = 8 if us == WHITE else -8
+            sources = 0
+            if self.board[to] or to == self.ep:
+                sources = PAWN_ATTACKS[us ^ 1][to] & ours[PAWN]
+            elif 0 <= to - step < 64:
+                one = to - step
+                if ours[PAWN] >> one & 1:
+                    sources = 1 << one
+                elif not self.board[one] and to >> 3 == (3 if us == WHITE else 4) and ours[PAWN] >> (one - step) & 1:
+                    sources = 1 << (one - step)
+            if (1 << to) & PROMOTION_RANK[us]:
+                promos = (QUEEN, ROOK, BISHOP, KNIGHT)
+        else:
+            occ = self.occupied[0] | self.occupied[1]
+            if kind == KNIGHT:
+                sources = KNIGHT_ATTACKS[to]
+            elif kind == KING:
+                sources = KING_ATTACKS[to]
+            elif kind == BISHOP:
+                sources = bishop_attacks(to, occ)
+            elif kind == ROOK:
+                sources = rook_attacks(to, occ)
+            else:
+                sources = bishop_attacks(to, occ) | rook_attacks(to, occ)
+            sources &= ours[kind]
+        moves = []
+        for frm in bits(sources):
+            for promo in promos:
+                move = frm | to << 6 | promo << 12
+                self.make_move(move)
+                if not self.is_check(us):
+                    moves.append(move)
+                self.unmake_move()
+        return moves
+
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.make_move(move)
+            nodes += self.perft(depth - 1)
+            self.unmake_move()
+        return nodes
+
+    def divide(self, depth):
+        result = {}
+        for move in self.legal_moves():
+            self.make_move(move)
+            result[move_name(move)] = self.perft(depth - 1)
+            self.unmake_move()
+        return result
+
+    def make_move(self, move):
+        frm = move & 63
+        to = move >> 6 & 63
+        promo = move >> 12
+        board = self.board
+        code = board[frm]
+        us = code >> 3
+        kind = code & 7
+        them = us ^ 1
+        captured = board[to]
+        self.history.append((move, captured, self.castling, self.ep, self.hash,
+                             self.middle, self.end, self.phase, self.pawn_key))
+        keys = PIECE_KEYS[code]
+        key = self.hash ^ SIDE_KEY ^ keys[frm] ^ keys[to] ^ self.ep_hash() ^ CASTLING_KEYS[self.castling]
+        middle_table = MIDDLE_GAME[code]
+        end_table = END_GAME[code]
+        middle = self.middle - middle_table[frm] + middle_table[to]
+        end = self.end - end_table[frm] + end_table[to]
+        pawn_key = self.pawn_key
+        if kind == PAWN or kind == KING:
+            pawn_key ^= keys[frm] ^ keys[to]
+        ours = self.pieces[us]
+        frm_bit = 1 << frm
+        to_bit = 1 << to
+        if captured:
+            self.pieces[them][captured & 7] ^= to_bit
+            self.occupied[them] ^= to_bit
+            key ^= PIECE_KEYS[captured][to]
+            middle -= MIDDLE_GAME[captured][to]
+            end -= END_GAME[captured][to]
+            self.phase -= PHASE_WEIGHTS[captured & 7]
+            if captured & 7 == PAWN:
+                pawn_key ^= PIECE_KEYS[captured][to]
+        ours[kind] ^= frm_bit | to_bit
+        self.occupied[us] ^= frm_bit | to_bit
+        board[frm] = EMPTY
+        board[to] = code
+        ep = NO_SQUARE
+        if kind == PAWN:
+            if to == self.ep:
+                victim = to - 8 if us == WHITE else to + 8
+                self.pieces[them][PAWN] ^= 1 << victim
+                self.occupied[them] ^= 1 << victim
+                board[victim] = EMPTY
+                key ^= PIECE_KEYS[them << 3 | PAWN][victim]
+                pawn_key ^= PIECE_KEYS[them << 3 | PAWN][victim]
+                middle -= MIDDLE_GAME[them << 3 | PAWN][victim]
+                end -= END_GAME[them << 3 | PAWN][victim]
+            elif promo:
+                ours[PAWN] ^= to_bit
+                ours[promo] ^= to_bit
+                board[to] = us << 3 | promo
+                key ^= keys[to] ^ PIECE_KEYS[us << 3 | promo][to]
+                pawn_key ^= keys[to]
+                middle += MIDDLE_GAME[us << 3 | promo][to] - middle_table[to]
+                end += END_GAME[us << 3 | promo][to] - end_table[to]
+                self.phase += PHASE_WEIGHTS[promo]
+            elif to - frm in (16, -16):
+                ep = (frm + to) >> 1
+        elif kind == KING and to - frm in (2, -2):
+            rook_from, rook_to = ROOK_CASTLING_MOVES[to]
+            rook_bits = 1 << rook_from | 1 << rook_to
+            ours[ROOK] ^= rook_bits
+            self.occupied[us] ^= rook_bits
+            board[rook_from] = EMPTY
+            board[rook_to] = us << 3 | ROOK
+            rook_keys = PIECE_KEYS[us << 3 | ROOK]
+            key ^= rook_keys[rook_from] ^ rook_keys[rook_to]
+            rook_middle = MIDDLE_GAME[us << 3 | ROOK]
+            rook_end = END_GAME[us << 3 | ROOK]
+            middle += rook_middle[rook_to] - rook_middle[rook_from]
+            end += rook_end[rook_to] - rook_end[rook_from]
+        self.middle = middle
+        self.end = end
+        self.pawn_key = pawn_key
+        self.castling &= CASTLING_MASK[frm] & CASTLING_MASK[to]
+        self.ep = ep
+        self.side = them
+        if ep != NO_SQUARE and PAWN_ATTACKS[us][ep] & self.pieces[them][PAWN]:
+            key ^= ep_key(ep)
+        self.hash = key ^ CASTLING_KEYS[self.castling]
+
+    def unmake_move(self):
+        (move, captured, self.castling, self.ep, self.hash,
+         self.middle, self.end, self.phase, self.pawn_key) = self.history.pop()
+        frm = move & 63
+        to = move >> 6 & 63
+        promo = move >> 12
+        them = self.side
+        us = them ^ 1
+        self.side = us
+        board = self.board
+        ours = self.pieces[us]
+        frm_bit = 1 << frm
+        to_bit = 1 << to
+        kind = PAWN if promo else board[to] & 7
+        if promo:
+            ours[promo] ^= to_bit
+            ours[PAWN] ^= to_bit
+        ours[kind] ^= frm_bit | to_bit
+        self.occupied[us] ^= frm_bit | to_bit
+        board[frm] = us << 3 | kind
+        board[to] = captured
+        if captured:
+            self.pieces[them][captured & 7] ^= to_bit
+            self.occupied[them] ^= to_bit
+        elif kind == PAWN and to == self.ep:
+            victim = to - 8 if us == WHITE else to + 8
+            self.pieces[them][PAWN] ^= 1 << victim
+            self.occupied[them] ^= 1 << victim
+            board[victim] = them << 3 | PAWN
+        elif kind == KING and to - frm in (2, -2):
+            rook_from, rook_to = ROOK_CASTLING_MOVES[to]
+            rook_bits = 1 << rook_from | 1 << rook_to
+            ours[ROOK] ^= rook_bits
+            self.occupied[us] ^= rook_bits
+            board[rook_to] = EMPTY
+            board[rook_from] = us << 3 | ROOK
+
+
+class BitboardAdapter:
+    def __init__(self, game):
+        self.game = game
+        self._key = None
+        self._moves = {}
+        self._position = None
+
+    def sync(self, color):
+        game = self.game
+        # The Zobrist hash covers piece codes, castling rights and en passant,
+        # so a promoted piece that reuses a freed piece's id is not mistaken for it.
+        key = (color, game.hash)
+        if key != self._key:
+            self._key = key
+            self._position = Position.from_game(game, color)
+            self._moves = {}
+            for move in self._position.legal_moves():
+                frm = move & 63
+                to = move >> 6 & 63
+                targets = self._moves.setdefault(coords(frm), [])
+                if coords(to) not in targets:
+                    targets.append(coords(to))
+        return self._position
+
+    def get_valid_moves(self, piece):
+        self.sync(piece.color)
+        targets = self._moves.get(piece.position, [])
+        if piece.name != 'king':
+            return list(targets), []
+        x, y = piece.position
+        moves = [t for t in targets if abs(t[0] - x) != 2]
+        castle_moves = [(t, (x + 1 if t[0] > x else x - 1, y)) for t in targets if abs(t[0] - x) == 2]
+        return moves, castle_moves
+
+    def is_in_check(self, color):
+        return self.sync(color).is_check()
+
+    def is_checkmate_or_stalemate(self, color):
+        position = self.sync(color)
+        if self._moves:
+            return False, False
+        in_check = position.is_check()
+        return not in_check, in_check
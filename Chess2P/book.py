@@ -0,0 +1,150 @@
+import mmap
+import random
+import struct
+import sys
+import time
+from collections import Counter
+
+import pgn
+import rules
+from bitboard import Position, move_name
+
+# Book layout: magic, then fixed 12-byte records (hash, move, weight) sorted by
+# hash and, within one hash, by descending weight. Keys are the zobrist hashes
+# of this engine, not Polyglot's, so books are only portable between builds
+# sharing zobrist.py.
+BOOK_MAGIC = b'CHB1'
+RECORD = struct.Struct('<QHH')
+KEY = struct.Struct('<Q')
+MAX_WEIGHT = 0xffff
+BOOK_PLIES = 24
+
+
+def collect(lines, max_plies=BOOK_PLIES):
+    counts = Counter()
+    games = 0
+    for headers, movetext in pgn.read_games(lines):
+        if 'FEN' in headers:
+            continue
+        board = pgn.BitboardBoard(rules.START_FEN)
+        position = board.position
+        for ply, token in enumerate(pgn.tokens(movetext)):
+            if ply >= max_plies or token in pgn.RESULTS:
+                break
+            try:
+                move = pgn.parse_san(board, token)
+            except ValueError:
+                break
+            counts[position.hash, move] += 1
+            board.play(move)
+        games += 1
+    return counts, games
+
+
+def write(path, counts, min_count=1):
+    records = sorted(((key, move, min(count, MAX_WEIGHT)) for (key, move), count in counts.items()
+                      if count >= min_count), key=lambda record: (record[0], -record[2], record[1]))
+    with open(path, 'wb') as out:
+        out.write(BOOK_MAGIC)
+        for record in records:
+            out.write(RECORD.pack(*record))
+    return len(records)
+
+
+def build(lines, path, max_plies=BOOK_PLIES, min_count=1):
+    counts, games = collect(lines, max_plies)
+    return games, write(path, counts, min_count)
+
+
+# Opening only maps the file: no parsing, so cost does not grow with the book,
+# and every process reading the same book shares its page cache pages.
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(BOOK_MAGIC)] != BOOK_MAGIC or (len(self.map) - len(BOOK_MAGIC)) % RECORD.size:
+            self.close()
+            raise ValueError(f'Sach khai cuoc khong hop le: {path}')
+        self.count = (len(self.map) - len(BOOK_MAGIC)) // RECORD.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, index):
+        return KEY.unpack_from(self.map, len(BOOK_MAGIC) + index * RECORD.size)[0]
+
+    def _lower_bound(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, key):
+        found = []
+        offset = len(BOOK_MAGIC) + self._lower_bound(key) * RECORD.size
+        end = len(self.map)
+        while offset < end:
+            record_key, move, weight = RECORD.unpack_from(self.map, offset)
+            if record_key != key:
+                break
+            found.append((move, weight))
+            offset += RECORD.size
+        return found
+
+    def probe(self, position):
+        if not isinstance(position, Position):
+            position = Position.from_game(position, position.turn)
+        entries = self.entries(position.hash)
+        if entries:
+            legal = set(position.legal_moves())
+            entries = [(move, weight) for move, weight in entries if move in legal]
+        return entries
+
+    def choose(self, position, rng=random, best=False):
+        entries = self.probe(position)
+        if not entries:
+            return 0
+        if best:
+            return entries[0][0]
+        return rng.choices([move for move, _ in entries], [weight for _, weight in entries])[0]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.file.close()
+
+
+def open_book(path):
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv):
+    source, path = argv[1], argv[2]
+    max_plies = int(argv[3]) if len(argv) > 3 else BOOK_PLIES
+    min_count = int(argv[4]) if len(argv) > 4 else 1
+    start = time.perf_counter()
+    with open(source, encoding='utf-8', errors='replace') as lines:
+        games, records = build(lines, path, max_plies, min_count)
+    elapsed = time.perf_counter() - start
+    print(f'{games} van, {records} muc, {elapsed:.2f} s')
+    with OpeningBook(path) as book:
+        for move, weight in book.probe(Position.initial()):
+            print(f'{move_name(move)}\t{weight}')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
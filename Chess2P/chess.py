@@ -1,13 +1,33 @@
 import asyncio
 import platform
+import time
 import pygame
-import abc
+from rules import GameState, START_FEN, PIECE_CODES, PROMOTION_CLASSES, King
+from bitboard import COLOR_NAMES, PIECE_NAMES, Position, move_name
+from analysis import Analysis
+from search import Searcher, SearchLimits, SearchResult, best_move, known_move
+from book import open_book
+from tablebase import open_tablebases
+from metrics import METRICS
+from journal import Journal, JOURNAL_PATH
 
 WIDTH = 800
 HEIGHT = 720
 SQUARE_SIZE = 80
 FPS = 60
-BOARD_SIZE = 8
+BLINK_FRAMES = 30
+IDLE_POLL = 0.05
+IDLE_AFTER = 1.0
+COMPUTER_MOVETIME = 1.0
+HINT_MOVETIME = 0.5
+BOOK_PATH = 'assets/book.bin'
+METRICS_PATHS = ('metrics.json', 'metrics.prom')
+METRICS_INTERVAL = 0.5
+METRICS_RECT = (0, 0, 400, 184)
+ANALYSIS_RECT = (644, 576, 152, 60)
+PIECE_SIZE = (64, 64)
+PAWN_SIZE = (52, 52)
+SMALL_PIECE_SIZE = (36, 36)
 COLORS = {
     'dark_gray': (100, 100, 100),
     'light_gray': (200, 200, 200),
@@ -21,180 +41,27 @@ COLORS = {
     'dark_blue': (0, 0, 139)
 }
 
-class Piece(abc.ABC):
-    def __init__(self, color, position):
-        self.color = color
-        self.position = position
-        self.has_moved = False
-        self.image = None
-        self.small_image = None
-
-    @abc.abstractmethod
-    def get_raw_valid_moves(self, game):
-        pass
-
-    @abc.abstractmethod
-    def get_valid_moves(self, game):
-        pass
-
-    def load_image(self, name, size_large=(64, 64), size_small=(36, 36)):
-        self.image = pygame.transform.scale(
-            pygame.image.load(f'assets/images/{self.color}_{name}.png'), size_large)
-        self.small_image = pygame.transform.scale(
-            pygame.image.load(f'assets/images/{self.color}_{name}.png'), size_small)
-
-class Pawn(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
-        self.load_image('pawn', size_large=(52, 52))
-        
-    def get_raw_valid_moves(self, game):
-        moves = []
-        x, y = self.position
-        direction = 1 if self.color == 'white' else -1
-        start_row = 1 if self.color == 'white' else 6
-        
-        one_step = (x, y + direction)
-        if game.is_valid_square(one_step) and not game.is_occupied(one_step):
-            moves.append(one_step)
-            two_steps = (x, y + 2 * direction)
-            if y == start_row and game.is_valid_square(two_steps) and not game.is_occupied(two_steps):
-                moves.append(two_steps)
-        
-        for dx in [-1, 1]:
-            capture = (x + dx, y + direction)
-            if game.is_valid_square(capture) and game.is_enemy_piece(capture, self.color):
-                moves.append(capture)
-            ep = game.get_en_passant_target(self.color)
-            if capture == ep:
-                moves.append(capture)
-        
-        return moves, []
-
-    def get_valid_moves(self, game):
-        moves, castle_moves = self.get_raw_valid_moves(game)
-        valid_moves = [move for move in moves if not game.would_expose_king(self, move)]
-        return valid_moves, castle_moves
-
-class Rook(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
-        self.load_image('rook')
-        
-    def get_raw_valid_moves(self, game):
-        moves = self._get_linear_moves(game, [(0, 1), (0, -1), (1, 0), (-1, 0)])
-        return moves, []
-    
-    def get_valid_moves(self, game):
-        moves, castle_moves = self.get_raw_valid_moves(game)
-        valid_moves = [move for move in moves if not game.would_expose_king(self, move)]
-        return valid_moves, castle_moves
-    
-    def _get_linear_moves(self, game, directions):
-        moves = []
-        x, y = self.position
-        for dx, dy in directions:
-            for i in range(1, BOARD_SIZE):
-                target = (x + i * dx, y + i * dy)
-                if not game.is_valid_square(target):
-                    break
-                if game.is_occupied_by_friend(target, self.color):
-                    break
-                moves.append(target)
-                if game.is_occupied_by_enemy(target, self.color):
-                    break
-        return moves
-
-class Knight(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
-        self.load_image('knight')
-        
-    def get_raw_valid_moves(self, game):
-        moves = []
-        x, y = self.position
-        targets = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]
-        for dx, dy in targets:
-            target = (x + dx, y + dy)
-            if game.is_valid_square(target) and not game.is_occupied_by_friend(target, self.color):
-                moves.append(target)
-        return moves, []
-
-    def get_valid_moves(self, game):
-        moves, castle_moves = self.get_raw_valid_moves(game)
-        valid_moves = [move for move in moves if not game.would_expose_king(self, move)]
-        return valid_moves, castle_moves
-
-class Bishop(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
-        self.load_image('bishop')
-        
-    def get_raw_valid_moves(self, game):
-        moves = self._get_linear_moves(game, [(1, 1), (1, -1), (-1, 1), (-1, -1)])
-        return moves, []
+# Sprites are keyed by piece code (color << 3 | kind), so game state carries
+# no surfaces and the board looks a piece's image up from its code alone.
+class SpriteCache:
+    def __init__(self, path='assets/images'):
+        self.path = path
+        self.sources = {}
+        self.scaled = {}
     
-    def get_valid_moves(self, game):
-        moves, castle_moves = self.get_raw_valid_moves(game)
-        valid_moves = [move for move in moves if not game.would_expose_king(self, move)]
-        return valid_moves, castle_moves
-    
-    def _get_linear_moves(self, game, directions):
-        return Rook._get_linear_moves(self, game, directions)
-
-class Queen(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
-        self.load_image('queen')
-        
-    def get_raw_valid_moves(self, game):
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-        moves = Rook._get_linear_moves(self, game, directions)
-        return moves, []
+    def get(self, code, size):
+        key = (code, size)
+        image = self.scaled.get(key)
+        if image is None:
+            source = self.sources.get(code)
+            if source is None:
+                source = pygame.image.load(f'{self.path}/{COLOR_NAMES[code >> 3]}_{PIECE_NAMES[code & 7]}.png')
+                self.sources[code] = source
+            image = pygame.transform.scale(source, size)
+            self.scaled[key] = image
+        return image
 
-    def get_valid_moves(self, game):
-        moves, castle_moves = self.get_raw_valid_moves(game)
-        valid_moves = [move for move in moves if not game.would_expose_king(self, move)]
-        return valid_moves, castle_moves
-
-class King(Piece):
-    def __init__(self, color, position):
-        super().__init__(color, position)
-        self.load_image('king')
-        
-    def get_raw_valid_moves(self, game):
-        moves = []
-        castle_moves = []
-        x, y = self.position
-        targets = [(1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1)]
-        
-        for dx, dy in targets:
-            target = (x + dx, y + dy)
-            if game.is_valid_square(target) and not game.is_occupied_by_friend(target, self.color):
-                moves.append(target)
-        
-        if not self.has_moved and not game.is_in_check(self.color):
-            for rook_pos in [(0, y), (7, y)]:
-                rook = game.get_piece_at(rook_pos)
-                if isinstance(rook, Rook) and rook.color == self.color and not rook.has_moved:
-                    if rook_pos[0] > x:
-                        squares = [(x + 1, y), (x + 2, y)]
-                        final_king = (x + 2, y)
-                        final_rook = (x + 1, y)
-                    else:
-                        squares = [(x - 1, y), (x - 2, y), (x - 3, y)]
-                        final_king = (x - 2, y)
-                        final_rook = (x - 1, y)
-                    if all(not game.is_occupied(s) for s in squares[:2]) and \
-                       all(not game.is_square_attacked(s, self.color) for s in squares[:2]):
-                        castle_moves.append((final_king, final_rook))
-        
-        return moves, castle_moves
-
-    def get_valid_moves(self, game):
-        moves, castle_moves = self.get_raw_valid_moves(game)
-        valid_moves = [move for move in moves if not game.would_expose_king(self, move)]
-        return valid_moves, castle_moves
+SPRITES = SpriteCache()
 
 class Board:
     def __init__(self, screen):
@@ -202,332 +69,282 @@ class Board:
         self.font = pygame.font.Font('freesansbold.ttf', 16)
         self.medium_font = pygame.font.Font('freesansbold.ttf', 32)
         self.big_font = pygame.font.Font('freesansbold.ttf', 40)
+        self.text_cache = {}
+        self.background = self._draw_squares()
+        self.metrics_shown = False
+        self.metrics_due = 0.0
+        self.metrics_lines = []
+        self.invalidate()
+        
+    def invalidate(self):
+        self.square_state = [[None] * 8 for _ in range(8)]
+        self.status_state = None
+        self.panel_state = None
+        self.overlay_state = None
         
     def draw(self, game):
-        self.screen.fill(COLORS['dark_gray'])
-        self._draw_squares()
-        self._draw_status(game)
-        self._draw_pieces(game)
-        self._draw_captured(game)
-        self._draw_check(game)
+        marks = self._collect_marks(game)
+        if game.winner != self.overlay_state:
+            self.invalidate()
+            self.overlay_state = game.winner
+            rect = self.screen.get_rect()
+            self._paint(game, rect, marks, [(x, y) for x in range(8) for y in range(8)])
+            dirty = [rect]
+        else:
+            dirty = []
+        
+        status = (game.turn_step, game.white_promote or game.black_promote)
+        panel = (tuple(game.captured_pieces['white']), tuple(game.captured_pieces['black']),
+                 game.white_promote, game.black_promote, game.analysis_lines)
+        if status != self.status_state:
+            self.status_state = status
+            rect = pygame.Rect(0, 640, WIDTH, SQUARE_SIZE)
+            self._paint(game, rect, marks, [(x, 7) for x in range(8)])
+            dirty.append(rect)
+        if panel != self.panel_state or dirty:
+            self.panel_state = panel
+            rect = pygame.Rect(640, 0, WIDTH - 640, HEIGHT)
+            self._paint(game, rect, marks, [(7, y) for y in range(8)])
+            dirty.append(rect)
+        
+        now = time.monotonic()
+        if METRICS.enabled != self.metrics_shown or (METRICS.enabled and now >= self.metrics_due):
+            self.metrics_shown = METRICS.enabled
+            self.metrics_due = now + METRICS_INTERVAL
+            self.metrics_lines = METRICS.overlay_lines() if METRICS.enabled else []
+            rect = pygame.Rect(METRICS_RECT)
+            self._paint(game, rect, marks, [(x, y) for x in range(6) for y in range(4)])
+            dirty.append(rect)
+        
+        changed = set()
+        for x in range(8):
+            for y in range(8):
+                state = marks.get((x, y))
+                if state != self.square_state[x][y]:
+                    self.square_state[x][y] = state
+                    changed.update((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                                   if 0 <= x + dx < 8 and 0 <= y + dy < 8)
+        for x, y in sorted(changed):
+            rect = pygame.Rect(x * SQUARE_SIZE, y * SQUARE_SIZE, SQUARE_SIZE + 2, SQUARE_SIZE + 2)
+            self._paint(game, rect, marks, [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+            dirty.append(rect)
+        METRICS.count('dirty_rects', len(dirty))
+        return dirty
+    
+    def _text(self, font, text, color):
+        key = (id(font), text, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.text_cache[key] = surface
+        return surface
+    
+    def _collect_marks(self, game):
+        marks = {}
+        for piece in game.pieces:
+            marks[piece.position] = [('piece', piece.code, piece is game.selected_piece)]
+        if game.hint:
+            for pos in game.hint:
+                marks.setdefault(pos, []).append(('hint',))
+        check = self._check_mark(game)
+        if check:
+            marks.setdefault(check[0], []).append(('check', check[1]))
         if game.selected_piece:
-            self._draw_valid_moves(game)
+            color = 'red' if game.turn_step < 2 else 'blue'
+            for move in game.valid_moves:
+                marks.setdefault(move, []).append(('move', color))
             if isinstance(game.selected_piece, King):
-                self._draw_castling(game)
+                for king_pos, rook_pos in game.castle_moves:
+                    marks.setdefault(king_pos, []).append(('castle', color, king_pos, rook_pos))
+                    marks.setdefault(rook_pos, []).append(('castle', color, king_pos, rook_pos))
+        return {pos: tuple(items) for pos, items in marks.items()}
+    
+    def _paint(self, game, rect, marks, squares):
+        self.screen.set_clip(rect)
+        self.screen.blit(self.background, rect, rect)
+        self._draw_status(game)
+        for layer in ('hint', 'piece', 'check', 'move', 'castle'):
+            for pos in squares:
+                for mark in marks.get(pos, ()):
+                    if mark[0] != layer:
+                        continue
+                    if layer == 'hint':
+                        self._draw_hint(pos)
+                    elif layer == 'piece':
+                        self._draw_piece(pos, *mark[1:])
+                    elif layer == 'check':
+                        self._draw_check_border(pos, mark[1])
+                    elif layer == 'move':
+                        self._draw_valid_move(pos, mark[1])
+                    elif pos == mark[2] or (pos == mark[3] and mark[2] not in squares):
+                        self._draw_castling(mark[1], mark[2], mark[3])
+        self._draw_captured(game)
+        if game.analysis_lines:
+            self._draw_analysis(game)
         if game.white_promote or game.black_promote:
             self._draw_promotion(game)
         if game.winner:
             self._draw_game_over(game)
+        if self.metrics_shown:
+            self._draw_metrics()
+        self.screen.set_clip(None)
         
     def _draw_squares(self):
+        background = pygame.Surface((WIDTH, HEIGHT))
+        background.fill(COLORS['dark_gray'])
         for i in range(32):
             col = i % 4
             row = i // 4
             x = 480 - (col * 160) if row % 2 == 0 else 560 - (col * 160)
-            pygame.draw.rect(self.screen, COLORS['light_gray'], [x, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE])
-        pygame.draw.rect(self.screen, COLORS['gray'], [0, 640, WIDTH, SQUARE_SIZE])
-        pygame.draw.rect(self.screen, COLORS['gold'], [0, 640, WIDTH, SQUARE_SIZE], 4)
-        pygame.draw.rect(self.screen, COLORS['gold'], [640, 0, 160, HEIGHT], 4)
+            pygame.draw.rect(background, COLORS['light_gray'], [x, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE])
+        pygame.draw.rect(background, COLORS['gray'], [0, 640, WIDTH, SQUARE_SIZE])
+        pygame.draw.rect(background, COLORS['gold'], [0, 640, WIDTH, SQUARE_SIZE], 4)
+        pygame.draw.rect(background, COLORS['gold'], [640, 0, 160, HEIGHT], 4)
         for i in range(9):
-            pygame.draw.line(self.screen, COLORS['black'], (0, SQUARE_SIZE * i), (640, SQUARE_SIZE * i), 2)
-            pygame.draw.line(self.screen, COLORS['black'], (SQUARE_SIZE * i, 0), (SQUARE_SIZE * i, 640), 2)
-        self.screen.blit(self.medium_font.render('BO CUOC', True, COLORS['black']), (648, 664))
+            pygame.draw.line(background, COLORS['black'], (0, SQUARE_SIZE * i), (640, SQUARE_SIZE * i), 2)
+            pygame.draw.line(background, COLORS['black'], (SQUARE_SIZE * i, 0), (SQUARE_SIZE * i, 640), 2)
+        background.blit(self.medium_font.render('BO CUOC', True, COLORS['black']), (648, 664))
+        return background
         
     def _draw_status(self, game):
         status_text = ['Trang: Chon quan de di chuyen', 'Trang: Chon diem den',
                       'Den: Chon quan de di chuyen', 'Den: Chon diem den']
-        self.screen.blit(self.big_font.render(status_text[game.turn_step], True, COLORS['black']), (16, 656))
+        self.screen.blit(self._text(self.big_font, status_text[game.turn_step], COLORS['black']), (16, 656))
         if game.white_promote or game.black_promote:
             pygame.draw.rect(self.screen, COLORS['gray'], [0, 640, WIDTH - 160, SQUARE_SIZE])
             pygame.draw.rect(self.screen, COLORS['gold'], [0, 640, WIDTH - 160, SQUARE_SIZE], 4)
-            self.screen.blit(self.big_font.render('Chon quan de phong cap Tot', True, COLORS['black']), (16, 656))
+            self.screen.blit(self._text(self.big_font, 'Chon quan de phong cap Tot', COLORS['black']), (16, 656))
             
-    def _draw_pieces(self, game):
-        for piece in game.pieces:
-            x, y = piece.position
-            offset = (18, 24) if isinstance(piece, Pawn) else (8, 8)
-            self.screen.blit(piece.image, (x * SQUARE_SIZE + offset[0], y * SQUARE_SIZE + offset[1]))
-            if piece == game.selected_piece:
-                color = COLORS['red'] if piece.color == 'white' else COLORS['blue']
-                pygame.draw.rect(self.screen, color, [x * SQUARE_SIZE + 1, y * SQUARE_SIZE + 1, SQUARE_SIZE, SQUARE_SIZE], 2)
+    def _draw_piece(self, pos, code, selected):
+        x, y = pos
+        pawn = PIECE_NAMES[code & 7] == 'pawn'
+        offset = (18, 24) if pawn else (8, 8)
+        image = SPRITES.get(code, PAWN_SIZE if pawn else PIECE_SIZE)
+        self.screen.blit(image, (x * SQUARE_SIZE + offset[0], y * SQUARE_SIZE + offset[1]))
+        if selected:
+            border = COLORS['red'] if COLOR_NAMES[code >> 3] == 'white' else COLORS['blue']
+            pygame.draw.rect(self.screen, border, [x * SQUARE_SIZE + 1, y * SQUARE_SIZE + 1, SQUARE_SIZE, SQUARE_SIZE], 2)
                 
     def _draw_captured(self, game):
-        piece_types = ['pawn', 'queen', 'king', 'knight', 'rook', 'bishop']
         for i, piece_type in enumerate(game.captured_pieces['white']):
-            if piece_type in piece_types:
-                index = piece_types.index(piece_type)
-                self.screen.blit(game.white_small_images[index], (660, 8 + 48 * i))
+            self.screen.blit(SPRITES.get(PIECE_CODES['white', piece_type], SMALL_PIECE_SIZE), (660, 8 + 48 * i))
         for i, piece_type in enumerate(game.captured_pieces['black']):
-            if piece_type in piece_types:
-                index = piece_types.index(piece_type)
-                self.screen.blit(game.black_small_images[index], (740, 8 + 48 * i))
+            self.screen.blit(SPRITES.get(PIECE_CODES['black', piece_type], SMALL_PIECE_SIZE), (740, 8 + 48 * i))
             
-    def _draw_check(self, game):
-        if game.counter >= 30:
+    def _draw_analysis(self, game):
+        pygame.draw.rect(self.screen, COLORS['light_gray'], ANALYSIS_RECT)
+        pygame.draw.rect(self.screen, COLORS['gold'], ANALYSIS_RECT, 2)
+        for i, line in enumerate(game.analysis_lines):
+            self.screen.blit(self._text(self.font, line, COLORS['black']),
+                             (ANALYSIS_RECT[0] + 6, ANALYSIS_RECT[1] + 8 + 22 * i))
+            
+    def _check_mark(self, game):
+        if game.counter >= BLINK_FRAMES:
             game.counter = 0
+        if game.counter >= BLINK_FRAMES // 2:
+            return None
         if game.is_in_check('white') and game.turn_step < 2:
             king = game.get_king('white')
-            if king and game.counter < 15:
-                pygame.draw.rect(self.screen, COLORS['dark_red'], [king.position[0] * SQUARE_SIZE + 1,
-                                                                  king.position[1] * SQUARE_SIZE + 1, SQUARE_SIZE, SQUARE_SIZE], 4)
+            if king:
+                return king.position, 'dark_red'
         elif game.is_in_check('black') and game.turn_step >= 2:
             king = game.get_king('black')
-            if king and game.counter < 15:
-                pygame.draw.rect(self.screen, COLORS['dark_blue'], [king.position[0] * SQUARE_SIZE + 1,
-                                                                   king.position[1] * SQUARE_SIZE + 1, SQUARE_SIZE, SQUARE_SIZE], 4)
+            if king:
+                return king.position, 'dark_blue'
+        return None
+    
+    def _draw_check_border(self, pos, color):
+        pygame.draw.rect(self.screen, COLORS[color], [pos[0] * SQUARE_SIZE + 1, pos[1] * SQUARE_SIZE + 1,
+                                                      SQUARE_SIZE, SQUARE_SIZE], 4)
                 
-    def _draw_valid_moves(self, game):
-        color = COLORS['red'] if game.turn_step < 2 else COLORS['blue']
-        for move in game.valid_moves:
-            pygame.draw.circle(self.screen, color, (move[0] * SQUARE_SIZE + 40, move[1] * SQUARE_SIZE + 40), 4)
+    def _draw_metrics(self):
+        rect = pygame.Rect(METRICS_RECT)
+        overlay = pygame.Surface(rect.size, pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))
+        self.screen.blit(overlay, rect)
+        lines = self.metrics_lines or ['dang do...']
+        for i, line in enumerate(lines):
+            self.screen.blit(self.font.render(line, True, COLORS['white']), (8, 8 + 20 * i))
+    
+    def _draw_hint(self, pos):
+        pygame.draw.rect(self.screen, COLORS['gold'], [pos[0] * SQUARE_SIZE + 1, pos[1] * SQUARE_SIZE + 1,
+                                                       SQUARE_SIZE, SQUARE_SIZE], 6)
+
+    def _draw_valid_move(self, move, color):
+        pygame.draw.circle(self.screen, COLORS[color], (move[0] * SQUARE_SIZE + 40, move[1] * SQUARE_SIZE + 40), 4)
             
-    def _draw_castling(self, game):
-        color = COLORS['red'] if game.turn_step < 2 else COLORS['blue']
-        for king_pos, rook_pos in game.castle_moves:
-            pygame.draw.circle(self.screen, color, (king_pos[0] * SQUARE_SIZE + 40, king_pos[1] * SQUARE_SIZE + 56), 6)
-            self.screen.blit(self.font.render('vua', True, COLORS['black']),
-                            (king_pos[0] * SQUARE_SIZE + 24, king_pos[1] * SQUARE_SIZE + 56))
-            pygame.draw.circle(self.screen, color, (rook_pos[0] * SQUARE_SIZE + 40, rook_pos[1] * SQUARE_SIZE + 56), 6)
-            self.screen.blit(self.font.render('xe', True, COLORS['black']),
-                            (rook_pos[0] * SQUARE_SIZE + 24, rook_pos[1] * SQUARE_SIZE + 56))
-            pygame.draw.line(self.screen, color,
-                            (king_pos[0] * SQUARE_SIZE + 40, king_pos[1] * SQUARE_SIZE + 56),
-                            (rook_pos[0] * SQUARE_SIZE + 40, rook_pos[1] * SQUARE_SIZE + 56), 2)
+    def _draw_castling(self, color, king_pos, rook_pos):
+        color = COLORS[color]
+        pygame.draw.circle(self.screen, color, (king_pos[0] * SQUARE_SIZE + 40, king_pos[1] * SQUARE_SIZE + 56), 6)
+        self.screen.blit(self._text(self.font, 'vua', COLORS['black']),
+                        (king_pos[0] * SQUARE_SIZE + 24, king_pos[1] * SQUARE_SIZE + 56))
+        pygame.draw.circle(self.screen, color, (rook_pos[0] * SQUARE_SIZE + 40, rook_pos[1] * SQUARE_SIZE + 56), 6)
+        self.screen.blit(self._text(self.font, 'xe', COLORS['black']),
+                        (rook_pos[0] * SQUARE_SIZE + 24, rook_pos[1] * SQUARE_SIZE + 56))
+        pygame.draw.line(self.screen, color,
+                        (king_pos[0] * SQUARE_SIZE + 40, king_pos[1] * SQUARE_SIZE + 56),
+                        (rook_pos[0] * SQUARE_SIZE + 40, rook_pos[1] * SQUARE_SIZE + 56), 2)
             
     def _draw_promotion(self, game):
         pygame.draw.rect(self.screen, COLORS['dark_gray'], [640, 0, 160, 336])
-        promotions = game.white_promotions if game.white_promote else game.black_promotions
-        images = game.white_images if game.white_promote else game.black_images
+        piece_color = 'white' if game.white_promote else 'black'
         color = COLORS['white'] if game.white_promote else COLORS['black']
-        for i, piece in enumerate(promotions):
-            index = ['pawn', 'queen', 'king', 'knight', 'rook', 'bishop'].index(piece)
-            self.screen.blit(images[index], (688, 4 + 80 * i))
+        for i, piece_class in enumerate(PROMOTION_CLASSES):
+            self.screen.blit(SPRITES.get(PIECE_CODES[piece_color, piece_class.name], PIECE_SIZE), (688, 4 + 80 * i))
         pygame.draw.rect(self.screen, color, [640, 0, 160, 336], 6)
         
     def _draw_game_over(self, game):
         pygame.draw.rect(self.screen, COLORS['black'], [160, 160, 320, 56])
-        winner_text = 'Hoa' if game.winner == 'Hoa' else f'{game.winner} thang'
-        self.screen.blit(self.font.render(winner_text, True, COLORS['white']), (168, 168))
-        self.screen.blit(self.font.render('Nhan ENTER de choi lai', True, COLORS['white']), (168, 192))
+        if game.winner == 'Hoa':
+            reason = game.draw_reason()
+            winner_text = f'Hoa: {reason}' if reason else 'Hoa'
+        else:
+            winner_text = f'{game.winner} thang'
+        self.screen.blit(self._text(self.font, winner_text, COLORS['white']), (168, 168))
+        self.screen.blit(self._text(self.font, 'Nhan ENTER de choi lai', COLORS['white']), (168, 192))
+
 
-class ChessGame:
-    def __init__(self):
+class ChessGame(GameState):
+    def __init__(self, engine=None, computer=None):
         pygame.init()
         self.screen = pygame.display.set_mode([WIDTH, HEIGHT])
         pygame.display.set_caption('Co Vua Hai Nguoi Pygame')
-        self.clock = pygame.time.Clock()
         self.board = Board(self.screen)
-        self.reset()
+        self.running = True
+        self.blink = None
+        self.last_event = 0.0
+        self.computer = computer
+        self.review_ply = None
+        self.final_winner = ''
+        self.book = open_book(BOOK_PATH)
+        self.hint = None
+        self.analysis = None
+        self.analysing = False
+        tablebases = open_tablebases()
+        self.searcher = Searcher(tablebases=tablebases) if tablebases else None
+        super().__init__(engine, tablebases=tablebases)
         
-    def reset(self):
-        self.pieces = []
-        self.captured_pieces = {'white': [], 'black': []}
-        self.white_images = []
-        self.black_images = []
-        self.white_small_images = []
-        self.black_small_images = []
-        self.white_promotions = ['queen', 'rook', 'bishop', 'knight']
-        self.black_promotions = ['queen', 'rook', 'bishop', 'knight']
+    def reset(self, fen=START_FEN):
+        super().reset(fen)
         self.turn_step = 0
         self.selected_piece = None
         self.valid_moves = []
         self.castle_moves = []
-        self.winner = ''
-        self.game_over = False
-        self.white_ep = (100, 100)
-        self.black_ep = (100, 100)
-        self.white_promote = False
-        self.black_promote = False
-        self.promo_index = None
         self.counter = 0
+        self.hint = None
+        self.analysis_lines = ()
         
-        piece_order = ['rook', 'knight', 'bishop', 'queen', 'king', 'bishop', 'knight', 'rook']
-        for i in range(8):
-            self.pieces.append(Pawn('white', (i, 1)))
-            self.pieces.append(Pawn('black', (i, 6)))
-            piece_class = {'rook': Rook, 'knight': Knight, 'bishop': Bishop, 'queen': Queen, 'king': King}[piece_order[i]]
-            self.pieces.append(piece_class('white', (i, 0)))
-            self.pieces.append(piece_class('black', (i, 7)))
-        
-        white_king = self.get_king('white')
-        black_king = self.get_king('black')
-        if not white_king or not black_king:
-            raise RuntimeError("Khong the khoi tao vua trong reset")
-        
-        for piece_type in ['pawn', 'queen', 'king', 'knight', 'rook', 'bishop']:
-            piece = next(p for p in self.pieces if p.color == 'white' and piece_type in str(type(p)).lower())
-            self.white_images.append(piece.image)
-            self.white_small_images.append(piece.small_image)
-            piece = next(p for p in self.pieces if p.color == 'black' and piece_type in str(type(p)).lower())
-            self.black_images.append(piece.image)
-            self.black_small_images.append(piece.small_image)
-            
-    def is_valid_square(self, pos):
-        x, y = pos
-        return 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE
-    
-    def is_occupied(self, pos):
-        return any(p.position == pos for p in self.pieces)
-    
-    def is_occupied_by_friend(self, pos, color):
-        return any(p.position == pos and p.color == color for p in self.pieces)
-    
-    def is_occupied_by_enemy(self, pos, color):
-        return any(p.position == pos and p.color != color for p in self.pieces)
-    
-    def is_enemy_piece(self, pos, color):
-        return self.is_occupied_by_enemy(pos, color)
-    
-    def get_piece_at(self, pos):
-        for piece in self.pieces:
-            if piece.position == pos:
-                return piece
-        return None
-    
-    def get_king(self, color):
-        for piece in self.pieces:
-            if isinstance(piece, King) and piece.color == color:
-                return piece
-        return None
-    
-    def get_en_passant_target(self, color):
-        return self.black_ep if color == 'white' else self.white_ep
-    
-    def is_in_check(self, color):
-        king = self.get_king(color)
-        if not king:
-            return False
-        enemy_pieces = [p for p in self.pieces if p.color != color and not isinstance(p, King)]
-        for piece in enemy_pieces:
-            moves, _ = piece.get_raw_valid_moves(self)
-            if king.position in moves:
-                return True
-        return False
-    
-    def is_square_attacked(self, pos, color):
-        enemy_pieces = [p for p in self.pieces if p.color != color and not isinstance(p, King)]
-        for piece in enemy_pieces:
-            moves, _ = piece.get_raw_valid_moves(self)
-            if pos in moves:
-                return True
-        return False
-    
-    def would_expose_king(self, piece, new_pos):
-        original_pos = piece.position
-        captured = self.get_piece_at(new_pos)
-        piece.position = new_pos
-        if captured and captured != piece:
-            self.pieces.remove(captured)
-        
-        in_check = self.is_in_check(piece.color)
-        
-        piece.position = original_pos
-        if captured and captured != piece:
-            self.pieces.append(captured)
-        
-        return in_check
-    
-    def is_checkmate_or_stalemate(self, color):
-        if not self.is_in_check(color):
-            for piece in self.pieces:
-                if piece.color == color:
-                    moves, castle_moves = piece.get_valid_moves(self)
-                    if moves or castle_moves:
-                        return False, False
-            return True, False
-        else:
-            for piece in self.pieces:
-                if piece.color == color:
-                    moves, castle_moves = piece.get_valid_moves(self)
-                    if moves or castle_moves:
-                        return False, False
-            return False, True
-        return False, False
-    
-    def check_promotion(self):
-        self.white_promote = False
-        self.black_promote = False
-        self.promo_index = None
-        for piece in self.pieces:
-            if isinstance(piece, Pawn):
-                if piece.color == 'white' and piece.position[1] == 7:
-                    self.white_promote = True
-                    self.promo_index = piece
-                elif piece.color == 'black' and piece.position[1] == 0:
-                    self.black_promote = True
-                    self.promo_index = piece
-        return self.white_promote, self.black_promote, self.promo_index
-    
     def handle_promotion_selection(self, pos):
         x, y = pos
         if (self.white_promote or self.black_promote) and x > 7 and y < 4:
-            promotions = self.white_promotions if self.white_promote else self.black_promotions
-            piece_class = {'queen': Queen, 'rook': Rook, 'bishop': Bishop, 'knight': Knight}[promotions[y]]
-            new_piece = piece_class(self.promo_index.color, self.promo_index.position)
-            self.pieces.remove(self.promo_index)
-            self.pieces.append(new_piece)
+            self.promote(self.promo_index, PROMOTION_CLASSES[y])
             self.white_promote = False
             self.black_promote = False
             self.promo_index = None
-    
-    def check_en_passant(self, piece, old_pos, new_pos):
-        if isinstance(piece, Pawn) and abs(old_pos[1] - new_pos[1]) == 2:
-            return (new_pos[0], (old_pos[1] + new_pos[1]) // 2)
-        return (100, 100)
-    
-    def handle_move(self, piece, new_pos):
-        old_pos = piece.position
-        captured = self.get_piece_at(new_pos)
-        piece.position = new_pos
-        piece.has_moved = True
-        
-        if captured and captured.color != piece.color:
-            if isinstance(captured, King):
-                return
-            piece_type_map = {
-                Pawn: 'pawn',
-                Queen: 'queen',
-                King: 'king',
-                Knight: 'knight',
-                Rook: 'rook',
-                Bishop: 'bishop'
-            }
-            piece_type = piece_type_map.get(type(captured), '')
-            if piece_type:
-                self.captured_pieces[captured.color].append(piece_type)
-                self.pieces.remove(captured)
-        
-        ep_target = self.black_ep if piece.color == 'white' else self.white_ep
-        if new_pos == ep_target and isinstance(piece, Pawn):
-            captured_pos = (ep_target[0], ep_target[1] - 1 if piece.color == 'white' else ep_target[1] + 1)
-            captured = self.get_piece_at(captured_pos)
-            if captured:
-                self.captured_pieces[captured.color].append('pawn')
-                self.pieces.remove(captured)
-        
-        if piece.color == 'white':
-            self.white_ep = self.check_en_passant(piece, old_pos, new_pos)
-            self.black_ep = (100, 100)
-        else:
-            self.black_ep = self.check_en_passant(piece, old_pos, new_pos)
-            self.white_ep = (100, 100)
-    
-    def handle_castling(self, king, new_pos):
-        if king.position[0] > new_pos[0]:
-            rook_pos = (0, king.position[1])
-            new_rook_pos = (new_pos[0] + 1, new_pos[1])
-        else:
-            rook_pos = (7, king.position[1])
-            new_rook_pos = (new_pos[0] - 1, new_pos[1])
-        rook = self.get_piece_at(rook_pos)
-        if rook:
-            king.position = new_pos
-            king.has_moved = True
-            rook.position = new_rook_pos
-            rook.has_moved = True
+            self.update_game_over()
     
     def handle_click(self, pos):
-        if self.game_over:
+        if self.game_over or self.turn == self.computer:
             return
         x, y = pos[0] // SQUARE_SIZE, pos[1] // SQUARE_SIZE
         click_pos = (x, y)
@@ -540,13 +357,15 @@ class ChessGame:
             self.handle_promotion_selection(click_pos)
             return
         
+        moved = False
         if self.turn_step <= 1:
             if self.is_valid_square(click_pos) and self.get_piece_at(click_pos) and self.get_piece_at(click_pos).color == 'white':
                 self.selected_piece = self.get_piece_at(click_pos)
-                self.valid_moves, self.castle_moves = self.selected_piece.get_valid_moves(self)
+                self.valid_moves, self.castle_moves = self.get_valid_moves(self.selected_piece)
                 self.turn_step = 1
             elif click_pos in self.valid_moves and self.selected_piece:
                 self.handle_move(self.selected_piece, click_pos)
+                moved = True
                 self.turn_step = 2
                 self.selected_piece = None
                 self.valid_moves = []
@@ -555,6 +374,7 @@ class ChessGame:
                 for king_pos, _ in self.castle_moves:
                     if click_pos == king_pos:
                         self.handle_castling(self.selected_piece, click_pos)
+                        moved = True
                         self.turn_step = 2
                         self.selected_piece = None
                         self.valid_moves = []
@@ -563,10 +383,11 @@ class ChessGame:
         else:
             if self.is_valid_square(click_pos) and self.get_piece_at(click_pos) and self.get_piece_at(click_pos).color == 'black':
                 self.selected_piece = self.get_piece_at(click_pos)
-                self.valid_moves, self.castle_moves = self.selected_piece.get_valid_moves(self)
+                self.valid_moves, self.castle_moves = self.get_valid_moves(self.selected_piece)
                 self.turn_step = 3
             elif click_pos in self.valid_moves and self.selected_piece:
                 self.handle_move(self.selected_piece, click_pos)
+                moved = True
                 self.turn_step = 0
                 self.selected_piece = None
                 self.valid_moves = []
@@ -575,59 +396,269 @@ class ChessGame:
                 for king_pos, _ in self.castle_moves:
                     if click_pos == king_pos:
                         self.handle_castling(self.selected_piece, click_pos)
+                        moved = True
                         self.turn_step = 0
                         self.selected_piece = None
                         self.valid_moves = []
                         self.castle_moves = []
                         break
         
-        current_color = 'black' if self.turn_step < 2 else 'white'
-        is_stalemate, is_checkmate = self.is_checkmate_or_stalemate(current_color)
-        if is_checkmate:
-            self.winner = 'white' if current_color == 'black' else 'black'
-            self.game_over = True
-        elif is_stalemate:
-            self.winner = 'Hoa'
-            self.game_over = True
+        if moved:
+            self.hint = None
+            self.check_promotion()
+            if not (self.white_promote or self.black_promote):
+                self.update_game_over()
     
     def handle_keydown(self, key):
         if self.game_over and key == pygame.K_RETURN:
-            self.reset()
+            self.new_game()
+        elif self.game_over and key in (pygame.K_LEFT, pygame.K_RIGHT) and self.journal:
+            self.review(-1 if key == pygame.K_LEFT else 1)
+        elif key == pygame.K_z and self.journal:
+            self.undo()
+        elif key == pygame.K_y and self.journal:
+            self.redo()
+        elif key == pygame.K_c:
+            self.computer = None if self.computer else 'black'
+        elif key == pygame.K_m:
+            METRICS.toggle()
+        elif key == pygame.K_j:
+            for path in METRICS_PATHS:
+                METRICS.dump(path)
+            print(f"da ghi so do: {', '.join(METRICS_PATHS)}")
+        elif key == pygame.K_h:
+            self.toggle_analysis()
     
-    def setup(self):
+    # The worker process is started on first use; without one (e.g. the
+    # browser build) analysis is False and H falls back to the blocking
+    # one-shot hint, the computer to searching inside the frame.
+    def start_worker(self):
+        if self.analysis is None:
+            try:
+                self.analysis = Analysis()
+            except (ImportError, NotImplementedError, OSError):
+                self.analysis = False
+        return self.analysis
+    
+    def toggle_analysis(self):
+        if self.analysing:
+            self.analysing = False
+            self.hint = None
+            self.analysis_lines = ()
+            return
+        if not self.start_worker():
+            if not (self.game_over or self.white_promote or self.black_promote):
+                self.show_hint()
+            return
+        self.analysing = True
+    
+    # Called every frame: restarts the search when a click, computer move,
+    # undo or redo changed the position (the hash covers all of them). On
+    # the computer's turn the final result is played; otherwise the book's
+    # main move, or while out of book the deepest finished iteration so far,
+    # is shown as the hint.
+    def sync_analysis(self):
+        computer = self.turn == self.computer
+        idle = self.game_over or self.white_promote or self.black_promote or not (computer or self.analysing)
+        key = None if idle else (computer, self.hash)
+        changed = False
+        if key != self.analysis.key:
+            if key is None:
+                self.analysis.stop()
+            elif computer:
+                position = Position.from_game(self, self.turn)
+                known = known_move(position, self.searcher, self.book)
+                if known:
+                    self.analysis.show(key, position.side, known, '')
+                else:
+                    self.analysis.restart(position, key, COMPUTER_MOVETIME)
+            else:
+                position = Position.from_game(self, self.turn)
+                move = self.book.choose(position, best=True) if self.book is not None else 0
+                if move:
+                    self.analysis.show(key, position.side, SearchResult(move, 0, 0, 0, 0.0, [move]), 'sach khai cuoc')
+                else:
+                    self.analysis.restart(position, key)
+            self.hint = None
+            changed = True
+        if (self.analysis.poll() or changed) and not computer and self.analysis.result:
+            piece, target, _ = self.decode_move(self.analysis.result.pv[0])
+            self.hint = (piece.position, target)
+            changed = True
+        if computer and self.analysis.done and self.analysis.result.move:
+            self.apply_computer_move(self.analysis.result)
+            self.analysis.stop()
+            changed = True
+        lines = () if computer else self.analysis.lines()
+        if lines != self.analysis_lines:
+            self.analysis_lines = lines
+            changed = True
+        return changed
+    
+    def show_hint(self):
+        if self.searcher is None:
+            self.searcher = Searcher()
+        result = best_move(self, SearchLimits(movetime=HINT_MOVETIME), self.searcher, book=self.book)
+        if result.move:
+            piece, target, _ = self.decode_move(result.move)
+            self.hint = (piece.position, target)
+            print(f"goi y: {move_name(result.move)} ({'sach khai cuoc' if not result.depth else f'do sau {result.depth}'})")
+    
+    def play_computer_move(self):
+        if self.searcher is None:
+            self.searcher = Searcher()
+        result = best_move(self, SearchLimits(movetime=COMPUTER_MOVETIME), self.searcher, book=self.book)
+        if result.move:
+            self.apply_computer_move(result)
+    
+    def apply_computer_move(self, result):
+        self.hint = None
+        self.apply_move(result.move)
+        self.turn_step = 0 if self.turn == 'white' else 2
+        self.selected_piece = None
+        self.valid_moves = []
+        self.castle_moves = []
+        self.update_game_over()
+        if not result.depth:
+            print(f'{self.computer}: {move_name(result.move)} tu sach khai cuoc')
+        else:
+            print(f'{self.computer}: {move_name(result.move)} do sau {result.depth}, '
+                  f'{result.nodes} nut, {result.nps:.0f} nut/s')
+    
+    def new_game(self):
         self.reset()
+        self.review_ply = None
+        if self.journal is None:
+            self.journal = Journal(JOURNAL_PATH)
+        self.journal.start(self)
+    
+    # Replays the journal from the nearest checkpoint with the journal
+    # detached, so the replayed moves are not written a second time.
+    # Positions before the last pawn move or capture can never repeat, so when
+    # the halfmove clock reaches back past the checkpoint the replay is redone
+    # from an earlier one; that rebuilds position_counts for the last
+    # halfmove_clock plies (at most 100) as well as the clock itself.
+    def restore(self, ply):
+        journal, self.journal = self.journal, None
+        fen, captured, moves = journal.view(ply)
+        self.replay(fen, captured, moves)
+        if self.halfmove_clock > len(moves) < ply:
+            self.replay(*journal.view(ply, ply - self.halfmove_clock))
+        self.journal = journal
+        self.turn_step = 0 if self.turn == 'white' else 2
+        self.check_promotion()
+        journal.pending = self.promo_index
+        if not (self.white_promote or self.black_promote):
+            self.update_game_over()
+    
+    def replay(self, fen, captured, moves):
+        self.reset(fen)
+        self.captured_pieces = captured
+        for move in moves:
+            self.apply_move(move)
+    
+    def undo(self):
+        self.review_ply = None
+        while self.journal.undo():
+            self.restore(len(self.journal.moves))
+            if self.turn != self.computer:
+                break
+    
+    def redo(self):
+        move = self.journal.next_redo()
+        if not move or self.game_over or self.white_promote or self.black_promote:
+            return
+        self.hint = None
+        self.apply_move(move)
+        self.turn_step = 0 if self.turn == 'white' else 2
+        self.selected_piece = None
+        self.valid_moves = []
+        self.castle_moves = []
+        self.update_game_over()
+    
+    def review(self, step):
+        end = len(self.journal.moves)
+        if self.review_ply is None:
+            self.review_ply = end
+            self.final_winner = self.winner
+        self.review_ply = min(max(self.review_ply + step, 0), end)
+        self.restore(self.review_ply)
+        self.winner = self.final_winner if self.review_ply == end else ''
+        self.game_over = True
+    
+    def setup(self):
+        journal = Journal.recover(JOURNAL_PATH)
+        if journal is not None and journal.moves:
+            self.journal = journal
+            self.restore(len(journal.moves))
+            print(f'khoi phuc van dang choi: {len(journal.moves)} nua nuoc')
+        else:
+            self.new_game()
         
     async def update_loop(self):
         try:
-            self.clock.tick(FPS)
-            self.counter += 1
-            self.check_promotion()
-            if self.winner:
-                self.game_over = True
-            self.board.draw(self)
-            pygame.display.flip()
-            
+            started = time.perf_counter()
+            changed = False
+            now = time.monotonic()
             for event in pygame.event.get():
+                self.last_event = now
                 if event.type == pygame.QUIT:
+                    self.running = False
+                    if self.analysis:
+                        self.analysis.close()
                     pygame.quit()
-                    return
+                    return 0
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     self.handle_click(event.pos)
+                    changed = True
                 if event.type == pygame.KEYDOWN:
                     self.handle_keydown(event.key)
+                    changed = True
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.board.invalidate()
+                    changed = True
+            thinking = self.turn == self.computer and not self.game_over and \
+                not (self.white_promote or self.black_promote)
+            if thinking and not self.start_worker():
+                if not changed:
+                    self.play_computer_move()
+                    self.last_event = now
+                    changed = True
+            elif self.analysis:
+                if self.sync_analysis():
+                    changed = True
+                # Stay at the full frame rate while the computer is thinking
+                # so its move shows up as soon as the worker reports it.
+                if changed or thinking:
+                    self.last_event = now
+            if changed:
+                self.check_promotion()
+                if self.winner:
+                    self.game_over = True
+            
+            self.counter = int(now * FPS) % BLINK_FRAMES
+            blink = self.counter < BLINK_FRAMES // 2
+            if changed or blink != self.blink or METRICS.enabled:
+                self.blink = blink
+                dirty = self.board.draw(self)
+                if dirty:
+                    pygame.display.update(dirty)
+            METRICS.frame(time.perf_counter() - started)
+            return 1.0 / FPS if now - self.last_event < IDLE_AFTER else IDLE_POLL
         except Exception as e:
             print(f"Loi trong update_loop: {e}")
             raise
     
+METRICS.instrument(Board, ['draw'] + [name for name in vars(Board) if name.startswith('_draw_')])
+
 async def main():
     game = ChessGame()
     game.setup()
-    while True:
-        await game.update_loop()
-        await asyncio.sleep(1.0 / FPS)
+    while game.running:
+        await asyncio.sleep(await game.update_loop())
 
 if platform.system() == "Emscripten":
     asyncio.ensure_future(main())
 else:
     if __name__ == "__main__":
-        asyncio.run(main())
\ No newline at end of file
+        asyncio.run(main())
@@ -0,0 +1,128 @@
+import mmap
+import struct
+import sys
+from array import array
+
+import rules
+from bitboard import Position, NO_SQUARE
+
+# 32 bytes of board, two 4-bit piece codes per byte (square 2i in the low
+# nibble), then side | castling << 1, then the en passant square or 0xff.
+POSITION_SIZE = 34
+NO_EP = 0xff
+
+# Log layout: magic, then records of packed start position, uint16 move count
+# and that many uint16 moves (frm | to << 6 | promo << 12). Every field is
+# 2-byte aligned so move runs can be cast to 'H' in place.
+LOG_MAGIC = b'CHL' + (b'<' if sys.byteorder == 'little' else b'>')
+COUNT = struct.Struct('=H')
+
+
+def pack(position):
+    board = position.board
+    data = bytearray(POSITION_SIZE)
+    for i in range(32):
+        data[i] = board[2 * i] | board[2 * i + 1] << 4
+    data[32] = position.side | position.castling << 1
+    data[33] = NO_EP if position.ep == NO_SQUARE else position.ep
+    return bytes(data)
+
+
+def unpack(data, offset=0):
+    position = Position()
+    put = position.put
+    for i in range(32):
+        byte = data[offset + i]
+        if byte & 15:
+            put(byte >> 3 & 1, byte & 7, 2 * i)
+        if byte >> 4:
+            put(byte >> 7, byte >> 4 & 7, 2 * i + 1)
+    meta = data[offset + 32]
+    position.side = meta & 1
+    position.castling = meta >> 1 & 15
+    ep = data[offset + 33]
+    position.ep = NO_SQUARE if ep == NO_EP else ep
+    position.hash = position.compute_hash()
+    return position
+
+
+def pack_game(game):
+    return pack(Position.from_game(game, game.turn))
+
+
+def unpack_game(data, offset=0, engine=None):
+    return rules.GameState(engine, unpack(data, offset).fen())
+
+
+def moves_array(moves):
+    return array('H', moves)
+
+
+class LogWriter:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(LOG_MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, start, moves):
+        self.file.write(start if isinstance(start, (bytes, bytearray)) else pack(start))
+        self.file.write(COUNT.pack(len(moves)))
+        self.file.write(moves if isinstance(moves, array) else array('H', moves))
+
+    def close(self):
+        self.file.close()
+
+
+# Iterating yields (start, moves) memoryviews into the mapped file: no copy and
+# no per-move object until a move is actually read. The views are released
+# when the iterator advances, so copy anything that must outlive the step.
+class LogReader:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        if self.view[:4] != LOG_MAGIC:
+            self.close()
+            raise ValueError(f'Nhat ky khong hop le: {path}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        view = self.view
+        offset = len(LOG_MAGIC)
+        end = len(view)
+        while offset < end:
+            start = view[offset:offset + POSITION_SIZE]
+            offset += POSITION_SIZE
+            count = COUNT.unpack_from(view, offset)[0]
+            offset += COUNT.size
+            moves = view[offset:offset + 2 * count].cast('H')
+            try:
+                yield start, moves
+            finally:
+                start.release()
+                moves.release()
+            offset += 2 * count
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+            self.map.close()
+            self.file.close()
+
+
+def replay(start, moves):
+    position = unpack(start)
+    for move in moves:
+        position.make_move(move)
+    return position
@@ -0,0 +1,166 @@
+# Standalone like zobrist.py: bitboard imports these tables to keep the
+# middle game and end game scores, the phase and the pawn-king key up to date
+# in make_move / unmake_move, so no import back into bitboard is possible.
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 0)
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+PAWN_TABLE_SIZE = 1 << 14
+
+# Simplified piece-square tables, white's view, rank 8 first.
+PIECE_SQUARE_ROWS = {
+    PAWN: (0, 0, 0, 0, 0, 0, 0, 0, 50, 50, 50, 50, 50, 50, 50, 50, 10, 10, 20, 30, 30, 20, 10, 10,
+           5, 5, 10, 25, 25, 10, 5, 5, 0, 0, 0, 20, 20, 0, 0, 0, 5, -5, -10, 0, 0, -10, -5, 5,
+           5, 10, 10, -20, -20, 10, 10, 5, 0, 0, 0, 0, 0, 0, 0, 0),
+    KNIGHT: (-50, -40, -30, -30, -30, -30, -40, -50, -40, -20, 0, 0, 0, 0, -20, -40,
+             -30, 0, 10, 15, 15, 10, 0, -30, -30, 5, 15, 20, 20, 15, 5, -30,
+             -30, 0, 15, 20, 20, 15, 0, -30, -30, 5, 10, 15, 15, 10, 5, -30,
+             -40, -20, 0, 5, 5, 0, -20, -40, -50, -40, -30, -30, -30, -30, -40, -50),
+    BISHOP: (-20, -10, -10, -10, -10, -10, -10, -20, -10, 0, 0, 0, 0, 0, 0, -10,
+             -10, 0, 5, 10, 10, 5, 0, -10, -10, 5, 5, 10, 10, 5, 5, -10,
+             -10, 0, 10, 10, 10, 10, 0, -10, -10, 10, 10, 10, 10, 10, 10, -10,
+             -10, 5, 0, 0, 0, 0, 5, -10, -20, -10, -10, -10, -10, -10, -10, -20),
+    ROOK: (0, 0, 0, 0, 0, 0, 0, 0, 5, 10, 10, 10, 10, 10, 10, 5, -5, 0, 0, 0, 0, 0, 0, -5,
+           -5, 0, 0, 0, 0, 0, 0, -5, -5, 0, 0, 0, 0, 0, 0, -5, -5, 0, 0, 0, 0, 0, 0, -5,
+           -5, 0, 0, 0, 0, 0, 0, -5, 0, 0, 0, 5, 5, 0, 0, 0),
+    QUEEN: (-20, -10, -10, -5, -5, -10, -10, -20, -10, 0, 0, 0, 0, 0, 0, -10,
+            -10, 0, 5, 5, 5, 5, 0, -10, -5, 0, 5, 5, 5, 5, 0, -5, 0, 0, 5, 5, 5, 5, 0, -5,
+            -10, 5, 5, 5, 5, 5, 0, -10, -10, 0, 5, 0, 0, 0, 0, -10, -20, -10, -10, -5, -5, -10, -10, -20),
+    KING: (-30, -40, -40, -50, -50, -40, -40, -30, -30, -40, -40, -50, -50, -40, -40, -30,
+           -30, -40, -40, -50, -50, -40, -40, -30, -30, -40, -40, -50, -50, -40, -40, -30,
+           -20, -30, -30, -40, -40, -30, -30, -20, -10, -20, -20, -20, -20, -20, -20, -10,
+           20, 20, 0, 0, 0, 0, 20, 20, 20, 30, 10, 0, 0, 10, 30, 20),
+}
+# End game rows that differ: pawns gain with every rank, the king centralises.
+END_GAME_ROWS = dict(PIECE_SQUARE_ROWS)
+END_GAME_ROWS[PAWN] = tuple(bonus for bonus in (0, 80, 50, 30, 20, 10, 5, 0) for _ in range(8))
+END_GAME_ROWS[KING] = (-50, -40, -30, -20, -20, -30, -40, -50, -30, -20, -10, 0, 0, -10, -20, -30,
+                       -30, -10, 20, 30, 30, 20, -10, -30, -30, -10, 30, 40, 40, 30, -10, -30,
+                       -30, -10, 30, 40, 40, 30, -10, -30, -30, -10, 20, 30, 30, 20, -10, -30,
+                       -30, -30, 0, 0, 0, 0, -30, -30, -50, -30, -30, -30, -30, -30, -30, -50)
+
+
+def _signed_table(rows):
+    table = [[0] * 64 for _ in range(16)]
+    for kind, values in rows.items():
+        for sq in range(64):
+            table[WHITE << 3 | kind][sq] = PIECE_VALUES[kind] + values[(7 - (sq >> 3)) * 8 + (sq & 7)]
+            table[BLACK << 3 | kind][sq] = -(PIECE_VALUES[kind] + values[sq])
+    return table
+
+
+# Indexed by piece code then square, white positive and black negative.
+MIDDLE_GAME = _signed_table(PIECE_SQUARE_ROWS)
+END_GAME = _signed_table(END_GAME_ROWS)
+
+FILES = [0x0101010101010101 << x for x in range(8)]
+NEIGHBOUR_FILES = [(FILES[x - 1] if x else 0) | (FILES[x + 1] if x < 7 else 0) for x in range(8)]
+
+
+def _ahead(color, sq):
+    y = sq >> 3
+    ranks = range(y + 1, 8) if color == WHITE else range(0, y)
+    return sum(0xff << (8 * r) for r in ranks)
+
+
+PASSED_MASKS = [[_ahead(color, sq) & (FILES[sq & 7] | NEIGHBOUR_FILES[sq & 7]) for sq in range(64)]
+                for color in (WHITE, BLACK)]
+SHIELD_MASKS = [[_ahead(color, sq) & ~_ahead(color, sq + 16 if color == WHITE else sq - 16)
+                 & (FILES[sq & 7] | NEIGHBOUR_FILES[sq & 7]) if 8 <= sq < 56 else 0 for sq in range(64)]
+                for color in (WHITE, BLACK)]
+PASSED_MIDDLE = (0, 5, 10, 15, 25, 40, 60, 0)
+PASSED_END = (0, 10, 20, 35, 55, 85, 120, 0)
+DOUBLED = (10, 20)
+ISOLATED = (10, 15)
+SHIELD_PAWN = 10
+OPEN_KING_FILE = 15
+
+
+def material(position):
+    middle = end = phase = 0
+    for sq, code in enumerate(position.board):
+        if code:
+            middle += MIDDLE_GAME[code][sq]
+            end += END_GAME[code][sq]
+            phase += PHASE_WEIGHTS[code & 7]
+    return middle, end, phase
+
+
+# Pawn structure and king shelter depend only on pawns and kings, so they are
+# cached under position.pawn_key, the zobrist key of those pieces alone.
+def pawn_king_terms(pawns, kings):
+    middle = end = 0
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        own, enemy = pawns[color], pawns[color ^ 1]
+        for x in range(8):
+            count = (own & FILES[x]).bit_count()
+            if count > 1:
+                middle -= sign * DOUBLED[0] * (count - 1)
+                end -= sign * DOUBLED[1] * (count - 1)
+            if count and not own & NEIGHBOUR_FILES[x]:
+                middle -= sign * ISOLATED[0] * count
+                end -= sign * ISOLATED[1] * count
+        bb = own
+        while bb:
+            low = bb & -bb
+            sq = low.bit_length() - 1
+            bb ^= low
+            if not enemy & PASSED_MASKS[color][sq]:
+                rank = sq >> 3 if color == WHITE else 7 - (sq >> 3)
+                middle += sign * PASSED_MIDDLE[rank]
+                end += sign * PASSED_END[rank]
+        king = kings[color].bit_length() - 1
+        if king >= 0:
+            shelter = (own & SHIELD_MASKS[color][king]).bit_count() * SHIELD_PAWN
+            x = king & 7
+            for file in range(max(x - 1, 0), min(x + 2, 8)):
+                if not own & FILES[file]:
+                    shelter -= OPEN_KING_FILE
+            middle += sign * shelter
+    return middle, end
+
+
+class PawnTable:
+    def __init__(self, size=PAWN_TABLE_SIZE):
+        self.mask = size - 1
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, position):
+        key = position.pawn_key
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.values[index]
+        self.misses += 1
+        pieces = position.pieces
+        value = pawn_king_terms((pieces[WHITE][PAWN], pieces[BLACK][PAWN]), (pieces[WHITE][KING], pieces[BLACK][KING]))
+        self.keys[index] = key
+        self.values[index] = value
+        return value
+
+
+PAWN_TABLE = PawnTable()
+
+
+def taper(middle, end, phase):
+    phase = min(phase, MAX_PHASE)
+    return (middle * phase + end * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def evaluate(position, pawn_table=PAWN_TABLE):
+    pawn_middle, pawn_end = pawn_table.probe(position)
+    score = taper(position.middle + pawn_middle, position.end + pawn_end, position.phase)
+    return score if position.side == WHITE else -score
+
+
+def evaluate_full(position):
+    middle, end, phase = material(position)
+    pieces = position.pieces
+    pawn_middle, pawn_end = pawn_king_terms((pieces[WHITE][PAWN], pieces[BLACK][PAWN]),
+                                            (pieces[WHITE][KING], pieces[BLACK][KING]))
+    score = taper(middle + pawn_middle, end + pawn_end, phase)
+    return score if position.side == WHITE else -score
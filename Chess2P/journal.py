@@ -0,0 +1,165 @@
+import struct
+
+import codec
+from bitboard import PIECE_NAMES, Position
+
+JOURNAL_PATH = 'journal.bin'
+JOURNAL_MAGIC = b'CHJ2'
+CHECKPOINT_INTERVAL = 16
+# The journal is a run of little-endian uint16 words. A word below
+# PROMOTE is a move (frm | to << 6 | promo << 12). PROMOTE is followed by the
+# piece kind for the previous move, UNDO takes back the last ply, and
+# CHECKPOINT is followed by its ply, the packed position, both captured
+# lists and the halfmove clock. Nothing is ever rewritten, so a crash can only tear the last record.
+PROMOTE, UNDO, CHECKPOINT = 0xfffd, 0xfffe, 0xffff
+WORD = struct.Struct('<H')
+CAPTURED_SIZE = 16
+CLOCK_OFFSET = codec.POSITION_SIZE + 2 * CAPTURED_SIZE
+CHECKPOINT_SIZE = 3 * WORD.size + CLOCK_OFFSET
+
+
+def pack_captured(captured):
+    data = bytearray(2 * CAPTURED_SIZE)
+    for i, color in enumerate(('white', 'black')):
+        kinds = [PIECE_NAMES.index(name) for name in captured[color]][:CAPTURED_SIZE]
+        data[i * CAPTURED_SIZE:i * CAPTURED_SIZE + len(kinds)] = bytes(kinds)
+    return bytes(data)
+
+
+def unpack_captured(data):
+    return {color: [PIECE_NAMES[kind] for kind in data[i * CAPTURED_SIZE:(i + 1) * CAPTURED_SIZE] if kind]
+            for i, color in enumerate(('white', 'black'))}
+
+
+class Journal:
+    def __init__(self, path=JOURNAL_PATH, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.file = None
+        self.moves = []
+        self.redo = []
+        self.checkpoints = {}
+        self.pending = None
+        self.redone = 0
+
+    @classmethod
+    def recover(cls, path=JOURNAL_PATH, interval=CHECKPOINT_INTERVAL):
+        try:
+            with open(path, 'rb') as source:
+                data = source.read()
+        except OSError:
+            return None
+        if not data.startswith(JOURNAL_MAGIC):
+            return None
+        journal = cls(path, interval)
+        offset = len(JOURNAL_MAGIC)
+        while offset + WORD.size <= len(data):
+            word = WORD.unpack_from(data, offset)[0]
+            if word == CHECKPOINT:
+                if offset + CHECKPOINT_SIZE > len(data):
+                    break
+                ply = WORD.unpack_from(data, offset + WORD.size)[0]
+                journal.checkpoints[ply] = data[offset + 2 * WORD.size:offset + CHECKPOINT_SIZE]
+                offset += CHECKPOINT_SIZE
+                continue
+            if word == PROMOTE:
+                if offset + 2 * WORD.size > len(data):
+                    break
+                journal._amend(WORD.unpack_from(data, offset + WORD.size)[0])
+                offset += 2 * WORD.size
+                continue
+            if word == UNDO:
+                journal._take_back()
+            else:
+                journal._push(word)
+            offset += WORD.size
+        if 0 not in journal.checkpoints:
+            return None
+        journal.file = open(path, 'r+b')
+        journal.file.truncate(offset)
+        journal.file.seek(offset)
+        return journal
+
+    def start(self, game):
+        self.close()
+        self.moves, self.redo, self.checkpoints, self.pending, self.redone = [], [], {}, None, 0
+        self.file = open(self.path, 'wb')
+        self.file.write(JOURNAL_MAGIC)
+        self._checkpoint(game)
+
+    def _write(self, data):
+        self.file.write(data)
+        self.file.flush()
+
+    # A redone move matches the redo line on its squares; the promotion, if
+    # any, arrives in a later record and must match too.
+    def _push(self, move):
+        self.moves.append(move)
+        if self.redo and self.redo[-1] & 0xfff == move & 0xfff:
+            self.redone = self.redo.pop()
+        else:
+            self.redo = []
+            self.redone = 0
+
+    def _amend(self, kind):
+        self.moves[-1] |= kind << 12
+        if self.redone and self.redone != self.moves[-1]:
+            self.redo = []
+
+    def _take_back(self):
+        self.redo.append(self.moves.pop())
+        for ply in [ply for ply in self.checkpoints if ply > len(self.moves)]:
+            del self.checkpoints[ply]
+
+    def _checkpoint(self, game):
+        ply = len(self.moves)
+        state = codec.pack_game(game) + pack_captured(game.captured_pieces) + WORD.pack(game.halfmove_clock)
+        self.checkpoints[ply] = state
+        self._write(WORD.pack(CHECKPOINT) + WORD.pack(ply) + state)
+
+    def record(self, game, move, piece):
+        self._push(move)
+        self._write(WORD.pack(move))
+        if piece.name == 'pawn' and piece.position[1] in (0, 7):
+            self.pending = piece
+        elif not len(self.moves) % self.interval:
+            self._checkpoint(game)
+
+    def promote(self, game, kind):
+        self.pending = None
+        self._amend(kind)
+        self._write(WORD.pack(PROMOTE) + WORD.pack(kind))
+        if not len(self.moves) % self.interval:
+            self._checkpoint(game)
+
+    def undo(self):
+        if not self.moves:
+            return False
+        self.pending = None
+        self._take_back()
+        self._write(WORD.pack(UNDO))
+        return True
+
+    def next_redo(self):
+        return self.redo[-1] if self.redo else 0
+
+    # Seeking costs one checkpoint plus fewer than `interval` moves, unless
+    # checkpoints were dropped by undo and not yet rewritten. `since` asks for
+    # a checkpoint no later than that ply, so the replay covers it too.
+    def view(self, ply, since=None):
+        base = max(p for p in self.checkpoints if p <= (ply if since is None else min(max(since, 0), ply)))
+        state = self.checkpoints[base]
+        fen = codec.unpack(state).fen(WORD.unpack_from(state, CLOCK_OFFSET)[0], base // 2 + 1)
+        return fen, unpack_captured(state[codec.POSITION_SIZE:CLOCK_OFFSET]), self.moves[base:ply]
+
+    def position(self, ply):
+        fen, _, moves = self.view(ply)
+        position = Position.from_fen(fen)
+        for move in moves:
+            position.make_move(move)
+        return position
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
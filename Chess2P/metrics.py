@@ -0,0 +1,158 @@
+import functools
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Upper bounds in seconds, 1 us doubling up to ~1 s; the last bucket is +Inf.
+BUCKETS = tuple(2 ** i / 1e6 for i in range(21))
+FRAME_WINDOW = 600
+QUANTILES = (0.5, 0.9, 0.99)
+PREFIX = 'chess'
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+# Instrumented methods are only wrapped while metrics are enabled; disabled,
+# the classes hold their original functions, so the hot paths pay nothing and
+# the layer can stay in production builds. Frames cost one attribute test.
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.targets = []
+        self.originals = {}
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.timings = {}
+        self.frames = deque(maxlen=FRAME_WINDOW)
+
+    def instrument(self, owner, names):
+        for name in names:
+            self.targets.append((owner, name))
+            if self.enabled:
+                self._wrap(owner, name)
+
+    def _wrap(self, owner, name):
+        original = owner.__dict__[name]
+        histogram = self.timings.setdefault(f'{owner.__name__}.{name}', Histogram())
+        clock = time.perf_counter
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                histogram.observe(clock() - start)
+
+        self.originals[owner, name] = original
+        setattr(owner, name, timed)
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            for owner, name in self.targets:
+                self._wrap(owner, name)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            for (owner, name), original in self.originals.items():
+                setattr(owner, name, original)
+            self.originals = {}
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def frame(self, seconds):
+        if self.enabled:
+            self.frames.append(seconds)
+
+    def frame_quantiles(self):
+        frames = sorted(self.frames)
+        if not frames:
+            return {}
+        result = {str(q): frames[min(int(q * len(frames)), len(frames) - 1)] for q in QUANTILES}
+        result['max'] = frames[-1]
+        return result
+
+    def snapshot(self):
+        return {
+            'counters': dict(self.counters),
+            'timings': {name: {'count': h.count, 'seconds': h.total,
+                               'p50': h.quantile(0.5), 'p99': h.quantile(0.99)}
+                        for name, h in self.timings.items() if h.count},
+            'frames': self.frame_quantiles(),
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        lines = [f'# TYPE {PREFIX}_events_total counter']
+        lines += [f'{PREFIX}_events_total{{name="{name}"}} {value}' for name, value in sorted(self.counters.items())]
+        lines.append(f'# TYPE {PREFIX}_call_seconds histogram')
+        for name, h in sorted(self.timings.items()):
+            seen = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                seen += count
+                lines.append(f'{PREFIX}_call_seconds_bucket{{fn="{name}",le="{bound:g}"}} {seen}')
+            lines.append(f'{PREFIX}_call_seconds_bucket{{fn="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{PREFIX}_call_seconds_sum{{fn="{name}"}} {h.total:.9f}')
+            lines.append(f'{PREFIX}_call_seconds_count{{fn="{name}"}} {h.count}')
+        lines.append(f'# TYPE {PREFIX}_frame_seconds summary')
+        for q, value in self.frame_quantiles().items():
+            if q != 'max':
+                lines.append(f'{PREFIX}_frame_seconds{{quantile="{q}"}} {value:.9f}')
+        lines.append(f'{PREFIX}_frame_seconds_count {len(self.frames)}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        with open(path, 'w') as out:
+            out.write(self.to_prometheus() if path.endswith('.prom') else self.to_json())
+
+    def overlay_lines(self, limit=8):
+        lines = []
+        frames = self.frame_quantiles()
+        if frames:
+            lines.append(f"khung p50 {frames['0.5'] * 1000:.2f} p99 {frames['0.99'] * 1000:.2f} ms")
+        busiest = sorted((h.total, name, h.count) for name, h in self.timings.items() if h.count)
+        for total, name, count in reversed(busiest[-limit:]):
+            lines.append(f'{name.split(".")[-1]}: {count} lan, {total * 1000:.1f} ms')
+        return lines
+
+
+METRICS = Metrics()
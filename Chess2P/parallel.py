@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import Position
+from search import Searcher, SearchLimits, SearchResult, MATE, MAX_PLY
+from transposition import TranspositionTable
+
+
+def _search_subset(position, root_moves, limits, megabytes):
+    iterations = []
+    searcher = Searcher(TranspositionTable(megabytes))
+    result = searcher.search(position, limits, iterations.append, root_moves)
+    # A subset that reached the depth limit or stopped on a mate score is
+    # settled; deeper iterations would not change its answer.
+    final = bool(iterations) and (iterations[-1].depth >= limits.depth or
+                                  abs(iterations[-1].score) >= MATE - MAX_PLY)
+    return [(r.depth, r.move, r.score, r.pv) for r in iterations], result.nodes, final
+
+
+# Root splitting: the root moves are dealt round-robin in ordered sequence so
+# every worker gets a share of the likely best moves. Each worker deepens its
+# own subset; the answer is the best move at the deepest depth every worker
+# that was cut off by the limits completed, since scores from different
+# depths are not comparable. A settled worker (see _search_subset) counts as
+# complete at every depth and competes with its last iteration.
+class ParallelSearcher:
+    def __init__(self, workers=None, megabytes=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.megabytes = megabytes
+        self.executor = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        self.orderer = Searcher(TranspositionTable(0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def split(self, position):
+        moves = self.orderer.order_moves(position, position.legal_moves(), 0, 0)
+        return [moves[i::self.workers] for i in range(min(self.workers, len(moves)))]
+
+    def search(self, position, limits=None):
+        if not isinstance(position, Position):
+            position = Position.from_game(position, position.turn)
+        limits = limits or SearchLimits(movetime=1.0)
+        start = time.perf_counter()
+        subsets = self.split(position)
+        if not subsets:
+            return SearchResult(0, -MATE if position.is_check() else 0, 0, 0, 0.0, [])
+        if self.executor is None or len(subsets) == 1:
+            outcomes = [_search_subset(position, moves, limits, self.megabytes) for moves in subsets]
+        else:
+            futures = [self.executor.submit(_search_subset, position, moves, limits, self.megabytes)
+                       for moves in subsets]
+            outcomes = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+        nodes = sum(worker_nodes for _, worker_nodes, _ in outcomes)
+        reached = [iterations[-1][0] if iterations else 0 for iterations, _, _ in outcomes]
+        cut_off = [last for last, (_, _, final) in zip(reached, outcomes) if not final]
+        depth = min(cut_off) if cut_off else max(reached)
+        best = None
+        for iterations, _, _ in outcomes:
+            iteration = next((it for it in reversed(iterations) if it[0] <= depth), None)
+            if iteration and (best is None or iteration[2] > best[2]):
+                best = iteration
+        if best is None:
+            return SearchResult(subsets[0][0], 0, 0, nodes, elapsed, [subsets[0][0]])
+        return SearchResult(best[1], best[2], depth, nodes, elapsed, best[3])
+
+
+def parallel_best_move(position, limits=None, workers=None):
+    with ParallelSearcher(workers) as searcher:
+        return searcher.search(position, limits)
@@ -0,0 +1,242 @@
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import rules
+from bitboard import Position, PAWN, KING, PIECE_NAMES, SQUARES, square, encode_move, square_name
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+TAG_RE = re.compile(r'\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+TOKEN_RE = re.compile(r'\{[^}]*\}|;[^\n]*|\$\d+|[()]|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};.]+')
+SAN_RE = re.compile(r'([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?')
+SAN_KINDS = 'PNBRQK'
+
+
+def read_games(lines):
+    headers = {}
+    movetext = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            if movetext:
+                yield headers, ' '.join(movetext)
+                headers, movetext = {}, []
+            match = TAG_RE.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif line and not line.startswith('%'):
+            movetext.append(line)
+    if headers or movetext:
+        yield headers, ' '.join(movetext)
+
+
+def tokens(movetext):
+    depth = 0
+    for token in TOKEN_RE.findall(movetext):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif not depth and token[0] not in '{;$' and token[-1] != '.':
+            yield token
+
+
+def parse_san(board, text):
+    text = text.rstrip('+#!?')
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        step = 2 if len(text) == 3 else -2
+        matches = [move for move in board.legal() if board.kind(move & 63) == KING and (move >> 6 & 63) - (move & 63) == step]
+    else:
+        match = SAN_RE.fullmatch(text)
+        if not match:
+            raise ValueError(f'SAN khong hop le: {text}')
+        piece, file, rank, capture, target, promo = match.groups()
+        kind = SAN_KINDS.index(piece or 'P') + 1
+        if kind == PAWN and capture and not file:
+            raise ValueError(f'an bang tot thieu cot xuat phat: {text}')
+        to = SQUARES[target]
+        promo = SAN_KINDS.index(promo) + 1 if promo else 0
+        # 'x' must agree with the board: "e5" is not dxe5, and "Nxf3" onto
+        # an empty square is not a knight move.
+        matches = [move for move in board.legal_to(kind, to)
+                   if move >> 12 == promo and board.is_capture(move) == bool(capture)
+                   and (not file or square_name(move & 63)[0] == file)
+                   and (not rank or square_name(move & 63)[1] == rank)]
+    if len(matches) != 1:
+        raise ValueError(f"nuoc {'mo ho' if matches else 'khong hop le'}: {text}")
+    return matches[0]
+
+
+def san(position, move, legal=None):
+    legal = position.legal_moves() if legal is None else legal
+    frm, to, promo = move & 63, move >> 6 & 63, move >> 12
+    kind = position.board[frm] & 7
+    if kind == KING and to - frm in (2, -2):
+        text = 'O-O' if to > frm else 'O-O-O'
+    else:
+        capture = position.board[to] or (kind == PAWN and to == position.ep)
+        if kind == PAWN:
+            text = (square_name(frm)[0] + 'x' if capture else '') + square_name(to)
+            if promo:
+                text += '=' + SAN_KINDS[promo - 1]
+        else:
+            rivals = [other & 63 for other in legal
+                      if other >> 6 & 63 == to and other & 63 != frm and position.board[other & 63] & 7 == kind]
+            name = square_name(frm)
+            if not rivals:
+                prefix = ''
+            elif all(square_name(sq)[0] != name[0] for sq in rivals):
+                prefix = name[0]
+            elif all(square_name(sq)[1] != name[1] for sq in rivals):
+                prefix = name[1]
+            else:
+                prefix = name
+            text = SAN_KINDS[kind - 1] + prefix + ('x' if capture else '') + square_name(to)
+    position.make_move(move)
+    if position.is_check():
+        text += '#' if not position.legal_moves() else '+'
+    position.unmake_move()
+    return text
+
+
+class BitboardBoard:
+    def __init__(self, fen):
+        self.position = Position.from_fen(fen)
+
+    def legal(self):
+        return self.position.legal_moves()
+
+    def legal_to(self, kind, to):
+        return self.position.legal_moves_to(kind, to)
+
+    def kind(self, sq):
+        return self.position.board[sq] & 7
+
+    def is_capture(self, move):
+        to = move >> 6 & 63
+        return bool(self.position.board[to]) or (self.kind(move & 63) == PAWN and to == self.position.ep)
+
+    def play(self, move):
+        self.position.make_move(move)
+
+    def fen(self, halfmove_clock, fullmove_number):
+        return self.position.fen(halfmove_clock, fullmove_number)
+
+
+# Replays through the object model, the same handle_move / handle_castling /
+# promote path a ChessGame click takes. Slower; used to cross-check archives.
+class RulesBoard:
+    def __init__(self, fen):
+        self.game = rules.GameState(fen=fen)
+
+    def legal(self):
+        return [encode_move(square(*piece.position), square(*target), PIECE_NAMES.index(promotion.name) if promotion else 0)
+                for piece, target, promotion in self.game.generate_moves()]
+
+    def legal_to(self, kind, to):
+        return [move for move in self.legal() if move >> 6 & 63 == to and self.kind(move & 63) == kind
+                and not (kind == KING and (move >> 6 & 63) - (move & 63) in (2, -2))]
+
+    def kind(self, sq):
+        piece = self.game.get_piece_at((sq & 7, sq >> 3))
+        return PIECE_NAMES.index(piece.name) if piece else 0
+
+    def is_capture(self, move):
+        to = (move >> 6 & 7, move >> 9 & 7)
+        return self.game.is_occupied(to) or (self.kind(move & 63) == PAWN and to == self.game.get_en_passant_target(self.game.turn))
+
+    def play(self, move):
+        self.game.apply_move(move)
+
+    def fen(self, halfmove_clock, fullmove_number):
+        return Position.from_game(self.game, self.game.turn).fen(halfmove_clock, fullmove_number)
+
+
+BOARDS = {'bitboard': BitboardBoard, 'rules': RulesBoard}
+
+
+def replay(headers, movetext, engine='bitboard'):
+    fen = headers.get('FEN', rules.START_FEN)
+    fields = fen.split()
+    try:
+        board = BOARDS[engine](fen)
+        halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+    except (ValueError, KeyError) as e:
+        return fen, headers.get('Result', '*'), f'FEN: {e}'
+    result = headers.get('Result', '*')
+    error = ''
+    black = ' b ' in fen
+    ply = 0
+    for token in tokens(movetext):
+        if token in RESULTS:
+            result = token
+            break
+        try:
+            move = parse_san(board, token)
+        except ValueError as e:
+            error = f'nuoc {ply + 1}: {e}'
+            break
+        reset = board.kind(move & 63) == PAWN or board.is_capture(move)
+        board.play(move)
+        halfmove_clock = 0 if reset else halfmove_clock + 1
+        if black:
+            fullmove_number += 1
+        black = not black
+        ply += 1
+    return board.fen(halfmove_clock, fullmove_number), result, error
+
+
+def replay_chunk(chunk, engine='bitboard'):
+    return [replay(headers, movetext, engine) for headers, movetext in chunk]
+
+
+def chunks(games, size):
+    chunk = []
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# At most `workers * 2` chunks are in flight, so memory stays flat however
+# large the archive is; results come back in archive order.
+def validate(lines, workers=None, chunk_size=200, engine='bitboard'):
+    if workers == 1:
+        for chunk in chunks(read_games(lines), chunk_size):
+            yield from replay_chunk(chunk, engine)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for chunk in chunks(read_games(lines), chunk_size):
+            pending.append(executor.submit(replay_chunk, chunk, engine))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main(argv):
+    path = argv[1]
+    workers = int(argv[2]) if len(argv) > 2 else None
+    engine = argv[3] if len(argv) > 3 else 'bitboard'
+    games = errors = 0
+    start = time.perf_counter()
+    with open(path, encoding='utf-8', errors='replace') as lines:
+        for fen, result, error in validate(lines, workers, engine=engine):
+            games += 1
+            errors += bool(error)
+            print(f'{games}\t{result}\t{fen}\t{error}')
+    elapsed = time.perf_counter() - start
+    print(f'{games} van, {errors} loi, {elapsed:.2f} s, {games / elapsed:.0f} van/s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
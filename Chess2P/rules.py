@@ -0,0 +1,811 @@
+import abc
+from bitboard import BitboardAdapter, Position, COLOR_NAMES, PIECE_NAMES, FEN_KINDS, piece_code, square, coords, encode_move, move_name
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, ep_key
+from tablebase import WIN, DRAW
+from metrics import METRICS
+
+BOARD_SIZE = 8
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+PIECE_CODES = {(color, name): piece_code(c, k)
+               for c, color in enumerate(COLOR_NAMES) for k, name in enumerate(PIECE_NAMES) if name}
+
+
+def piece_key(piece, pos):
+    return PIECE_KEYS[piece.code][pos[1] * 8 + pos[0]]
+
+
+def parse_square(name):
+    if len(name) != 2 or name[0] not in 'abcdefgh' or name[1] not in '12345678':
+        raise ValueError(f"O co khong hop le: {name}")
+    return (ord(name[0]) - ord('a'), int(name[1]) - 1)
+
+# Piece records are slotted: no per-instance __dict__, and `code` is the
+# bitboard piece code (color << 3 | kind) that hashing and rendering key on.
+class Piece(abc.ABC):
+    __slots__ = ('color', 'position', 'has_moved', 'code')
+    name = ''
+    slides = False
+    
+    def __init__(self, color, position):
+        self.color = color
+        self.position = position
+        self.has_moved = False
+        self.code = PIECE_CODES[color, self.name]
+
+    @abc.abstractmethod
+    def get_raw_valid_moves(self, game):
+        pass
+
+    @abc.abstractmethod
+    def get_valid_moves(self, game):
+        pass
+    
+    @abc.abstractmethod
+    def get_attacks(self, game):
+        pass
+
+class Pawn(Piece):
+    name = 'pawn'
+    __slots__ = ()
+    
+    def get_raw_valid_moves(self, game):
+        moves = []
+        x, y = self.position
+        direction = 1 if self.color == 'white' else -1
+        start_row = 1 if self.color == 'white' else 6
+        
+        one_step = (x, y + direction)
+        if game.is_valid_square(one_step) and not game.is_occupied(one_step):
+            moves.append(one_step)
+            two_steps = (x, y + 2 * direction)
+            if y == start_row and game.is_valid_square(two_steps) and not game.is_occupied(two_steps):
+                moves.append(two_steps)
+        
+        for dx in [-1, 1]:
+            capture = (x + dx, y + direction)
+            if game.is_valid_square(capture) and game.is_enemy_piece(capture, self.color):
+                moves.append(capture)
+            ep = game.get_en_passant_target(self.color)
+            if capture == ep:
+                moves.append(capture)
+        
+        return moves, []
+
+    def get_valid_moves(self, game):
+        moves, castle_moves = self.get_raw_valid_moves(game)
+        valid_moves = game.filter_legal_moves(self, moves)
+        return valid_moves, castle_moves
+    
+    def get_attacks(self, game):
+        x, y = self.position
+        direction = 1 if self.color == 'white' else -1
+        return [(x + dx, y + direction) for dx in [-1, 1] if game.is_valid_square((x + dx, y + direction))]
+
+class Rook(Piece):
+    name = 'rook'
+    __slots__ = ()
+    slides = True
+    
+    def get_raw_valid_moves(self, game):
+        moves = self._get_linear_moves(game, [(0, 1), (0, -1), (1, 0), (-1, 0)])
+        return moves, []
+    
+    def get_valid_moves(self, game):
+        moves, castle_moves = self.get_raw_valid_moves(game)
+        valid_moves = game.filter_legal_moves(self, moves)
+        return valid_moves, castle_moves
+    
+    def get_attacks(self, game):
+        return self._get_rays(game, [(0, 1), (0, -1), (1, 0), (-1, 0)])
+    
+    def _get_linear_moves(self, game, directions):
+        moves = []
+        x, y = self.position
+        for dx, dy in directions:
+            for i in range(1, BOARD_SIZE):
+                target = (x + i * dx, y + i * dy)
+                if not game.is_valid_square(target):
+                    break
+                if game.is_occupied_by_friend(target, self.color):
+                    break
+                moves.append(target)
+                if game.is_occupied_by_enemy(target, self.color):
+                    break
+        return moves
+    
+    def _get_rays(self, game, directions):
+        squares = []
+        x, y = self.position
+        for dx, dy in directions:
+            for i in range(1, BOARD_SIZE):
+                target = (x + i * dx, y + i * dy)
+                if not game.is_valid_square(target):
+                    break
+                squares.append(target)
+                if game.is_occupied(target):
+                    break
+        return squares
+
+class Knight(Piece):
+    name = 'knight'
+    __slots__ = ()
+    
+    def get_raw_valid_moves(self, game):
+        moves = []
+        x, y = self.position
+        targets = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]
+        for dx, dy in targets:
+            target = (x + dx, y + dy)
+            if game.is_valid_square(target) and not game.is_occupied_by_friend(target, self.color):
+                moves.append(target)
+        return moves, []
+
+    def get_valid_moves(self, game):
+        moves, castle_moves = self.get_raw_valid_moves(game)
+        valid_moves = game.filter_legal_moves(self, moves)
+        return valid_moves, castle_moves
+    
+    def get_attacks(self, game):
+        x, y = self.position
+        targets = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]
+        return [(x + dx, y + dy) for dx, dy in targets if game.is_valid_square((x + dx, y + dy))]
+
+class Bishop(Piece):
+    name = 'bishop'
+    __slots__ = ()
+    slides = True
+    
+    def get_raw_valid_moves(self, game):
+        moves = self._get_linear_moves(game, [(1, 1), (1, -1), (-1, 1), (-1, -1)])
+        return moves, []
+    
+    def get_valid_moves(self, game):
+        moves, castle_moves = self.get_raw_valid_moves(game)
+        valid_moves = game.filter_legal_moves(self, moves)
+        return valid_moves, castle_moves
+    
+    def get_attacks(self, game):
+        return Rook._get_rays(self, game, [(1, 1), (1, -1), (-1, 1), (-1, -1)])
+    
+    def _get_linear_moves(self, game, directions):
+        return Rook._get_linear_moves(self, game, directions)
+
+class Queen(Piece):
+    name = 'queen'
+    __slots__ = ()
+    slides = True
+    
+    def get_raw_valid_moves(self, game):
+        directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+        moves = Rook._get_linear_moves(self, game, directions)
+        return moves, []
+
+    def get_valid_moves(self, game):
+        moves, castle_moves = self.get_raw_valid_moves(game)
+        valid_moves = game.filter_legal_moves(self, moves)
+        return valid_moves, castle_moves
+    
+    def get_attacks(self, game):
+        directions = [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+        return Rook._get_rays(self, game, directions)
+
+class King(Piece):
+    name = 'king'
+    __slots__ = ()
+    
+    def get_raw_valid_moves(self, game):
+        moves = []
+        castle_moves = []
+        x, y = self.position
+        targets = [(1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1)]
+        
+        for dx, dy in targets:
+            target = (x + dx, y + dy)
+            if game.is_valid_square(target) and not game.is_occupied_by_friend(target, self.color):
+                moves.append(target)
+        
+        if not self.has_moved and not game.is_in_check(self.color):
+            for rook_pos in [(0, y), (7, y)]:
+                rook = game.get_piece_at(rook_pos)
+                if isinstance(rook, Rook) and rook.color == self.color and not rook.has_moved:
+                    if rook_pos[0] > x:
+                        squares = [(x + 1, y), (x + 2, y)]
+                        final_king = (x + 2, y)
+                        final_rook = (x + 1, y)
+                    else:
+                        squares = [(x - 1, y), (x - 2, y), (x - 3, y)]
+                        final_king = (x - 2, y)
+                        final_rook = (x - 1, y)
+                    if all(not game.is_occupied(s) for s in squares) and \
+                       all(not game.is_square_attacked(s, self.color) for s in squares[:2]):
+                        castle_moves.append((final_king, final_rook))
+        
+        return moves, castle_moves
+
+    def get_valid_moves(self, game):
+        moves, castle_moves = self.get_raw_valid_moves(game)
+        valid_moves = game.filter_legal_moves(self, moves)
+        return valid_moves, castle_moves
+    
+    def get_attacks(self, game):
+        x, y = self.position
+        targets = [(1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1)]
+        return [(x + dx, y + dy) for dx, dy in targets if game.is_valid_square((x + dx, y + dy))]
+
+class MoveRecord:
+    __slots__ = ('piece', 'old_pos', 'new_pos', 'captured', 'white_ep', 'black_ep',
+                 'has_moved', 'rook', 'rook_pos', 'rook_has_moved', 'promoted', 'hash', 'halfmove')
+    
+    def __init__(self, piece, old_pos, new_pos, captured, white_ep, black_ep, rook, key, halfmove):
+        self.piece = piece
+        self.old_pos = old_pos
+        self.new_pos = new_pos
+        self.captured = captured
+        self.white_ep = white_ep
+        self.black_ep = black_ep
+        self.has_moved = piece.has_moved
+        self.rook = rook
+        self.rook_pos = rook.position if rook else None
+        self.rook_has_moved = rook.has_moved if rook else False
+        self.promoted = None
+        self.hash = key
+        self.halfmove = halfmove
+
+FEN_PIECES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+FEN_CASTLING = {'K': ('white', (7, 0)), 'Q': ('white', (0, 0)), 'k': ('black', (7, 7)), 'q': ('black', (0, 7))}
+PROMOTION_CLASSES = (Queen, Rook, Bishop, Knight)
+# Shared by every unattacked square, so a game only holds sets for squares
+# that some piece actually attacks.
+NO_ATTACKERS = frozenset()
+FIFTY_MOVE_PLIES = 100
+REPETITIONS = 3
+
+
+# The material signature packs a 4-bit count per (color, kind) with bishops
+# split by square colour, so add_piece / remove_piece keep it up to date with
+# one addition and "is this dead material?" is one set lookup. Kings are left
+# out; every legal position has one of each.
+def material_slot(color, name, pos):
+    if name == 'bishop':
+        name = 'light_bishop' if (pos[0] + pos[1]) % 2 else 'bishop'
+    return MATERIAL_SLOTS[color, name]
+
+
+MATERIAL_SLOTS = {slot: 1 << 4 * i for i, slot in enumerate(
+    (color, name) for color in ('white', 'black')
+    for name in ('pawn', 'knight', 'bishop', 'light_bishop', 'rook', 'queen'))}
+# King against king, king and knight against king, and any number of bishops
+# that all stand on squares of one colour.
+INSUFFICIENT_MATERIAL = frozenset(
+    [0, material_slot('white', 'knight', (0, 0)), material_slot('black', 'knight', (0, 0))]
+    + [white * material_slot('white', 'bishop', square) + black * material_slot('black', 'bishop', square)
+       for square in ((0, 0), (0, 1)) for white in range(10) for black in range(10)])
+
+class GameState:
+    def __init__(self, engine=None, fen=START_FEN, tablebases=None):
+        self.engine = BitboardAdapter(self) if engine == 'bitboard' else None
+        self.tablebases = tablebases
+        self.journal = None
+        self.reset(fen)
+    
+    def reset(self, fen=START_FEN):
+        self.pieces = []
+        self.board_map = [[None] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        self.kings = {}
+        self.attack_map = {color: [[NO_ATTACKERS] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+                           for color in ('white', 'black')}
+        self.piece_attacks = {}
+        self.move_stack = []
+        self.legal_moves = None
+        self.captured_pieces = {'white': [], 'black': []}
+        self.turn = 'white'
+        self.winner = ''
+        self.game_over = False
+        self.white_ep = (100, 100)
+        self.black_ep = (100, 100)
+        self.white_promote = False
+        self.black_promote = False
+        self.promo_index = None
+        self.hash = 0
+        self.material = 0
+        self.halfmove_clock = 0
+        self.load_fen(fen)
+        
+        white_king = self.get_king('white')
+        black_king = self.get_king('black')
+        if not white_king or not black_king:
+            raise RuntimeError("Khong the khoi tao vua trong reset")
+        self.hash = self.compute_hash()
+        self.position_counts = {self.hash: 1}
+    
+    def load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 2 or len(fields[0].split('/')) != BOARD_SIZE:
+            raise ValueError(f"FEN khong hop le: {fen}")
+        placement, turn = fields[0], fields[1]
+        castling = fields[2] if len(fields) > 2 else '-'
+        ep = fields[3] if len(fields) > 3 else '-'
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+        for rank, row in enumerate(placement.split('/')):
+            x, y = 0, BOARD_SIZE - 1 - rank
+            for char in row:
+                if char.isdigit():
+                    x += int(char)
+                    continue
+                if char.lower() not in FEN_PIECES or x >= BOARD_SIZE:
+                    raise ValueError(f"FEN khong hop le: {fen}")
+                piece = FEN_PIECES[char.lower()]('white' if char.isupper() else 'black', (x, y))
+                piece.has_moved = isinstance(piece, (King, Rook))
+                self.add_piece(piece)
+                x += 1
+        for char in castling.replace('-', ''):
+            if char not in FEN_CASTLING:
+                raise ValueError(f"FEN khong hop le: {fen}")
+            color, rook_pos = FEN_CASTLING[char]
+            rook = self.get_piece_at(rook_pos)
+            king = self.get_king(color)
+            if isinstance(rook, Rook) and rook.color == color and king:
+                rook.has_moved = False
+                king.has_moved = False
+        self.turn = 'white' if turn == 'w' else 'black'
+        if ep != '-':
+            target = parse_square(ep)
+            if target[1] == 2:
+                self.white_ep = target
+            else:
+                self.black_ep = target
+            
+    def add_piece(self, piece):
+        x, y = piece.position
+        self.pieces.append(piece)
+        self.board_map[x][y] = piece
+        self.hash ^= piece_key(piece, piece.position)
+        if isinstance(piece, King):
+            self.kings[piece.color] = piece
+        else:
+            self.material += material_slot(piece.color, piece.name, piece.position)
+        self.update_attacks(piece, [piece.position])
+    
+    def remove_piece(self, piece):
+        x, y = piece.position
+        self.pieces.remove(piece)
+        self.board_map[x][y] = None
+        self.hash ^= piece_key(piece, piece.position)
+        if self.kings.get(piece.color) is piece:
+            del self.kings[piece.color]
+        elif not isinstance(piece, King):
+            self.material -= material_slot(piece.color, piece.name, piece.position)
+        self.update_attacks(piece, [piece.position])
+    
+    def move_piece(self, piece, new_pos):
+        old_pos = piece.position
+        self.board_map[old_pos[0]][old_pos[1]] = None
+        piece.position = new_pos
+        self.board_map[new_pos[0]][new_pos[1]] = piece
+        self.hash ^= piece_key(piece, old_pos) ^ piece_key(piece, new_pos)
+        self.update_attacks(piece, [old_pos, new_pos])
+    
+    def update_attacks(self, piece, changed_squares):
+        stale = {piece}
+        for x, y in changed_squares:
+            for color in ('white', 'black'):
+                stale.update(p for p in self.attack_map[color][x][y] if p.slides)
+        for p in stale:
+            attack_map = self.attack_map[p.color]
+            for x, y in self.piece_attacks.pop(p, []):
+                attackers = attack_map[x][y]
+                if len(attackers) == 1:
+                    attack_map[x][y] = NO_ATTACKERS
+                else:
+                    attackers.discard(p)
+            if self.board_map[p.position[0]][p.position[1]] is p:
+                squares = p.get_attacks(self)
+                self.piece_attacks[p] = squares
+                for x, y in squares:
+                    attackers = attack_map[x][y]
+                    if attackers:
+                        attackers.add(p)
+                    else:
+                        attack_map[x][y] = {p}
+    
+    def get_attackers(self, pos, color):
+        x, y = pos
+        return self.attack_map['black' if color == 'white' else 'white'][x][y]
+    
+    def is_valid_square(self, pos):
+        x, y = pos
+        return 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE
+    
+    def is_occupied(self, pos):
+        return self.get_piece_at(pos) is not None
+    
+    def is_occupied_by_friend(self, pos, color):
+        piece = self.get_piece_at(pos)
+        return piece is not None and piece.color == color
+    
+    def is_occupied_by_enemy(self, pos, color):
+        piece = self.get_piece_at(pos)
+        return piece is not None and piece.color != color
+    
+    def is_enemy_piece(self, pos, color):
+        return self.is_occupied_by_enemy(pos, color)
+    
+    def get_piece_at(self, pos):
+        x, y = pos
+        if 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+            return self.board_map[x][y]
+        return None
+    
+    def get_king(self, color):
+        return self.kings.get(color)
+    
+    def get_en_passant_target(self, color):
+        return self.black_ep if color == 'white' else self.white_ep
+    
+    def get_en_passant_square(self):
+        for x, y in (self.white_ep, self.black_ep):
+            if self.is_valid_square((x, y)):
+                return y * 8 + x
+        return -1
+    
+    # The en passant file enters the hash only when a pawn of the side to
+    # move attacks the square, as in bitboard.Position: a square nobody can
+    # capture on must not split repetitions or opening-book keys.
+    def en_passant_key(self):
+        sq = self.get_en_passant_square()
+        if sq < 0:
+            return 0
+        x, y = sq & 7, sq >> 3
+        row = y - 1 if self.turn == 'white' else y + 1
+        for dx in (-1, 1):
+            piece = self.get_piece_at((x + dx, row))
+            if isinstance(piece, Pawn) and piece.color == self.turn:
+                return ep_key(sq)
+        return 0
+    
+    def castling_rights(self):
+        rights = 0
+        for side, back in ((0, 0), (1, 7)):
+            king = self.kings.get(COLOR_NAMES[side])
+            if not king or king.has_moved or king.position != (4, back):
+                continue
+            for right, rook_x in ((1, 7), (2, 0)):
+                rook = self.board_map[rook_x][back]
+                if isinstance(rook, Rook) and rook.color == king.color and not rook.has_moved:
+                    rights |= right << (2 * side)
+        return rights
+    
+    def compute_hash(self):
+        key = CASTLING_KEYS[self.castling_rights()] ^ self.en_passant_key()
+        if self.turn == 'black':
+            key ^= SIDE_KEY
+        for piece in self.pieces:
+            key ^= piece_key(piece, piece.position)
+        return key
+    
+    def is_in_check(self, color):
+        king = self.get_king(color)
+        if not king:
+            return False
+        return bool(self.get_attackers(king.position, color))
+    
+    def is_square_attacked(self, pos, color):
+        return bool(self.get_attackers(pos, color))
+    
+    def would_expose_king(self, piece, new_pos):
+        self.make_move(piece, new_pos)
+        in_check = self.is_in_check(piece.color)
+        self.unmake_move()
+        return in_check
+    
+    def get_pin_line(self, piece, king):
+        dx = piece.position[0] - king.position[0]
+        dy = piece.position[1] - king.position[1]
+        if not (dx == 0 or dy == 0 or abs(dx) == abs(dy)):
+            return None
+        step = ((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+        pinners = (Bishop, Queen) if step[0] and step[1] else (Rook, Queen)
+        line = []
+        x, y = king.position
+        behind = False
+        while True:
+            x, y = x + step[0], y + step[1]
+            if not self.is_valid_square((x, y)):
+                return None
+            line.append((x, y))
+            occupant = self.board_map[x][y]
+            if occupant is piece:
+                behind = True
+            elif occupant:
+                if behind and occupant.color != piece.color and isinstance(occupant, pinners):
+                    return line
+                return None
+    
+    def get_check_evasions(self, king, checkers):
+        checker = next(iter(checkers))
+        squares = [checker.position]
+        if checker.slides:
+            kx, ky = king.position
+            cx, cy = checker.position
+            step = ((cx > kx) - (cx < kx), (cy > ky) - (cy < ky))
+            x, y = kx + step[0], ky + step[1]
+            while (x, y) != checker.position:
+                squares.append((x, y))
+                x, y = x + step[0], y + step[1]
+        return squares
+    
+    def filter_legal_moves(self, piece, moves):
+        king = self.get_king(piece.color)
+        if not king:
+            return moves
+        checkers = self.get_attackers(king.position, piece.color)
+        if piece is king:
+            kx, ky = king.position
+            unsafe = []
+            for checker in checkers:
+                if checker.slides:
+                    cx, cy = checker.position
+                    unsafe.append((kx + (kx > cx) - (kx < cx), ky + (ky > cy) - (ky < cy)))
+            return [move for move in moves if move not in unsafe and not self.is_square_attacked(move, piece.color)]
+        if len(checkers) > 1:
+            return []
+        evasions = self.get_check_evasions(king, checkers) if checkers else None
+        pin_line = self.get_pin_line(piece, king)
+        ep_target = self.get_en_passant_target(piece.color)
+        valid_moves = []
+        for move in moves:
+            if move == ep_target and isinstance(piece, Pawn):
+                if not self.would_expose_king(piece, move):
+                    valid_moves.append(move)
+            elif (evasions is None or move in evasions) and (pin_line is None or move in pin_line):
+                valid_moves.append(move)
+        return valid_moves
+    
+    def make_move(self, piece, new_pos, promotion=None):
+        old_pos = piece.position
+        captured = self.get_piece_at(new_pos)
+        if captured is None and isinstance(piece, Pawn) and new_pos == self.get_en_passant_target(piece.color):
+            captured = self.get_piece_at((new_pos[0], old_pos[1]))
+        rook = None
+        if isinstance(piece, King) and abs(new_pos[0] - old_pos[0]) == 2:
+            rook = self.get_piece_at((0 if new_pos[0] < old_pos[0] else 7, old_pos[1]))
+        record = MoveRecord(piece, old_pos, new_pos, captured, self.white_ep, self.black_ep, rook, self.hash,
+                            self.halfmove_clock)
+        self.move_stack.append(record)
+        self.halfmove_clock = 0 if captured or isinstance(piece, Pawn) else self.halfmove_clock + 1
+        self.legal_moves = None
+        rights_changed = isinstance(piece, (King, Rook)) or isinstance(captured, Rook)
+        if rights_changed:
+            self.hash ^= CASTLING_KEYS[self.castling_rights()]
+        self.hash ^= SIDE_KEY ^ self.en_passant_key()
+        
+        if captured:
+            self.remove_piece(captured)
+        self.move_piece(piece, new_pos)
+        piece.has_moved = True
+        if rook:
+            self.move_piece(rook, (new_pos[0] + 1 if new_pos[0] < old_pos[0] else new_pos[0] - 1, new_pos[1]))
+            rook.has_moved = True
+        
+        if piece.color == 'white':
+            self.white_ep = self.check_en_passant(piece, old_pos, new_pos)
+            self.black_ep = (100, 100)
+        else:
+            self.black_ep = self.check_en_passant(piece, old_pos, new_pos)
+            self.white_ep = (100, 100)
+        self.turn = 'black' if piece.color == 'white' else 'white'
+        self.hash ^= self.en_passant_key()
+        if rights_changed:
+            self.hash ^= CASTLING_KEYS[self.castling_rights()]
+        self.count_position(1)
+        if promotion:
+            self.promote(piece, promotion)
+        return record
+    
+    def unmake_move(self):
+        self.count_position(-1)
+        record = self.move_stack.pop()
+        self.legal_moves = None
+        piece = record.piece
+        if record.promoted:
+            self.remove_piece(record.promoted)
+            self.add_piece(piece)
+        if record.rook:
+            self.move_piece(record.rook, record.rook_pos)
+            record.rook.has_moved = record.rook_has_moved
+        self.move_piece(piece, record.old_pos)
+        piece.has_moved = record.has_moved
+        if record.captured:
+            self.add_piece(record.captured)
+        self.white_ep = record.white_ep
+        self.black_ep = record.black_ep
+        self.turn = piece.color
+        self.hash = record.hash
+        self.halfmove_clock = record.halfmove
+        return record
+    
+    def promote(self, pawn, piece_class):
+        new_piece = piece_class(pawn.color, pawn.position)
+        new_piece.has_moved = True
+        self.legal_moves = None
+        last_move = bool(self.move_stack) and self.move_stack[-1].piece is pawn
+        if last_move:
+            self.count_position(-1)
+        self.remove_piece(pawn)
+        self.add_piece(new_piece)
+        if last_move:
+            self.move_stack[-1].promoted = new_piece
+            self.count_position(1)
+        if self.journal is not None and self.journal.pending is pawn:
+            self.journal.promote(self, PIECE_NAMES.index(piece_class.name))
+        return new_piece
+    
+    # Occurrences of each position hash since reset, kept by make_move /
+    # unmake_move (and promote, which changes the hash after the move).
+    def count_position(self, step):
+        counts = self.position_counts
+        count = counts.get(self.hash, 0) + step
+        if count:
+            counts[self.hash] = count
+        else:
+            del counts[self.hash]
+    
+    def draw_reason(self):
+        if self.position_counts.get(self.hash, 0) >= REPETITIONS:
+            return 'lap lai ba lan'
+        if self.halfmove_clock >= FIFTY_MOVE_PLIES:
+            return 'luat 50 nuoc'
+        if self.material in INSUFFICIENT_MATERIAL:
+            return 'khong du quan chieu het'
+        return ''
+    
+    def generate_moves(self):
+        moves = []
+        for pos, (targets, castle_moves) in self.get_legal_moves().items():
+            piece = self.board_map[pos[0]][pos[1]]
+            for target in targets:
+                if isinstance(piece, Pawn) and target[1] in (0, BOARD_SIZE - 1):
+                    moves.extend((piece, target, cls) for cls in PROMOTION_CLASSES)
+                else:
+                    moves.append((piece, target, None))
+            moves.extend((piece, king_pos, None) for king_pos, _ in castle_moves)
+        return moves
+    
+    def decode_move(self, move):
+        piece = self.get_piece_at(coords(move & 63))
+        promo = move >> 12
+        return piece, coords(move >> 6 & 63), FEN_PIECES[FEN_KINDS[promo]] if promo else None
+    
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.generate_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for piece, target, promotion in moves:
+            self.make_move(piece, target, promotion)
+            nodes += self.perft(depth - 1)
+            self.unmake_move()
+        return nodes
+    
+    def divide(self, depth):
+        result = {}
+        for piece, target, promotion in self.generate_moves():
+            promo = PIECE_NAMES.index(promotion.name) if promotion else 0
+            name = move_name(encode_move(square(*piece.position), square(*target), promo))
+            self.make_move(piece, target, promotion)
+            result[name] = self.perft(depth - 1)
+            self.unmake_move()
+        return result
+    
+    def get_legal_moves(self):
+        if self.legal_moves is None:
+            legal_moves = {}
+            for piece in [p for p in self.pieces if p.color == self.turn]:
+                if self.engine:
+                    moves, castle_moves = self.engine.get_valid_moves(piece)
+                else:
+                    moves, castle_moves = piece.get_valid_moves(self)
+                if moves or castle_moves:
+                    legal_moves[piece.position] = (moves, castle_moves)
+            self.legal_moves = legal_moves
+        return self.legal_moves
+    
+    def get_valid_moves(self, piece):
+        if piece.color != self.turn:
+            if self.engine:
+                return self.engine.get_valid_moves(piece)
+            return piece.get_valid_moves(self)
+        moves, castle_moves = self.get_legal_moves().get(piece.position, ([], []))
+        return list(moves), list(castle_moves)
+    
+    def is_checkmate_or_stalemate(self, color):
+        if color == self.turn:
+            if self.get_legal_moves():
+                return False, False
+            in_check = self.is_in_check(color)
+            return not in_check, in_check
+        if self.engine:
+            return self.engine.is_checkmate_or_stalemate(color)
+        if not self.is_in_check(color):
+            for piece in self.pieces:
+                if piece.color == color:
+                    moves, castle_moves = piece.get_valid_moves(self)
+                    if moves or castle_moves:
+                        return False, False
+            return True, False
+        else:
+            for piece in self.pieces:
+                if piece.color == color:
+                    moves, castle_moves = piece.get_valid_moves(self)
+                    if moves or castle_moves:
+                        return False, False
+            return False, True
+        return False, False
+    
+    def update_game_over(self):
+        is_stalemate, is_checkmate = self.is_checkmate_or_stalemate(self.turn)
+        if is_checkmate:
+            self.winner = 'white' if self.turn == 'black' else 'black'
+            self.game_over = True
+        elif is_stalemate or self.draw_reason():
+            self.winner = 'Hoa'
+            self.game_over = True
+        elif self.tablebases is not None and len(self.pieces) <= self.tablebases.max_pieces:
+            found = self.tablebases.probe(Position.from_game(self, self.turn))
+            if found is not None:
+                result = found[0]
+                other = 'black' if self.turn == 'white' else 'white'
+                self.winner = 'Hoa' if result == DRAW else (self.turn if result == WIN else other)
+                self.game_over = True
+        return self.game_over
+    
+    def check_promotion(self):
+        self.white_promote = False
+        self.black_promote = False
+        self.promo_index = None
+        for piece in self.pieces:
+            if isinstance(piece, Pawn):
+                if piece.color == 'white' and piece.position[1] == 7:
+                    self.white_promote = True
+                    self.promo_index = piece
+                elif piece.color == 'black' and piece.position[1] == 0:
+                    self.black_promote = True
+                    self.promo_index = piece
+        return self.white_promote, self.black_promote, self.promo_index
+    
+    def check_en_passant(self, piece, old_pos, new_pos):
+        if isinstance(piece, Pawn) and abs(old_pos[1] - new_pos[1]) == 2:
+            return (new_pos[0], (old_pos[1] + new_pos[1]) // 2)
+        return (100, 100)
+    
+    def handle_move(self, piece, new_pos):
+        captured = self.get_piece_at(new_pos)
+        if isinstance(captured, King) and captured.color != piece.color:
+            return
+        
+        record = self.make_move(piece, new_pos)
+        if record.captured:
+            self.captured_pieces[record.captured.color].append(record.captured.name)
+        if self.journal is not None:
+            self.journal.record(self, encode_move(square(*record.old_pos), square(*new_pos)), piece)
+    
+    def handle_castling(self, king, new_pos):
+        rook_pos = (0 if king.position[0] > new_pos[0] else 7, king.position[1])
+        if self.get_piece_at(rook_pos):
+            record = self.make_move(king, new_pos)
+            if self.journal is not None:
+                self.journal.record(self, encode_move(square(*record.old_pos), square(*new_pos)), king)
+    
+    def apply_move(self, move):
+        piece, target, promotion = self.decode_move(move)
+        if isinstance(piece, King) and abs(target[0] - piece.position[0]) == 2:
+            self.handle_castling(piece, target)
+        else:
+            self.handle_move(piece, target)
+            if promotion:
+                self.promote(self.get_piece_at(target), promotion)
+    
+
+METRICS.instrument(GameState, ('get_valid_moves', 'would_expose_king', 'is_in_check', 'is_checkmate_or_stalemate'))
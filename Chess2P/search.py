@@ -0,0 +1,295 @@
+import time
+
+from bitboard import Position, PAWN
+from evaluation import PIECE_VALUES, evaluate
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from tablebase import WIN, LOSS
+
+MATE = 30000
+INFINITY = 32000
+MAX_PLY = 64
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchLimits:
+    __slots__ = ('depth', 'movetime', 'nodes')
+
+    def __init__(self, depth=MAX_PLY, movetime=None, nodes=None):
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+
+
+class SearchResult:
+    __slots__ = ('move', 'score', 'depth', 'nodes', 'elapsed', 'pv')
+
+    def __init__(self, move, score, depth, nodes, elapsed, pv):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.pv = pv
+
+    @property
+    def nps(self):
+        return self.nodes / self.elapsed if self.elapsed else 0.0
+
+
+def is_capture(position, move):
+    to = move >> 6 & 63
+    return bool(position.board[to]) or move >> 12 or \
+        (to == position.ep and position.board[move & 63] & 7 == PAWN)
+
+
+class Searcher:
+    def __init__(self, table=None, tablebases=None):
+        self.table = table if table is not None else TranspositionTable(16)
+        self.tablebases = tablebases
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [[0] * 4096, [0] * 4096]
+        self.nodes = 0
+        self.deadline = None
+        self.max_nodes = None
+
+    def _check_limits(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout
+
+    def order_moves(self, position, moves, tt_move, ply):
+        board = position.board
+        killers = self.killers[ply]
+        history = self.history[position.side]
+        scored = []
+        for move in moves:
+            if move == tt_move:
+                score = 1 << 30
+            else:
+                victim = board[move >> 6 & 63] & 7
+                promo = move >> 12
+                if victim or promo:
+                    score = (1 << 20) + PIECE_VALUES[victim] * 10 + PIECE_VALUES[promo] - PIECE_VALUES[board[move & 63] & 7] // 10
+                elif move == killers[0]:
+                    score = 1 << 19
+                elif move == killers[1]:
+                    score = (1 << 19) - 1
+                else:
+                    score = history[move & 4095]
+            scored.append((score, move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def _quiesce(self, position, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        board = position.board
+        captures = []
+        for move in position.legal_moves(captures=True):
+            captures.append((PIECE_VALUES[board[move >> 6 & 63] & 7] * 10 + PIECE_VALUES[move >> 12]
+                             - PIECE_VALUES[board[move & 63] & 7] // 10, move))
+        captures.sort(reverse=True)
+        for _, move in captures:
+            position.make_move(move)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+        in_check = position.is_check()
+        if in_check:
+            depth += 1
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+
+        if self.tablebases is not None:
+            found = self.tablebases.probe(position)
+            if found is not None:
+                return _tablebase_score(found, ply)
+
+        key = position.hash
+        tt_move = 0
+        entry = self.table.probe(key)
+        if entry:
+            stored_depth, bound, score, tt_move = entry
+            if stored_depth >= depth:
+                score = _from_table(score, ply)
+                if bound == EXACT or (bound == LOWER and score >= beta) or (bound == UPPER and score <= alpha):
+                    return score
+
+        moves = position.legal_moves()
+        if not moves:
+            return -MATE + ply if in_check else 0
+        if ply >= MAX_PLY:
+            return evaluate(position)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        for index, move in enumerate(self.order_moves(position, moves, tt_move, ply)):
+            position.make_move(move)
+            if index == 0:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not is_capture(position, move):
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[position.side][move & 4095] += depth * depth
+                        break
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.table.store(key, depth, bound, _to_table(best_score, ply), best_move)
+        return best_score
+
+    def _root(self, position, moves, depth, best_move):
+        alpha, beta = -INFINITY, INFINITY
+        best_score = -INFINITY
+        completed = None
+        for index, move in enumerate(self.order_moves(position, moves, best_move, 0)):
+            position.make_move(move)
+            if index == 0:
+                score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            else:
+                score = -self._negamax(position, depth - 1, -alpha - 1, -alpha, 1)
+                if score > alpha:
+                    score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                completed = move
+                alpha = max(alpha, score)
+                self.root_best = (completed, best_score)
+        self.table.store(position.hash, depth, EXACT, best_score, completed)
+        return completed, best_score
+
+    def principal_variation(self, position, depth):
+        pv = []
+        seen = set()
+        while len(pv) < depth and position.hash not in seen:
+            seen.add(position.hash)
+            entry = self.table.probe(position.hash)
+            if not entry or entry[3] not in position.legal_moves():
+                break
+            pv.append(entry[3])
+            position.make_move(entry[3])
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+    def search(self, position, limits=None, report=None, root_moves=None):
+        limits = limits or SearchLimits(movetime=1.0)
+        start = time.perf_counter()
+        self.deadline = start + limits.movetime if limits.movetime else None
+        self.max_nodes = limits.nodes
+        self.nodes = 0
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [[0] * 4096, [0] * 4096]
+        self.table.new_search()
+
+        moves = root_moves or position.legal_moves()
+        if not moves:
+            return SearchResult(0, -MATE if position.is_check() else 0, 0, 0, 0.0, [])
+        best_move, best_score, depth_reached = moves[0], 0, 0
+        ply = len(position.history)
+        for depth in range(1, limits.depth + 1):
+            self.root_best = None
+            try:
+                best_move, best_score = self._root(position, moves, depth, best_move)
+            except SearchTimeout:
+                while len(position.history) > ply:
+                    position.unmake_move()
+                if self.root_best:
+                    best_move, best_score = self.root_best
+                break
+            depth_reached = depth
+            elapsed = time.perf_counter() - start
+            if report:
+                report(SearchResult(best_move, best_score, depth, self.nodes, elapsed,
+                                    self.principal_variation(position, depth)))
+            if (len(moves) == 1 and root_moves is None) or abs(best_score) >= MATE - MAX_PLY:
+                break
+            if self.deadline is not None and elapsed > limits.movetime / 2:
+                break
+        elapsed = time.perf_counter() - start
+        return SearchResult(best_move, best_score, depth_reached, self.nodes, elapsed,
+                            self.principal_variation(position, max(depth_reached, 1)))
+
+
+def _tablebase_score(found, ply):
+    result, plies = found
+    if result == WIN:
+        return MATE - ply - plies
+    if result == LOSS:
+        return -MATE + ply + plies
+    return 0
+
+
+def _to_table(score, ply):
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+# Book and tablebase moves need no search; None when neither knows the position.
+def known_move(position, searcher=None, book=None):
+    if book is not None:
+        move = book.choose(position)
+        if move:
+            return SearchResult(move, 0, 0, 0, 0.0, [move])
+    if searcher is not None and searcher.tablebases is not None:
+        found = searcher.tablebases.best_move(position)
+        if found:
+            move, result, plies = found
+            return SearchResult(move, _tablebase_score((result, plies), 0), 0, 0, 0.0, [move])
+    return None
+
+
+def best_move(position, limits=None, searcher=None, report=None, book=None):
+    if not isinstance(position, Position):
+        position = Position.from_game(position, position.turn)
+    searcher = searcher or Searcher()
+    return known_move(position, searcher, book) or searcher.search(position, limits, report)
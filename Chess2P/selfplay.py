@@ -0,0 +1,111 @@
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import rules
+from bitboard import PIECE_NAMES, encode_move, square
+from search import Searcher, SearchLimits, best_move
+
+MODES = ('random', 'engine')
+MAX_PLIES = 200
+OPENING_PLIES = 4
+ENGINE_DEPTH = 2
+RESULT_PATH = 'selfplay.json'
+PHASES = ('sinh nuoc', 'tim kiem', 'di quan', 'kiem tra ket thuc')
+
+
+def random_move(game, rng):
+    piece, target, promotion = rng.choice(game.generate_moves())
+    return encode_move(square(*piece.position), square(*target), PIECE_NAMES.index(promotion.name) if promotion else 0)
+
+
+# Moves go through GameState.apply_move, the handle_move / handle_castling /
+# promote path a ChessGame click or computer move takes. Engine games open
+# with a few random plies so a fixed seed still gives distinct games.
+def play_game(seed, mode='random', max_plies=MAX_PLIES, depth=ENGINE_DEPTH):
+    rng = random.Random(seed)
+    game = rules.GameState()
+    searcher = Searcher() if mode == 'engine' else None
+    timings = dict.fromkeys(PHASES, 0.0)
+    clock = time.perf_counter
+    plies = 0
+    while plies < max_plies and not game.game_over:
+        start = clock()
+        if searcher is None or plies < OPENING_PLIES:
+            move = random_move(game, rng)
+            phase = 'sinh nuoc'
+        else:
+            move = best_move(game, SearchLimits(depth=depth), searcher).move
+            phase = 'tim kiem'
+        chosen = clock()
+        game.apply_move(move)
+        applied = clock()
+        game.update_game_over()
+        timings[phase] += chosen - start
+        timings['di quan'] += applied - chosen
+        timings['kiem tra ket thuc'] += clock() - applied
+        plies += 1
+    return {'seed': seed, 'plies': plies, 'result': game.winner or '*', 'timings': timings}
+
+
+def play_games(seeds, mode, max_plies, depth):
+    return [play_game(seed, mode, max_plies, depth) for seed in seeds]
+
+
+def run(games, workers=None, mode='random', seed=0, max_plies=MAX_PLIES, depth=ENGINE_DEPTH, chunk=4):
+    workers = workers or os.cpu_count() or 1
+    seeds = list(range(seed, seed + games))
+    batches = [seeds[i:i + chunk] for i in range(0, games, chunk)]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [game for batch in batches for game in play_games(batch, mode, max_plies, depth)]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(play_games, batch, mode, max_plies, depth) for batch in batches]
+            results = [game for future in futures for game in future.result()]
+    elapsed = time.perf_counter() - start
+    plies = sum(game['plies'] for game in results)
+    outcomes = {}
+    for game in results:
+        outcomes[game['result']] = outcomes.get(game['result'], 0) + 1
+    return {
+        'config': {'games': games, 'workers': workers, 'mode': mode, 'seed': seed,
+                   'max_plies': max_plies, 'depth': depth},
+        'summary': {
+            'seconds': elapsed,
+            'games_per_second': games / elapsed,
+            'moves_per_second': plies / elapsed,
+            'plies': plies,
+            'results': outcomes,
+            'phase_us_per_move': {phase: sum(game['timings'][phase] for game in results) / max(plies, 1) * 1e6
+                                  for phase in PHASES},
+        },
+        'games': results,
+    }
+
+
+def main(argv):
+    games = int(argv[1]) if len(argv) > 1 else 20
+    workers = int(argv[2]) if len(argv) > 2 else None
+    mode = argv[3] if len(argv) > 3 else 'random'
+    seed = int(argv[4]) if len(argv) > 4 else 0
+    path = argv[5] if len(argv) > 5 else RESULT_PATH
+    if mode not in MODES:
+        raise SystemExit(f"che do phai la {' hoac '.join(MODES)}")
+    report = run(games, workers, mode, seed)
+    with open(path, 'w') as out:
+        json.dump(report, out, indent=2)
+    summary = report['summary']
+    print(f"{games} van, {summary['plies']} nua nuoc, {summary['seconds']:.2f} s, "
+          f"{summary['games_per_second']:.2f} van/s, {summary['moves_per_second']:.0f} nuoc/s")
+    print(f"ket qua: {summary['results']}")
+    for phase, value in summary['phase_us_per_move'].items():
+        print(f'{phase:<20}{value:>10.1f} us/nuoc')
+    print(f'da ghi {path}')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
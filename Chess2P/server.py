@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import json
+import sys
+
+from bitboard import Position, COLOR_NAMES, move_name, parse_move
+
+HOST = '127.0.0.1'
+PORT = 8765
+HIGH_WATER = 1 << 16
+
+
+class Game:
+    __slots__ = ('id', 'position', 'legal', 'players')
+
+    def __init__(self, game_id, creator):
+        self.id = game_id
+        self.position = Position.initial()
+        self.legal = self.position.legal_moves()
+        self.players = [creator, None]
+
+
+# Replies are queued and written once per loop iteration, so a burst of
+# requests on one connection costs one send instead of one per message.
+class Session:
+    __slots__ = ('writer', 'games', 'outbox')
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = set()
+        self.outbox = []
+
+    def flush(self):
+        if not self.writer.is_closing():
+            self.writer.write(b''.join(self.outbox))
+        self.outbox.clear()
+
+
+# Line-delimited JSON. Requests: {"op": "new"}, {"op": "join", "game": id},
+# {"op": "move", "game": id, "move": "e2e4"}, {"op": "state", "game": id};
+# an optional "id" is echoed back to the sender. A connection may hold any
+# number of games, on either or both sides.
+class GameServer:
+    def __init__(self):
+        self.games = {}
+        self.ids = itertools.count(1)
+        self.moves = 0
+
+    async def handle(self, reader, writer):
+        session = Session(writer)
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    self.dispatch(session, request)
+                except (ValueError, KeyError, TypeError) as e:
+                    self.send(session, {'event': 'error', 'reason': str(e)})
+                if writer.transport.get_write_buffer_size() > HIGH_WATER:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.disconnect(session)
+            writer.close()
+
+    def send(self, session, message):
+        if session is None:
+            return
+        if not session.outbox:
+            asyncio.get_running_loop().call_soon(session.flush)
+        session.outbox.append(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    def dispatch(self, session, request):
+        op = request['op']
+        reply = {'id': request['id']} if 'id' in request else {}
+        if op == 'new':
+            game = Game(next(self.ids), session)
+            self.games[game.id] = game
+            session.games.add(game.id)
+            self.send(session, {**reply, 'event': 'created', 'game': game.id, 'color': 'white'})
+            return
+        game = self.games.get(request.get('game'))
+        if game is None:
+            self.send(session, {**reply, 'event': 'error', 'reason': 'van khong ton tai'})
+        elif op == 'join':
+            if game.players[1] is not None:
+                self.send(session, {**reply, 'event': 'error', 'reason': 'van da du nguoi'})
+                return
+            game.players[1] = session
+            session.games.add(game.id)
+            self.send(session, {**reply, 'event': 'start', 'game': game.id})
+            if game.players[0] is not session:
+                self.send(game.players[0], {'event': 'start', 'game': game.id})
+        elif op == 'move':
+            self.play(session, game, request['move'], reply)
+        elif op == 'state':
+            position = game.position
+            self.send(session, {**reply, 'event': 'state', 'game': game.id, 'turn': COLOR_NAMES[position.side],
+                                'moves': [move_name(record[0]) for record in position.history]})
+        else:
+            self.send(session, {**reply, 'event': 'error', 'reason': f'lenh khong hop le: {op}'})
+
+    def play(self, session, game, text, reply):
+        position = game.position
+        if game.players[1] is None or game.players[position.side] is not session:
+            self.send(session, {**reply, 'event': 'error', 'game': game.id, 'reason': 'chua den luot'})
+            return
+        move = parse_move(text)
+        if move not in game.legal:
+            self.send(session, {**reply, 'event': 'error', 'game': game.id, 'reason': 'nuoc di khong hop le'})
+            return
+        position.make_move(move)
+        game.legal = position.legal_moves()
+        self.moves += 1
+        status = 'ok'
+        if not game.legal:
+            status = 'checkmate' if position.is_check() else 'stalemate'
+        message = {'event': 'move', 'game': game.id, 'move': text, 'status': status}
+        # One session may hold both sides; it gets the move once.
+        opponent = game.players[position.side]
+        self.send(session, {**reply, **message})
+        if opponent is not session:
+            self.send(opponent, message)
+        if status != 'ok':
+            self.finish(game)
+
+    def finish(self, game):
+        del self.games[game.id]
+        for player in game.players:
+            if player:
+                player.games.discard(game.id)
+
+    def disconnect(self, session):
+        for game_id in list(session.games):
+            game = self.games.get(game_id)
+            if game:
+                self.finish(game)
+                for player in game.players:
+                    if player is not session:
+                        self.send(player, {'event': 'abandoned', 'game': game_id})
+
+
+async def serve(host=HOST, port=PORT, ready=None):
+    server = GameServer()
+    listener = await asyncio.start_server(server.handle, host, port, limit=1 << 20)
+    if ready:
+        ready.set()
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    asyncio.run(serve(port=port))
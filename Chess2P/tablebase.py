@@ -0,0 +1,310 @@
+import mmap
+import os
+import sys
+import time
+from array import array
+
+from bitboard import (Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, NO_SQUARE,
+                      PAWN_ATTACKS, bits, move_name)
+
+TABLE_PATH = 'assets/tablebases'
+TABLE_MAGIC = b'CTB1'
+DEFAULT_TABLES = ('KQK', 'KRK', 'KPK')
+KIND_LETTERS = ' PNBRQK'
+NAME_ORDER = (QUEEN, ROOK, BISHOP, KNIGHT, PAWN)
+DRAWN_MATERIAL = {'KK', 'KNK', 'KBK', 'KKN', 'KKB'}
+WIN, DRAW, LOSS = 1, 0, -1
+# One byte per position: 0 draw, 255 unreachable, otherwise plies to mate + 1.
+# Odd plies mean the side to move mates, even plies that it gets mated.
+INVALID = 255
+MAX_PLIES = 253
+
+
+def _transform(sq, t):
+    if t & 1:
+        sq ^= 7
+    if t & 2:
+        sq ^= 56
+    if t & 4:
+        sq = (sq & 7) << 3 | sq >> 3
+    return sq
+
+
+TRANSFORMS = [[_transform(sq, t) for sq in range(64)] for t in range(8)]
+TRIANGLE = [sq for sq in range(64) if (sq & 7) <= 3 and (sq >> 3) <= (sq & 7)]
+LEFT_HALF = [sq for sq in range(64) if (sq & 7) <= 3]
+
+
+def material_name(position, flip=0):
+    name = ''
+    for color in (flip, flip ^ 1):
+        pieces = position.pieces[color]
+        name += 'K' + ''.join(KIND_LETTERS[kind] * pieces[kind].bit_count() for kind in NAME_ORDER)
+    return name
+
+
+# A table always has the stronger side as white; positions of the mirrored
+# material are probed with colours swapped and the board flipped vertically.
+# The white king is folded into a 10-square triangle by the 8 board symmetries,
+# or into the a-d files when pawns fix the board's orientation.
+class Material:
+    def __init__(self, name):
+        split = name.index('K', 1)
+        self.name = name
+        self.pieces = [(WHITE, KIND_LETTERS.index(c)) for c in name[:split]] + \
+                      [(BLACK, KIND_LETTERS.index(c)) for c in name[split:]]
+        self.groups = list(dict.fromkeys(self.pieces))
+        self.pawns = 'P' in name
+        kings = LEFT_HALF if self.pawns else TRIANGLE
+        choices = (0, 1) if self.pawns else range(8)
+        self.king_index = {sq: i for i, sq in enumerate(kings)}
+        self.kings = kings
+        self.transform = [TRANSFORMS[next(t for t in choices if TRANSFORMS[t][sq] in self.king_index)]
+                          for sq in range(64)]
+        self.shift = 6 * (len(self.pieces) - 1)
+        self.half = len(kings) << self.shift
+        self.size = 2 * self.half
+
+    def index(self, squares, side):
+        t = self.transform[squares[0]]
+        index = self.king_index[t[squares[0]]]
+        for sq in squares[1:]:
+            index = index << 6 | t[sq]
+        return index + side * self.half
+
+    def decode(self, index):
+        side, index = divmod(index, self.half)
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            squares.append(index & 63)
+            index >>= 6
+        squares.append(self.kings[index])
+        squares.reverse()
+        return squares, side
+
+    def squares(self, position, flip=0):
+        mirror = 56 if flip else 0
+        found = []
+        for color, kind in self.groups:
+            found.extend(sq ^ mirror for sq in bits(position.pieces[color ^ flip][kind]))
+        return found
+
+    def position(self, squares, side):
+        if len(set(squares)) != len(squares):
+            return None
+        position = Position()
+        for (color, kind), sq in zip(self.pieces, squares):
+            if kind == PAWN and sq >> 3 in (0, 7):
+                return None
+            position.put(color, kind, sq)
+        position.side = side
+        if position.is_check(side ^ 1):
+            return None
+        return position
+
+
+class Table:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.material = Material(os.path.splitext(os.path.basename(path))[0])
+        if self.map[:len(TABLE_MAGIC)] != TABLE_MAGIC or len(self.map) != len(TABLE_MAGIC) + self.material.size:
+            self.close()
+            raise ValueError(f'Bang tan cuoc khong hop le: {path}')
+
+    def value(self, index):
+        return self.map[len(TABLE_MAGIC) + index]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.file.close()
+
+
+def decode_value(value):
+    if value == INVALID:
+        return None
+    if not value:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies & 1 else LOSS), plies
+
+
+class Tablebases:
+    def __init__(self, folder=TABLE_PATH):
+        self.tables = {}
+        self.max_pieces = 2
+        if os.path.isdir(folder):
+            for entry in sorted(os.listdir(folder)):
+                if entry.endswith('.tb'):
+                    self.add(Table(os.path.join(folder, entry)))
+
+    def add(self, table):
+        self.tables[table.material.name] = table
+        self.max_pieces = max(self.max_pieces, len(table.material.pieces))
+
+    def __len__(self):
+        return len(self.tables)
+
+    def probe(self, position):
+        if (position.occupied[0] | position.occupied[1]).bit_count() > self.max_pieces or position.castling:
+            return None
+        if position.ep != NO_SQUARE and PAWN_ATTACKS[position.side ^ 1][position.ep] & position.pieces[position.side][PAWN]:
+            return None
+        name = material_name(position)
+        if name in DRAWN_MATERIAL:
+            return DRAW, 0
+        flip = 0
+        table = self.tables.get(name)
+        if table is None:
+            flip = 1
+            table = self.tables.get(material_name(position, 1))
+            if table is None:
+                return None
+        material = table.material
+        squares = material.squares(position, flip)
+        return decode_value(table.value(material.index(squares, position.side ^ flip)))
+
+    def best_move(self, position):
+        best, best_key = None, None
+        for move in position.legal_moves():
+            position.make_move(move)
+            found = self.probe(position)
+            position.unmake_move()
+            if found is None:
+                return None
+            result, plies = found
+            key = (-result, -plies if result == LOSS else plies)
+            if best_key is None or key > best_key:
+                best, best_key = (move, -result, plies + 1), key
+        return best
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+
+
+def open_tablebases(folder=TABLE_PATH):
+    tablebases = Tablebases(folder)
+    return tablebases if tablebases.tables else None
+
+
+# Retrograde analysis: one pass of forward move generation records every
+# position's successors; mates are then propagated backwards in order of
+# distance, so each position is settled once at its shortest distance.
+# Captures and promotions leave the table and are valued from the smaller
+# tables already in `tablebases`; a position with one that wins is never
+# queued as a loss. The index has no en passant square, so material with
+# pawns on both sides cannot be generated.
+def generate(name, tablebases):
+    material = Material(name)
+    if (WHITE, PAWN) in material.groups and (BLACK, PAWN) in material.groups:
+        raise ValueError(f'Bang tan cuoc {name} can o an tot qua duong, chua ho tro')
+    size = material.size
+    values = bytearray([INVALID]) * size
+    starts = array('I', bytes(4 * (size + 1)))
+    targets = array('I')
+    remaining = array('H', bytes(2 * size))
+    longest = bytearray(size)
+    buckets = [[] for _ in range(MAX_PLIES + 2)]
+    for index in range(size):
+        starts[index] = len(targets)
+        squares, side = material.decode(index)
+        position = material.position(squares, side)
+        if position is None:
+            continue
+        values[index] = 0
+        moves = position.legal_moves()
+        if not moves:
+            if position.is_check():
+                buckets[0].append(index)
+            continue
+        escape = won = False
+        for move in moves:
+            frm, to = move & 63, move >> 6 & 63
+            if position.board[to] or move >> 12:
+                position.make_move(move)
+                found = tablebases.probe(position)
+                position.unmake_move()
+                if found is None:
+                    raise ValueError(f'Thieu bang tan cuoc cho {material_name(position)} sau {move_name(move)}')
+                result, plies = found
+                if result == LOSS:
+                    buckets[plies + 1].append(index)
+                    won = True
+                elif result == DRAW:
+                    escape = True
+                else:
+                    longest[index] = max(longest[index], plies)
+                continue
+            moved = squares.index(frm)
+            after = squares[:moved] + [to] + squares[moved + 1:]
+            targets.append(material.index(after, side ^ 1))
+            remaining[index] += 1
+        if escape or won:
+            remaining[index] = 0xffff
+        elif not remaining[index] and longest[index]:
+            buckets[longest[index] + 1].append(index)
+    starts[size] = len(targets)
+
+    counts = array('I', bytes(4 * (size + 1)))
+    for target in targets:
+        counts[target + 1] += 1
+    for index in range(size):
+        counts[index + 1] += counts[index]
+    sources = array('I', bytes(4 * len(targets)))
+    fill = array('I', counts)
+    for index in range(size):
+        for target in targets[starts[index]:starts[index + 1]]:
+            sources[fill[target]] = index
+            fill[target] += 1
+    del targets, fill
+
+    settled = bytearray(size)
+    for plies in range(MAX_PLIES + 1):
+        for index in buckets[plies]:
+            if settled[index]:
+                continue
+            settled[index] = 1
+            values[index] = plies + 1
+            for source in sources[counts[index]:counts[index + 1]]:
+                if settled[source]:
+                    continue
+                if not plies & 1:
+                    buckets[plies + 1].append(source)
+                elif remaining[source] != 0xffff:
+                    remaining[source] -= 1
+                    longest[source] = max(longest[source], plies)
+                    if not remaining[source]:
+                        buckets[min(longest[source] + 1, MAX_PLIES + 1)].append(source)
+        buckets[plies] = None
+    return bytes(values)
+
+
+def write(path, values):
+    with open(path, 'wb') as out:
+        out.write(TABLE_MAGIC)
+        out.write(values)
+
+
+def main(argv):
+    folder = argv[1] if len(argv) > 1 else TABLE_PATH
+    names = argv[2:] or DEFAULT_TABLES
+    os.makedirs(folder, exist_ok=True)
+    tablebases = Tablebases(folder)
+    for name in names:
+        start = time.perf_counter()
+        values = generate(name, tablebases)
+        elapsed = time.perf_counter() - start
+        path = os.path.join(folder, f'{name}.tb')
+        write(path, values)
+        tablebases.add(Table(path))
+        wins = sum(1 for value in values if value not in (0, INVALID) and (value - 1) & 1)
+        longest = max((value - 1 for value in values if value != INVALID), default=0)
+        print(f'{name}: {len(values)} the co, {values.count(INVALID)} khong hop le, {wins} thang, '
+              f'dai nhat {longest} nua nuoc, {os.path.getsize(path) / 1024:.0f} KB, {elapsed:.1f} s')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,101 @@
+from array import array
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# key (8) + score (4) + move (2) + depth (1) + bound (1) + age (1)
+ENTRY_BYTES = 17
+
+
+# One entry per slot; the slot count is the largest power of two that fits the
+# memory budget. A store replaces the slot unless it holds a different, deeper
+# position written during the current search. `collisions` counts the misses
+# where the slot was held by a different position.
+class TranspositionTable:
+    def __init__(self, megabytes=16):
+        entries = max(1, int(megabytes * 2 ** 20) // ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array('Q', [0]) * self.size
+        self.scores = array('i', [0]) * self.size
+        self.moves = array('H', [0]) * self.size
+        self.depths = array('b', [-1]) * self.size
+        self.bounds = array('B', [0]) * self.size
+        self.ages = array('B', [0]) * self.size
+        self.age = 0
+        self.reset_stats()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.keys, self.scores, self.moves,
+                                                 self.depths, self.bounds, self.ages))
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    def clear(self):
+        self.keys = array('Q', [0]) * self.size
+        self.depths = array('b', [-1]) * self.size
+        self.age = 0
+        self.reset_stats()
+
+    def new_search(self):
+        self.age = (self.age + 1) & 0xff
+
+    def probe(self, key):
+        index = key & self.mask
+        if self.depths[index] >= 0:
+            if self.keys[index] == key:
+                self.hits += 1
+                return self.depths[index], self.bounds[index], self.scores[index], self.moves[index]
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, move=0):
+        index = key & self.mask
+        stored = self.depths[index]
+        same = self.keys[index] == key
+        if stored >= 0 and not same and self.ages[index] == self.age and depth < stored:
+            self.rejected += 1
+            return False
+        if stored >= 0 and not same:
+            self.overwrites += 1
+        if same and not move:
+            move = self.moves[index]
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.bounds[index] = bound
+        self.scores[index] = score
+        self.moves[index] = move
+        self.ages[index] = self.age
+        self.stores += 1
+        return True
+
+    def hashfull(self, sample=1000):
+        sample = min(sample, self.size)
+        used = sum(1 for i in range(sample) if self.depths[i] >= 0 and self.ages[i] == self.age)
+        return used * 1000 // sample
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'entries': self.size,
+            'bytes': self.nbytes,
+            'probes': probes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+            'rejected': self.rejected,
+            'hashfull': self.hashfull(),
+        }
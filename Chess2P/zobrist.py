@@ -0,0 +1,14 @@
+import random
+
+_random = random.Random(0x5EED)
+
+# Indexed by piece code (color << 3 | kind) then square; unused codes hash to 0.
+PIECE_KEYS = [[_random.getrandbits(64) if code & 7 and code & 7 < 7 else 0 for _ in range(64)]
+              for code in range(16)]
+SIDE_KEY = _random.getrandbits(64)
+CASTLING_KEYS = [_random.getrandbits(64) if rights else 0 for rights in range(16)]
+EP_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+
+def ep_key(sq):
+    return EP_KEYS[sq & 7] if sq >= 0 else 0